@@ -11,6 +11,9 @@ __app_name__ = "OPCUA"
 
 PROTOCOL_ID = 12
 
+# one process per device, use "pyscada.opcua.worker.ShardedProcess" with
+# '{"dt_set":30, "shards":8}' as kwargs to spread the devices over a fixed
+# number of processes (0 shards for one per CPU core)
 parent_process_list = [
     {
         "pk": PROTOCOL_ID,
@@ -4,18 +4,106 @@ from __future__ import unicode_literals
 from pyscada.opcua import PROTOCOL_ID
 from pyscada.opcua.models import OPCUADevice, ExtendedOPCUADevice
 from pyscada.opcua.models import OPCUAVariable, ExtendedOPCUAVariable
-from pyscada.opcua.models import OPCUAMethodArgument
+from pyscada.opcua.models import OPCUAMethodArgument, OPCUARedundantServer
+from pyscada.opcua.models import OPCUADataSetReader, OPCUACapture
+from pyscada.opcua.capture import csv_lines, import_capture
+from pyscada.opcua.core.profiling import OFF, PROFILE, TIMING
+from pyscada.opcua.signals import request_bulk_reinit, request_reinit
 from pyscada.admin import DeviceAdmin
 from pyscada.admin import VariableAdmin
 from pyscada.admin import admin_site
 from pyscada.models import Device, DeviceProtocol, Variable
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import StreamingHttpResponse
 import nested_admin
 
+import re
+
 import logging
 
 logger = logging.getLogger(__name__)
 
+# "ns=2;i=5", "ns=2" or "i=5"
+NODEID_TERM = re.compile(r"^(?:ns=(\d+))?;?(?:i=(\d+))?$", re.IGNORECASE)
+NODEID_SEARCH_HELP = (
+    'Indexed search: "ns=2;i=5", "ns=2", "i=5", "nsu=" followed by a namespace '
+    "URI or the start of a browse path containing a /, other terms search the "
+    "names"
+)
+
+
+def nodeid_lookups(term, prefix=""):
+    """
+    lookups of a NodeId, namespace URI or browse path search term answered
+    by the OPCUAVariable indexes, None for other terms
+    """
+    term = term.strip()
+    if term.lower().startswith("nsu="):
+        return {f"{prefix}namespace_uri": term[4:]}
+    if "/" in term:
+        return {f"{prefix}browse_path__startswith": term.lstrip("/")}
+    match = NODEID_TERM.match(term)
+    if match is None or not any(match.groups()):
+        return None
+    lookups = {}
+    if match.group(1) is not None:
+        lookups[f"{prefix}NamespaceIndex"] = int(match.group(1))
+    if match.group(2) is not None:
+        lookups[f"{prefix}Identifier"] = int(match.group(2))
+    return lookups
+
+
+class DeferredJoinPaginator(Paginator):
+    """
+    Paginator of changelists sorted by primary key with a deferred join: the
+    OFFSET of the page is skipped on the primary key index alone, the rows
+    of the page and their joins are then fetched from the first key of the
+    page. The page count still needs one COUNT of the filtered rows. Other
+    sort orders are paginated as usual.
+    """
+
+    def page(self, number):
+        number = self.validate_number(number)
+        ordering = tuple(self.object_list.query.order_by)
+        if ordering not in (("pk",), ("id",), ("-pk",), ("-id",)):
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        keys = self.object_list.values_list("pk", flat=True)
+        first = list(keys[bottom : bottom + 1])
+        if not len(first):
+            return super().page(number)
+        lookup = "pk__lte" if ordering[0].startswith("-") else "pk__gte"
+        return self._get_page(
+            self.object_list.filter(**{lookup: first[0]})[: self.per_page],
+            number,
+            self,
+        )
+
+
+class ScalableChangeListMixin:
+    """
+    Changelist settings for tens of thousands of rows: deferred join
+    pagination, no second COUNT of the unfiltered rows and the indexed NodeId
+    search, nodeid_prefix is the path from the model to the OPCUAVariable
+    """
+
+    paginator = DeferredJoinPaginator
+    show_full_result_count = False
+    ordering = ("pk",)
+    search_help_text = NODEID_SEARCH_HELP
+    nodeid_prefix = ""
+
+    def get_search_results(self, request, queryset, search_term):
+        lookups = nodeid_lookups(search_term, self.nodeid_prefix)
+        if lookups is None:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(**lookups), False
+
 
 class OPCUADeviceAdminInline(admin.StackedInline):
     model = OPCUADevice
@@ -59,7 +147,7 @@ class OPCUAMethodAdminInline(nested_admin.NestedTabularInline):
     verbose_name_plural = "OPCUA Method"
 
 
-class OPCUAMethodAdmin(nested_admin.NestedModelAdmin):
+class OPCUAMethodAdmin(ScalableChangeListMixin, nested_admin.NestedModelAdmin):
     list_display = (
         "id",
         "name",
@@ -71,6 +159,9 @@ class OPCUAMethodAdmin(nested_admin.NestedModelAdmin):
     )
     # list_editable = ('active', 'writeable',)
     list_display_links = ("name",)
+    list_select_related = ("unit",)
+    search_fields = ("name",)
+    nodeid_prefix = "opcuavariable__"
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         if db_field.name == "device":
@@ -101,7 +192,7 @@ class OPCUAMethodArgumentAdminInline(admin.TabularInline):
     extra = 0
 
 
-class OPCUAMethodAdmin2(admin.ModelAdmin):
+class OPCUAMethodAdmin2(ScalableChangeListMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "opcua_variable",
@@ -116,6 +207,8 @@ class OPCUAMethodAdmin2(admin.ModelAdmin):
         "id",
         "opcua_variable",
     )
+    list_select_related = ("opcua_variable",)
+    search_fields = ("opcua_variable__name",)
     # raw_id_fields = ('opcua_variable',)
 
     # Disable changing opcua_variable
@@ -135,7 +228,7 @@ class OPCUAMethodAdmin2(admin.ModelAdmin):
     inlines = [OPCUAMethodArgumentAdminInline]
 
 
-class OPCUAMethodArgumentAdmin(admin.ModelAdmin):
+class OPCUAMethodArgumentAdmin(ScalableChangeListMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "opcua_method",
@@ -150,10 +243,324 @@ class OPCUAMethodArgumentAdmin(admin.ModelAdmin):
         "value",
     )
     list_display_links = ("id",)
+    list_select_related = ("opcua_method__opcua_variable",)
+    # a select of every method per row does not scale
+    raw_id_fields = ("opcua_method",)
+    search_fields = ("opcua_method__opcua_variable__name",)
+    nodeid_prefix = "opcua_method__"
+
+
+class OPCUAVariableAdminInline(admin.StackedInline):
+    model = OPCUAVariable
+    exclude = ("dataset_reader",)
+
+
+class OPCUAVariableActionForm(ActionForm):
+    device = forms.ModelChoiceField(
+        queryset=Device.objects.filter(protocol_id=PROTOCOL_ID),
+        required=False,
+        label="Device",
+    )
+    namespace_index = forms.IntegerField(
+        min_value=0, max_value=65535, required=False, label="NamespaceIndex"
+    )
+
+
+def _action_value(modeladmin, request, name):
+    try:
+        return modeladmin.action_form.base_fields[name].clean(request.POST.get(name))
+    except ValidationError:
+        return None
+
+
+def _bulk_update(modeladmin, request, queryset, restart=False, **values):
+    """
+    change the selected variables with one UPDATE and queue one coalesced
+    daq update per device
+    """
+    with transaction.atomic():
+        rows = list(queryset.values_list("pk", "device_id"))
+        count = queryset.update(**values)
+        request_bulk_reinit(rows, restart)
+    modeladmin.message_user(request, f"{count} variables changed")
+    return rows
+
+
+@admin.action(description="Activate the selected variables")
+def activate_variables(modeladmin, request, queryset):
+    _bulk_update(modeladmin, request, queryset, active=True)
+
+
+@admin.action(description="Deactivate the selected variables")
+def deactivate_variables(modeladmin, request, queryset):
+    _bulk_update(modeladmin, request, queryset, active=False)
+
+
+@admin.action(description="Move the selected variables to the chosen device")
+def move_variables(modeladmin, request, queryset):
+    device = _action_value(modeladmin, request, "device")
+    if device is None:
+        modeladmin.message_user(request, "Choose a device", level=messages.WARNING)
+        return
+    # the devices are polled at their own interval, both workers restart
+    _bulk_update(modeladmin, request, queryset, restart=True, device=device)
+    request_reinit(device.pk)
+
+
+@admin.action(description="Set the NamespaceIndex of the selected variables")
+def set_namespace_index(modeladmin, request, queryset):
+    namespace_index = _action_value(modeladmin, request, "namespace_index")
+    if namespace_index is None:
+        modeladmin.message_user(
+            request, "Enter a NamespaceIndex", level=messages.WARNING
+        )
+        return
+    with transaction.atomic():
+        rows = list(queryset.values_list("pk", "device_id"))
+        count = OPCUAVariable.objects.filter(
+            opcua_variable__in=queryset.values("pk")
+        ).update(NamespaceIndex=namespace_index)
+        request_bulk_reinit(rows)
+    modeladmin.message_user(request, f"{count} variables changed")
+
+
+class OPCUAVariableAdmin(ScalableChangeListMixin, VariableAdmin):
+    """
+    OPC-UA variables with their NodeId in one joined query, bulk actions
+    update all the selected rows in one statement
+    """
+
+    list_display = (
+        "id",
+        "name",
+        "device",
+        "value_class",
+        "active",
+        "writeable",
+        "node_id",
+        "browse_path",
+        "quality",
+    )
+    list_editable = ("active",)
+    list_display_links = ("name",)
+    list_select_related = ("device", "opcuavariable")
+    list_filter = (("device", admin.RelatedOnlyFieldListFilter), "active")
+    search_fields = ("name",)
+    nodeid_prefix = "opcuavariable__"
+    action_form = OPCUAVariableActionForm
+    actions = [
+        activate_variables,
+        deactivate_variables,
+        move_variables,
+        set_namespace_index,
+    ]
+    inlines = [OPCUAVariableAdminInline]
+
+    @admin.display(description="NodeId", ordering="opcuavariable__Identifier")
+    def node_id(self, instance):
+        node = instance.opcuavariable
+        if node.namespace_uri:
+            return f"nsu={node.namespace_uri};i={node.Identifier}"
+        return f"ns={node.NamespaceIndex};i={node.Identifier}"
+
+    @admin.display(description="Browse path")
+    def browse_path(self, instance):
+        return instance.opcuavariable.browse_path
+
+    @admin.display(description="Quality")
+    def quality(self, instance):
+        return instance.opcuavariable.get_quality_display()
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "device":
+            kwargs["queryset"] = Device.objects.filter(protocol=PROTOCOL_ID)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.filter(device__protocol_id=PROTOCOL_ID, opcuavariable__isnull=False)
+
+
+class OPCUARedundantServerAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "opcua_device",
+        "IP_address",
+        "port",
+        "path",
+        "priority",
+    )
+    list_editable = (
+        "IP_address",
+        "port",
+        "path",
+        "priority",
+    )
+    list_display_links = ("id",)
+    list_select_related = ("opcua_device__opcua_device",)
+
+
+class OPCUADataSetReaderAdmin(admin.ModelAdmin):
+    list_display = (
+        "id",
+        "opcua_device",
+        "name",
+        "publisher_id",
+        "writer_group_id",
+        "dataset_writer_id",
+    )
+    list_editable = (
+        "name",
+        "publisher_id",
+        "writer_group_id",
+        "dataset_writer_id",
+    )
+    list_display_links = ("id",)
+    list_select_related = ("opcua_device__opcua_device",)
+
+
+@admin.action(description="Enable phase timing")
+def enable_phase_timing(modeladmin, request, queryset):
+    queryset.update(profiling=TIMING)
+
+
+@admin.action(description="Enable cProfile")
+def enable_cprofile(modeladmin, request, queryset):
+    queryset.update(profiling=PROFILE)
+
+
+@admin.action(description="Disable profiling")
+def disable_profiling(modeladmin, request, queryset):
+    queryset.update(profiling=OFF)
+
+
+@admin.action(description="Record the traffic")
+def enable_traffic_recording(modeladmin, request, queryset):
+    queryset.update(record_traffic=True)
+
+
+@admin.action(description="Stop recording the traffic")
+def disable_traffic_recording(modeladmin, request, queryset):
+    queryset.update(record_traffic=False)
+
+
+class OPCUADeviceProfilingAdmin(admin.ModelAdmin):
+    """
+    Profiling and traffic recording settings of the OPC-UA devices, saved
+    without restarting the device workers (the device admin restarts them on
+    every save)
+    """
+
+    list_display = (
+        "id",
+        "opcua_device",
+        "profiling",
+        "profiling_sample",
+        "record_traffic",
+    )
+    list_editable = (
+        "profiling",
+        "profiling_sample",
+        "record_traffic",
+    )
+    list_display_links = ("id",)
+    list_select_related = ("opcua_device",)
+    fields = ("opcua_device", "profiling", "profiling_sample", "record_traffic")
+    readonly_fields = ("opcua_device",)
+    actions = [
+        enable_phase_timing,
+        enable_cprofile,
+        disable_profiling,
+        enable_traffic_recording,
+        disable_traffic_recording,
+    ]
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.action(description="Arm the selected captures")
+def arm_captures(modeladmin, request, queryset):
+    queryset.exclude(state__in=(OPCUACapture.RECORDING, OPCUACapture.STOPPING)).update(
+        state=OPCUACapture.ARMED, message=""
+    )
+
+
+@admin.action(description="Stop the selected captures")
+def stop_captures(modeladmin, request, queryset):
+    queryset.filter(state=OPCUACapture.ARMED).update(state=OPCUACapture.IDLE)
+    queryset.filter(state=OPCUACapture.RECORDING).update(state=OPCUACapture.STOPPING)
+
+
+@admin.action(description="Download the selected capture as CSV")
+def download_capture(modeladmin, request, queryset):
+    capture = queryset.filter(state=OPCUACapture.DONE).exclude(file="").first()
+    if capture is None:
+        modeladmin.message_user(
+            request, "Select a finished capture", level=messages.WARNING
+        )
+        return None
+    response = StreamingHttpResponse(csv_lines(capture), content_type="text/csv")
+    response["Content-Disposition"] = f'attachment; filename="capture-{capture.pk}.csv"'
+    return response
+
+
+@admin.action(description="Import the selected captures downsampled")
+def import_captures(modeladmin, request, queryset):
+    for capture in queryset.filter(state=OPCUACapture.DONE).exclude(file=""):
+        try:
+            count = import_capture(capture)
+        except (OSError, ValueError) as e:
+            modeladmin.message_user(
+                request, f"{capture} not imported : {e}", level=messages.ERROR
+            )
+            continue
+        modeladmin.message_user(request, f"{capture} : {count} values imported")
+
+
+class OPCUACaptureAdmin(admin.ModelAdmin):
+    """
+    Burst captures, saved without restarting the device workers which pick
+    up the armed and stopped captures on their own
+    """
+
+    list_display = (
+        "id",
+        "opcua_device",
+        "name",
+        "trigger",
+        "state",
+        "samples",
+        "started",
+        "finished",
+        "message",
+    )
+    list_display_links = ("id", "name")
+    list_filter = ("state",)
+    list_select_related = ("opcua_device__opcua_device",)
+    filter_horizontal = ("variables",)
+    readonly_fields = ("state", "file", "samples", "started", "finished", "message")
+    actions = [arm_captures, stop_captures, download_capture, import_captures]
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == "trigger_variable":
+            kwargs["queryset"] = Variable.objects.filter(device__protocol=PROTOCOL_ID)
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == "variables":
+            kwargs["queryset"] = Variable.objects.filter(
+                device__protocol=PROTOCOL_ID, opcuavariable__isnull=False
+            )
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
 
 
 # admin_site.register(ExtendedOPCUADevice, OPCUASeviceAdmin)
-# admin_site.register(ExtendedOPCUAVariable, OPCUAVariableAdmin)
+admin_site.register(ExtendedOPCUAVariable, OPCUAVariableAdmin)
 # admin_site.register(OPCUAMethod, OPCUAMethodAdmin)
 admin_site.register(OPCUAMethod, OPCUAMethodAdmin)
 # admin_site.register(OPCUAMethodArgument, OPCUAMethodArgumentAdmin)
+admin_site.register(OPCUARedundantServer, OPCUARedundantServerAdmin)
+admin_site.register(OPCUADataSetReader, OPCUADataSetReaderAdmin)
+admin_site.register(OPCUADevice, OPCUADeviceProfilingAdmin)
+admin_site.register(OPCUACapture, OPCUACaptureAdmin)
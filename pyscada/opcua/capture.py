@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import RecordedData, Variable
+from pyscada.opcua.core.capture import CaptureFile
+from pyscada.opcua.core.conversion import sample_converter
+
+from django.conf import settings
+from django.utils import timezone
+
+from datetime import datetime
+from datetime import timezone as dt_timezone
+import os
+import tempfile
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# RecordedData rows per INSERT of an import
+IMPORT_BATCH_SIZE = 5000
+CSV_HEADER = ("variable", "timestamp", "value", "status")
+
+
+def capture_directory():
+    return getattr(
+        settings,
+        "PYSCADA_OPCUA_CAPTURE_DIR",
+        os.path.join(tempfile.gettempdir(), "pyscada-opcua-captures"),
+    )
+
+
+def capture_path(capture):
+    return os.path.join(
+        capture_directory(),
+        f"capture-{capture.pk}-{timezone.now().strftime('%Y%m%d-%H%M%S')}.cap",
+    )
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp, dt_timezone.utc).isoformat()
+
+
+def csv_lines(capture):
+    """
+    lines of the CSV export of a capture file, one sample per line
+    """
+    names = dict(
+        Variable.objects.filter(pk__in=capture.variables.all()).values_list(
+            "pk", "name"
+        )
+    )
+    data = CaptureFile.open(capture.file)
+    try:
+        yield ",".join(CSV_HEADER) + "\n"
+        for variable_id, timestamp, value, status in data.rows():
+            yield (
+                f"{names.get(variable_id, variable_id)},{_iso(timestamp)},"
+                f"{value!r},0x{status:08X}\n"
+            )
+    finally:
+        data.close()
+
+
+def import_capture(capture, interval=None):
+    """
+    write the mean of the good samples of a capture per interval seconds to
+    the recorded data, return the number of rows
+    """
+    interval = capture.import_interval if interval is None else interval
+    data = CaptureFile.open(capture.file)
+    now = timezone.now()
+    count = 0
+    try:
+        variables = (
+            Variable.objects.filter(opcuavariable__isnull=False)
+            .select_related("opcuavariable", "scaling")
+            .in_bulk(data.variable_ids)
+        )
+        for column, variable_id in enumerate(data.variable_ids):
+            variable = variables.get(variable_id)
+            if variable is None:
+                continue
+            convert = sample_converter(variable)
+            items = [
+                RecordedData(
+                    variable=variable,
+                    value=value,
+                    timestamp=timestamp,
+                    date_saved=now,
+                )
+                for timestamp, value in data.downsample(column, interval, convert)
+            ]
+            # samples already recorded at the same time are kept
+            RecordedData.objects.bulk_create(
+                items, batch_size=IMPORT_BATCH_SIZE, ignore_conflicts=True
+            )
+            count += len(items)
+    finally:
+        data.close()
+    logger.info(f"OPC-UA capture {capture} : {count} values imported")
+    return count
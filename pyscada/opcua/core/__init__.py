@@ -0,0 +1,6 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+# Protocol logic of the OPC-UA driver (read plan, batching, value conversion,
+# caching and cycle scheduling). Nothing in this package imports Django or
+# asyncua at import time, so it can be imported and benchmarked on its own.
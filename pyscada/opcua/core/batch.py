@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .columns import np
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# a value is stored at least every REFRESH_INTERVAL seconds, like
+# Variable.update_values does
+REFRESH_INTERVAL = 3600
+# StatusCode severity bits, a value is only used if both are clear
+STATUS_NOT_GOOD = 0xC0000000
+
+
+def scaling_parameters(scaling):
+    """
+    (gain, offset, low, high) of a linear PyScada scaling, low/high limit the
+    input when limit_input is set, None if the scaling is not linear
+    """
+    if scaling is None:
+        return 1.0, 0.0, -float("inf"), float("inf")
+    try:
+        input_low = float(scaling.input_low)
+        input_high = float(scaling.input_high)
+        output_low = float(scaling.output_low)
+        output_high = float(scaling.output_high)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if input_high == input_low:
+        return None
+    gain = (output_high - output_low) / (input_high - input_low)
+    offset = output_low - input_low * gain
+    if getattr(scaling, "limit_input", False):
+        return gain, offset, min(input_low, input_high), max(input_low, input_high)
+    return gain, offset, -float("inf"), float("inf")
+
+
+class BatchUpdate:
+    """
+    Vectorized scaling and change detection over the ReadColumns of a plan.
+
+    Only the entries whose scaled value moved by more than the variable
+    cov_increment, or that were not stored for REFRESH_INTERVAL seconds, are
+    handed to Variable.update_values. Entries that can not be handled as
+    floats (non numeric values, bit extraction, non linear scaling) are
+    always handed over.
+    """
+
+    def __init__(self):
+        self.plan_version = None
+        self.size = 0
+
+    @property
+    def available(self):
+        return np is not None
+
+    def prepare(self, plan):
+        """
+        (re)build the per entry parameters when the plan changed, the stored
+        state of the variables that stay in the plan is kept
+        """
+        if self.plan_version == plan.version:
+            return
+        previous = {}
+        if self.plan_version is not None:
+            for position, variable_id in enumerate(self.variable_ids.tolist()):
+                previous[variable_id] = (
+                    self.last_value[position],
+                    self.last_time[position],
+                )
+        size = len(plan)
+        self.size = size
+        self.variable_ids = np.zeros(size, dtype=np.int64)
+        self.gain = np.ones(size, dtype=np.float64)
+        self.offset = np.zeros(size, dtype=np.float64)
+        self.low = np.full(size, -np.inf, dtype=np.float64)
+        self.high = np.full(size, np.inf, dtype=np.float64)
+        self.cov = np.zeros(size, dtype=np.float64)
+        self.vectorized = np.zeros(size, dtype=bool)
+        self.last_value = np.full(size, np.nan, dtype=np.float64)
+        self.last_time = np.full(size, -np.inf, dtype=np.float64)
+        self.scaled = np.full(size, np.nan, dtype=np.float64)
+        for position, (variable, converter) in enumerate(
+            zip(plan.variables, plan.converters)
+        ):
+            self.variable_ids[position] = variable.pk
+            self.cov[position] = float(getattr(variable, "cov_increment", 0) or 0)
+            if str(variable.value_class).upper() in ("BOOL", "BOOLEAN"):
+                parameters = scaling_parameters(None)
+            else:
+                parameters = scaling_parameters(variable.scaling)
+            if parameters is not None:
+                (
+                    self.gain[position],
+                    self.offset[position],
+                    self.low[position],
+                    self.high[position],
+                ) = parameters
+            self.vectorized[position] = parameters is not None and (
+                converter is None or converter.bit is None
+            )
+            if variable.pk in previous:
+                self.last_value[position], self.last_time[position] = previous[
+                    variable.pk
+                ]
+        self.plan_version = plan.version
+
+    def candidates(self, plan, columns, read_time):
+        """
+        split the plan positions in the ones to hand to update_values and the
+        good numeric ones that did not change
+        """
+        if not self.available:
+            return list(range(len(plan))), []
+        self.prepare(plan)
+        values = columns.values
+        good = (columns.status & STATUS_NOT_GOOD) == 0
+        numeric = good & ~np.isnan(values) & self.vectorized
+        if len(columns.objects):
+            numeric[list(columns.objects.keys())] = False
+        np.multiply(np.clip(values, self.low, self.high), self.gain, out=self.scaled)
+        self.scaled += self.offset
+        with np.errstate(invalid="ignore"):
+            moved = ~(np.abs(self.scaled - self.last_value) <= self.cov)
+        due = (read_time - self.last_time) >= REFRESH_INTERVAL
+        changed = numeric & (moved | due)
+        unchanged = numeric & ~changed
+        # not vectorized entries with any status, methods are called on
+        # BadAttributeIdInvalid by the handler
+        other = ~numeric & ~(good & np.isnan(values) & self.vectorized)
+        if len(columns.objects):
+            other[list(columns.objects.keys())] = True
+        return (
+            np.flatnonzero(changed | other).tolist(),
+            np.flatnonzero(unchanged).tolist(),
+        )
+
+    def stored(self, position, read_time):
+        """
+        remember the value of a position stored by update_values
+        """
+        if not self.available or position >= self.size:
+            return
+        if self.vectorized[position]:
+            self.last_value[position] = self.scaled[position]
+            self.last_time[position] = read_time
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# children of the RootFolder, their BrowseName is in namespace 0
+ROOT_CHILDREN = ("Objects", "Types", "Views")
+# TranslateBrowsePathsToNodeIds request size
+TRANSLATE_CHUNK_SIZE = 500
+
+
+def parse_browse_path(path):
+    """
+    [(namespace index or None, name), ...] of a browse path relative to the
+    RootFolder like "Objects/2:PLC1/DB10/Temperature"
+
+    A segment without "index:" prefix is in namespace 0 when it is the first
+    segment and a child of the RootFolder, in the namespace of the variable
+    otherwise (None).
+    """
+    segments = []
+    for position, segment in enumerate(str(path).strip().strip("/").split("/")):
+        segment = segment.strip()
+        if not len(segment):
+            raise ValueError(f"empty segment in browse path {path!r}")
+        index, separator, name = segment.partition(":")
+        if separator and index.isdigit() and len(name):
+            segments.append((int(index), name))
+        elif position == 0 and segment in ROOT_CHILDREN:
+            segments.append((0, segment))
+        else:
+            segments.append((None, segment))
+    return segments
+
+
+def browse_path_request(path, namespace_index):
+    """
+    ua.BrowsePath from the RootFolder following the hierarchical references
+    of path, namespace_index is used for the segments without index
+    """
+    from asyncua import ua
+
+    relative_path = ua.RelativePath()
+    for index, name in parse_browse_path(path):
+        element = ua.RelativePathElement()
+        element.ReferenceTypeId = ua.NodeId(ua.ObjectIds.HierarchicalReferences)
+        element.IsInverse = False
+        element.IncludeSubtypes = True
+        element.TargetName = ua.QualifiedName(
+            name, namespace_index if index is None else index
+        )
+        relative_path.Elements.append(element)
+    browse_path = ua.BrowsePath()
+    browse_path.StartingNode = ua.NodeId(ua.ObjectIds.RootFolder)
+    browse_path.RelativePath = relative_path
+    return browse_path
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import OrderedDict, namedtuple
+from time import time
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# entries per device before the least recently used ones are evicted
+CACHE_MAX_SIZE = 100000
+# seconds after which a cached value is considered stale by default
+CACHE_MAX_AGE = 60
+
+CachedValue = namedtuple("CachedValue", ["value", "timestamp", "status", "received"])
+
+
+class ValueCache:
+    """
+    Latest value per variable of a device, fed by the acquisition loop.
+
+    The values are scaled like Variable.update_values stores them. Entries
+    older than max_age are not returned, the least recently used entries are
+    evicted when more than max_size variables are cached.
+
+    The cache lives in the memory of the process running the acquisition of
+    the device, only callers in that process (the handler, its captures and
+    write tasks) see it. Other processes read the recorded data.
+    """
+
+    def __init__(self, max_size=CACHE_MAX_SIZE, max_age=CACHE_MAX_AGE):
+        self.max_size = max_size
+        self.max_age = max_age
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def put(self, key, value, timestamp, status=0):
+        self.put_many(((key, value, timestamp, status),))
+
+    def put_many(self, items):
+        """
+        store (key, value, timestamp, status) tuples received in one cycle
+        """
+        received = time()
+        with self._lock:
+            for key, value, timestamp, status in items:
+                self._data[key] = CachedValue(value, timestamp, status, received)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def get(self, key, max_age=None):
+        """
+        cached entry of key or None if unknown or older than max_age seconds
+        """
+        max_age = self.max_age if max_age is None else max_age
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if max_age is not None and time() - entry.received > max_age:
+                return None
+            self._data.move_to_end(key)
+            return entry
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(device_id):
+    """
+    value cache of a device in this process, created on first use
+    """
+    cache = _caches.get(device_id)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(device_id, ValueCache())
+    return cache
+
+
+def get_cached_value(device_id, variable_id, max_age=None):
+    """
+    latest value of a variable acquired in this process or None, always None
+    in a process not running the acquisition of the device
+    """
+    cache = _caches.get(device_id)
+    if cache is None:
+        return None
+    return cache.get(variable_id, max_age)
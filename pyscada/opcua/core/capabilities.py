@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .scheduler import RunningStatistics
+
+from collections import deque
+import logging
+
+logger = logging.getLogger(__name__)
+
+# capability -> ObjectIds name of the Server node holding it
+CAPABILITY_NODES = {
+    "max_nodes_per_read": "Server_ServerCapabilities_OperationLimits_MaxNodesPerRead",
+    "max_nodes_per_write": "Server_ServerCapabilities_OperationLimits_MaxNodesPerWrite",
+    "max_nodes_per_method_call": (
+        "Server_ServerCapabilities_OperationLimits_MaxNodesPerMethodCall"
+    ),
+    "max_nodes_per_register_nodes": (
+        "Server_ServerCapabilities_OperationLimits_MaxNodesPerRegisterNodes"
+    ),
+    "max_nodes_per_translate": (
+        "Server_ServerCapabilities_OperationLimits_"
+        "MaxNodesPerTranslateBrowsePathsToNodeIds"
+    ),
+    "max_nodes_per_history_read_data": (
+        "Server_ServerCapabilities_OperationLimits_MaxNodesPerHistoryReadData"
+    ),
+    "max_monitored_items_per_call": (
+        "Server_ServerCapabilities_OperationLimits_MaxMonitoredItemsPerCall"
+    ),
+    "max_sessions": "Server_ServerCapabilities_MaxSessions",
+    "min_supported_sample_rate": "Server_ServerCapabilities_MinSupportedSampleRate",
+}
+
+# time the items of a request may add to the round trip time, in seconds
+TARGET_RESPONSE_TIME = 0.5
+# number of recent requests the baseline round trip time is taken from
+BASELINE_WINDOW = 50
+# share of the measured read cycle time kept as margin in the polling interval
+INTERVAL_MARGIN = 1.2
+
+
+class Capabilities:
+    """
+    ServerCapabilities and OperationLimits announced by a server, 0 or a
+    missing value means no limit
+    """
+
+    def __init__(self, values=None):
+        self.values = {
+            name: values.get(name, 0) if values else 0 for name in CAPABILITY_NODES
+        }
+
+    def __getattr__(self, name):
+        try:
+            return self.__dict__["values"][name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __repr__(self):
+        return f"Capabilities({self.values})"
+
+    def limit(self, name, default):
+        """
+        default capped by the limit announced for name
+        """
+        limit = self.values.get(name) or 0
+        return min(default, int(limit)) if limit > 0 else default
+
+    @property
+    def min_interval(self):
+        """
+        MinSupportedSampleRate in seconds
+        """
+        return float(self.values.get("min_supported_sample_rate") or 0) / 1000.0
+
+
+async def read_capabilities(client):
+    """
+    read the Capabilities of a server in one Read request, the limits a
+    server does not expose stay unlimited
+    """
+    from asyncua import ua
+
+    names = list(CAPABILITY_NODES)
+    data_values = await client.uaclient.read_attributes(
+        [ua.NodeId(getattr(ua.ObjectIds, CAPABILITY_NODES[n])) for n in names],
+        ua.AttributeIds.Value,
+    )
+    values = {}
+    for name, data_value in zip(names, data_values):
+        if data_value.StatusCode.is_good() and data_value.Value is not None:
+            try:
+                values[name] = max(0, float(data_value.Value.Value or 0))
+            except (TypeError, ValueError):
+                pass
+    return Capabilities(values)
+
+
+class Tuner:
+    """
+    Size of the requests of one kind, tuned on their response time.
+
+    The round trip time of the link is not held against the size, only the
+    time the items add to it. Both are fitted on the last BASELINE_WINDOW
+    requests (duration = round trip + count * item time), the size grows by
+    step while the items add less than half of the target and is halved
+    when they add more than the target or a request fails (additive
+    increase, multiplicative decrease), between minimum and the limit of the
+    server.
+    """
+
+    def __init__(
+        self, start, limit=None, minimum=1, step=None, target=TARGET_RESPONSE_TIME
+    ):
+        self.minimum = max(1, int(minimum))
+        self.limit = max(self.minimum, int(limit or start))
+        self.step = max(1, int(step or start // 10))
+        self.target = target
+        self.size = max(self.minimum, min(int(start), self.limit))
+        self.response_time = RunningStatistics()
+        self._recent = deque(maxlen=BASELINE_WINDOW)
+
+    @property
+    def baseline(self):
+        """
+        round trip time of the link, the intercept of the durations of the
+        recent requests over their size, at most the fastest of them
+        """
+        if not len(self._recent):
+            return 0.0
+        fastest = min(duration for _, duration in self._recent)
+        n = len(self._recent)
+        mean_count = sum(count for count, _ in self._recent) / n
+        mean_duration = sum(duration for _, duration in self._recent) / n
+        variance = sum((count - mean_count) ** 2 for count, _ in self._recent)
+        if variance == 0:
+            return fastest
+        slope = (
+            sum(
+                (count - mean_count) * (duration - mean_duration)
+                for count, duration in self._recent
+            )
+            / variance
+        )
+        return max(0.0, min(fastest, mean_duration - max(0.0, slope) * mean_count))
+
+    def set_limit(self, limit):
+        self.limit = max(self.minimum, int(limit))
+        self.size = min(self.size, self.limit)
+
+    def record(self, count, duration, failed=False):
+        """
+        measure a request of count items, returns the next size
+        """
+        self.response_time.add(duration)
+        if not failed:
+            self._recent.append((count, duration))
+        excess = duration - self.baseline
+        if failed or excess > self.target:
+            size = max(self.minimum, self.size // 2)
+            if size < self.size:
+                logger.debug(
+                    f"request size {self.size} -> {size} after {duration:.3f}s "
+                    f"({self.baseline:.3f}s round trip)"
+                )
+            self.size = size
+        elif excess < self.target / 2 and count >= self.size:
+            self.size = min(self.limit, self.size + self.step)
+        return self.size
+
+    def chunks(self, items):
+        """
+        items cut in chunks of the current size
+        """
+        size = self.size
+        return [items[start : start + size] for start in range(0, len(items), size)]
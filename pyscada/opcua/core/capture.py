@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import mmap
+import os
+import struct
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"PSOPCCAP"
+VERSION = 1
+# magic, version, columns, capacity per column
+HEADER = struct.Struct("<8sHHI")
+# variable id and number of samples of a column
+COLUMN_HEADER = struct.Struct("<II")
+# bytes per sample: timestamp (float64), value (float64), status (uint32)
+SAMPLE_SIZE = 8 + 8 + 4
+NAN = float("nan")
+
+# trigger conditions on the value of a variable, previous is the value of
+# the cycle before
+CONDITIONS = {
+    ">": lambda value, threshold, previous: value > threshold,
+    ">=": lambda value, threshold, previous: value >= threshold,
+    "<": lambda value, threshold, previous: value < threshold,
+    "<=": lambda value, threshold, previous: value <= threshold,
+    "==": lambda value, threshold, previous: value == threshold,
+    "!=": lambda value, threshold, previous: value != threshold,
+    "rising": lambda value, threshold, previous: (
+        previous is not None and previous <= threshold < value
+    ),
+    "falling": lambda value, threshold, previous: (
+        previous is not None and previous >= threshold > value
+    ),
+}
+
+
+def condition_met(condition, value, threshold, previous=None):
+    """
+    True if value satisfies condition against threshold, False for unknown
+    conditions and non numeric values
+    """
+    try:
+        value = float(value)
+        previous = None if previous is None else float(previous)
+        return bool(CONDITIONS[condition](value, float(threshold), previous))
+    except (KeyError, TypeError, ValueError):
+        return False
+
+
+class CaptureFile:
+    """
+    Memory-mapped columnar file of the samples of a capture.
+
+    Each variable gets a column of capacity samples made of three contiguous
+    arrays: timestamps and values as float64, StatusCodes as uint32. Samples
+    are appended in place, the file is usable while it is written and after
+    a crash up to the last counted sample.
+    """
+
+    def __init__(self, path, variable_ids, capacity, writable=False):
+        self.path = path
+        self.variable_ids = list(variable_ids)
+        self.capacity = capacity
+        self.writable = writable
+        self._file = None
+        self._map = None
+        self._counts = [0] * len(self.variable_ids)
+
+    @classmethod
+    def create(cls, path, variable_ids, capacity):
+        """
+        allocate the file of a new capture
+        """
+        capture = cls(path, variable_ids, max(int(capacity), 1), writable=True)
+        size = capture.data_offset + len(capture.variable_ids) * (
+            capture.capacity * SAMPLE_SIZE
+        )
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "wb") as f:
+            f.truncate(size)
+        capture._open("r+b")
+        HEADER.pack_into(
+            capture._map, 0, MAGIC, VERSION, len(capture.variable_ids), capture.capacity
+        )
+        for column, variable_id in enumerate(capture.variable_ids):
+            COLUMN_HEADER.pack_into(
+                capture._map, capture._column_header(column), variable_id, 0
+            )
+        return capture
+
+    @classmethod
+    def open(cls, path):
+        """
+        open an existing capture read only
+        """
+        with open(path, "rb") as f:
+            magic, version, columns, capacity = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a capture file")
+            headers = [
+                COLUMN_HEADER.unpack(f.read(COLUMN_HEADER.size)) for _ in range(columns)
+            ]
+        capture = cls(path, [variable_id for variable_id, _ in headers], capacity)
+        capture._open("rb")
+        capture._counts = [count for _, count in headers]
+        return capture
+
+    def _open(self, mode):
+        self._file = open(self.path, mode)
+        self._map = mmap.mmap(
+            self._file.fileno(),
+            0,
+            access=mmap.ACCESS_WRITE if self.writable else mmap.ACCESS_READ,
+        )
+        # typed views on the columns, only their slices are handed out
+        self._views = [memoryview(self._map)]
+        self._timestamps = []
+        self._values = []
+        self._status = []
+        for column in range(len(self.variable_ids)):
+            start = self._column_offset(column)
+            for array, size, code in (
+                (self._timestamps, 8, "d"),
+                (self._values, 8, "d"),
+                (self._status, 4, "I"),
+            ):
+                end = start + size * self.capacity
+                view = self._views[0][start:end]
+                array.append(view.cast(code))
+                self._views += [view, array[-1]]
+                start = end
+
+    @property
+    def data_offset(self):
+        return HEADER.size + len(self.variable_ids) * COLUMN_HEADER.size
+
+    def _column_header(self, column):
+        return HEADER.size + column * COLUMN_HEADER.size
+
+    def _column_offset(self, column):
+        return self.data_offset + column * self.capacity * SAMPLE_SIZE
+
+    @property
+    def closed(self):
+        return self._map is None
+
+    def __len__(self):
+        return sum(self._counts)
+
+    def count(self, column):
+        return self._counts[column]
+
+    @property
+    def full(self):
+        return all(count >= self.capacity for count in self._counts)
+
+    def append(self, column, timestamp, value, status=0):
+        """
+        store one sample of a column, False if the column is full
+        """
+        count = self._counts[column]
+        if count >= self.capacity:
+            return False
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            value = NAN
+        self._timestamps[column][count] = timestamp
+        self._values[column][count] = value
+        self._status[column][count] = status & 0xFFFFFFFF
+        self._counts[column] = count + 1
+        COLUMN_HEADER.pack_into(
+            self._map,
+            self._column_header(column),
+            self.variable_ids[column],
+            count + 1,
+        )
+        return True
+
+    def column(self, column):
+        """
+        (timestamps, values, status) memoryviews of the samples of a column
+        """
+        count = self._counts[column]
+        return (
+            self._timestamps[column][:count],
+            self._values[column][:count],
+            self._status[column][:count],
+        )
+
+    def downsample(self, column, interval, convert=None):
+        """
+        [(timestamp, mean value), ...] of the good samples of a column per
+        interval seconds, the timestamp is the start of the interval, convert
+        is applied to each sample before the mean
+        """
+        timestamps, values, status = self.column(column)
+        result = []
+        bucket = None
+        total = 0.0
+        samples = 0
+        for timestamp, value, code in zip(timestamps, values, status):
+            if code & 0xC0000000 or value != value:
+                continue
+            if convert is not None:
+                value = convert(value)
+                if value is None:
+                    continue
+            start = timestamp - timestamp % interval
+            if start != bucket:
+                if samples:
+                    result.append((bucket, total / samples))
+                bucket, total, samples = start, 0.0, 0
+            total += value
+            samples += 1
+        if samples:
+            result.append((bucket, total / samples))
+        return result
+
+    def rows(self):
+        """
+        (variable_id, timestamp, value, status) of all samples, column by column
+        """
+        for column, variable_id in enumerate(self.variable_ids):
+            for timestamp, value, status in zip(*self.column(column)):
+                yield variable_id, timestamp, value, status
+
+    def flush(self):
+        if self._map is not None and self.writable:
+            self._map.flush()
+
+    def close(self):
+        if self._map is None:
+            return
+        self.flush()
+        # the views have to be released before the map can be closed
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        self._timestamps = self._values = self._status = []
+        self._map.close()
+        self._file.close()
+        self._map = None
+        self._file = None
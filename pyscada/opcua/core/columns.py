@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# status of the entries that got no response in a cycle
+BAD_NO_COMMUNICATION = 0x80310000
+NAN = float("nan")
+# largest integer a float64 represents exactly
+MAX_EXACT_INTEGER = 2**53
+
+
+class ReadColumns:
+    """
+    Result of one read of a plan, one column per field, indexed by plan position.
+
+    Numeric values go to the preallocated float column, values that are not
+    representable as a float (strings, arrays, 64 bit integers beyond 2**53,
+    method outputs) are kept in `objects`. The arrays are reused from one
+    cycle to the next as long as the plan size does not change.
+    """
+
+    def __init__(self, size=0):
+        self.size = -1
+        self.objects = {}
+        self.resize(size)
+
+    def resize(self, size):
+        if size == self.size:
+            return
+        self.size = size
+        if np is not None:
+            self.values = np.full(size, np.nan, dtype=np.float64)
+            self.status = np.full(size, BAD_NO_COMMUNICATION, dtype=np.uint32)
+            self.source_time = np.full(size, np.nan, dtype=np.float64)
+            self.server_time = np.full(size, np.nan, dtype=np.float64)
+        else:
+            self.values = [NAN] * size
+            self.status = [BAD_NO_COMMUNICATION] * size
+            self.source_time = [NAN] * size
+            self.server_time = [NAN] * size
+        self.objects = {}
+
+    def reset(self):
+        """
+        mark all entries as not received
+        """
+        if np is not None:
+            self.values.fill(np.nan)
+            self.status.fill(BAD_NO_COMMUNICATION)
+            self.source_time.fill(np.nan)
+            self.server_time.fill(np.nan)
+        else:
+            for column in (self.values, self.source_time, self.server_time):
+                column[:] = [NAN] * self.size
+            self.status[:] = [BAD_NO_COMMUNICATION] * self.size
+        self.objects.clear()
+
+    def set(self, position, value, status, source_time=NAN, server_time=NAN):
+        """
+        store one result, used by the generic (non binary) decoding
+        """
+        self.status[position] = status
+        self.source_time[position] = source_time
+        self.server_time[position] = server_time
+        if value is None:
+            return
+        if isinstance(value, int):
+            # bool included
+            numeric = abs(value) <= MAX_EXACT_INTEGER
+        else:
+            # NaN would read as not received
+            numeric = isinstance(value, float) and value == value
+        if numeric:
+            self.values[position] = value
+        else:
+            self.objects[position] = value
+
+    def value(self, position):
+        """
+        value at position or None if nothing was received
+        """
+        value = self.objects.get(position)
+        if value is not None:
+            return value
+        value = self.values[position]
+        return None if value != value else float(value)
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from datetime import datetime, timezone
+import struct
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# asyncua.ua, imported by the first Converter or variant_type call
+ua = None
+
+
+def _load_ua():
+    global ua
+    if ua is None:
+        from asyncua import ua as asyncua_ua
+
+        ua = asyncua_ua
+    return ua
+
+
+# PyScada value class -> OPC-UA VariantType name
+VALUE_CLASS_VARIANT_TYPE = {
+    "FLOAT64": "Double",
+    "DOUBLE": "Double",
+    "FLOAT": "Double",
+    "LREAL": "Double",
+    "UNIXTIMEF64": "Double",
+    "FLOAT32": "Float",
+    "SINGLE": "Float",
+    "REAL": "Float",
+    "UNIXTIMEF32": "Float",
+    "UINT64": "UInt64",
+    "INT64": "Int64",
+    "UNIXTIMEI64": "Int64",
+    "INT32": "Int32",
+    "UINT32": "UInt32",
+    "DWORD": "UInt32",
+    "UNIXTIMEI32": "UInt32",
+    "INT16": "Int16",
+    "INT": "Int16",
+    "UINT": "UInt16",
+    "UINT16": "UInt16",
+    "WORD": "UInt16",
+    "INT8": "SByte",
+    "UINT8": "Byte",
+    "BYTE": "Byte",
+    "BOOL": "Boolean",
+    "BOOLEAN": "Boolean",
+}
+
+# VariantType name -> big endian struct format, used to unpack ByteStrings
+VARIANT_TYPE_STRUCT = {
+    "Double": ">d",
+    "Float": ">f",
+    "UInt64": ">Q",
+    "Int64": ">q",
+    "Int32": ">i",
+    "UInt32": ">I",
+    "Int16": ">h",
+    "UInt16": ">H",
+    "SByte": ">b",
+    "Byte": ">B",
+    "Boolean": ">?",
+}
+
+
+def _to_float(value):
+    return float(value)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return int(float(value))
+
+
+def _to_bool(value):
+    if isinstance(value, str):
+        return bool(float(value))
+    return bool(value)
+
+
+# VariantType name -> python cast applied before the value is sent
+VARIANT_TYPE_ENCODER = {
+    "Double": _to_float,
+    "Float": _to_float,
+    "UInt64": _to_int,
+    "Int64": _to_int,
+    "Int32": _to_int,
+    "UInt32": _to_int,
+    "Int16": _to_int,
+    "UInt16": _to_int,
+    "SByte": _to_int,
+    "Byte": _to_int,
+    "Boolean": _to_bool,
+}
+
+_variant_types = {}
+
+
+def variant_type(class_str):
+    """
+    VariantType of a PyScada value class, VT.Variant for unknown classes
+    """
+    result = _variant_types.get(class_str)
+    if result is None:
+        name = VALUE_CLASS_VARIANT_TYPE.get(str(class_str).upper(), "Variant")
+        result = getattr(_load_ua().VariantType, name)
+        _variant_types[class_str] = result
+    return result
+
+
+def reorder_bytes(data, byte_order):
+    """
+    reorder the bytes of each 4 byte group, byte_order like "3-2-1-0"
+    """
+    if byte_order in (None, "", "default", "0-1-2-3"):
+        return data
+    order = [int(i) for i in byte_order.split("-")]
+    data = bytes(data)
+    output = bytearray()
+    for start in range(0, len(data) - len(data) % len(order), len(order)):
+        group = data[start : start + len(order)]
+        output += bytes(group[i] for i in order)
+    output += data[len(data) - len(data) % len(order) :]
+    return bytes(output)
+
+
+class Converter:
+    """
+    Value conversion of one variable, bound once when the read plan is built.
+
+    encode turns a PyScada value into a Variant of the variable value class,
+    decode turns a read value into a value update_values can store. Scaling
+    stays with PyScada (Variable.update_values and the write task handling).
+    """
+
+    __slots__ = (
+        "variant_type",
+        "_encode",
+        "_struct",
+        "bit",
+        "byte_order",
+    )
+
+    def __init__(self, value_class, bit=None, byte_order=None):
+        self.variant_type = variant_type(value_class)
+        name = self.variant_type.name
+        self._encode = VARIANT_TYPE_ENCODER.get(name)
+        self._struct = VARIANT_TYPE_STRUCT.get(name)
+        self.bit = bit
+        self.byte_order = byte_order
+
+    def encode(self, value):
+        if self._encode is None:
+            return ua.Variant(value)
+        return ua.Variant(self._encode(value), self.variant_type)
+
+    def decode(self, value):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray)):
+            if self._struct is None:
+                return None
+            data = reorder_bytes(value, self.byte_order)
+            value = struct.unpack_from(self._struct, data)[0]
+        elif isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            value = value.timestamp()
+        if self.bit is not None:
+            return (int(value) >> self.bit) & 1
+        return value
+
+
+_converters = {}
+
+
+def get_converter(value_class, bit=None, byte_order=None):
+    """
+    shared Converter instance for a value class, bit and byte order
+    """
+    key = (value_class, bit, byte_order)
+    converter = _converters.get(key)
+    if converter is None:
+        converter = Converter(value_class, bit, byte_order)
+        _converters[key] = converter
+    return converter
+
+
+def scale_value(variable, value):
+    """
+    value with the scaling of the variable applied like Variable.update_value,
+    booleans are not scaled
+    """
+    scaling = variable.scaling
+    if value is None or scaling is None:
+        return value
+    if variable.value_class.upper() in ("BOOL", "BOOLEAN"):
+        return value
+    return scaling.scale_value(value)
+
+
+def sample_converter(variable):
+    """
+    conversion of a raw server value to the value the acquisition records,
+    the converter of the variable (bit, byte order) then its scaling like
+    Variable.update_value
+    """
+    converter = get_converter(
+        variable.value_class,
+        variable.opcuavariable.bit,
+        getattr(variable, "byte_order", None),
+    )
+
+    def convert(value):
+        return scale_value(variable, converter.decode(value))
+
+    return convert
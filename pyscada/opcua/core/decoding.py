@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .columns import MAX_EXACT_INTEGER, NAN
+
+import struct
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# binary encoding id of the ReadResponse
+READ_RESPONSE_ENCODING = 634
+# DateTime ticks (100 ns since 1601-01-01) of the unix epoch
+EPOCH_TICKS = 116444736000000000
+
+_byte = struct.Struct("<B").unpack_from
+_uint16 = struct.Struct("<H").unpack_from
+_int32 = struct.Struct("<i").unpack_from
+_uint32 = struct.Struct("<I").unpack_from
+_int64 = struct.Struct("<q").unpack_from
+
+# Variant type id -> struct of the scalars decoded into the value column
+SCALAR_STRUCTS = {
+    1: struct.Struct("<?"),  # Boolean
+    2: struct.Struct("<b"),  # SByte
+    3: struct.Struct("<B"),  # Byte
+    4: struct.Struct("<h"),  # Int16
+    5: struct.Struct("<H"),  # UInt16
+    6: struct.Struct("<i"),  # Int32
+    7: struct.Struct("<I"),  # UInt32
+    8: struct.Struct("<q"),  # Int64
+    9: struct.Struct("<Q"),  # UInt64
+    10: struct.Struct("<f"),  # Float
+    11: struct.Struct("<d"),  # Double
+    13: struct.Struct("<q"),  # DateTime
+    19: struct.Struct("<I"),  # StatusCode
+}
+DATETIME = 13
+INT64_TYPES = (8, 9)
+# Variant type id -> size of the fixed length types
+FIXED_SIZES = {type_id: s.size for type_id, s in SCALAR_STRUCTS.items()}
+FIXED_SIZES[0] = 0  # Null
+FIXED_SIZES[14] = 16  # Guid
+
+
+class DecodeError(ValueError):
+    pass
+
+
+def ticks_to_timestamp(ticks):
+    return (ticks - EPOCH_TICKS) / 1e7 if ticks > 0 else NAN
+
+
+def _skip_string(buf, pos):
+    # String, ByteString and XmlElement, a negative length is a null value
+    return pos + 4 + max(_int32(buf, pos)[0], 0)
+
+
+def _skip_nodeid(buf, pos):
+    encoding = buf[pos]
+    kind = encoding & 0x0F
+    pos += 1
+    if kind == 0:
+        pos += 1
+    elif kind == 1:
+        pos += 3
+    elif kind == 2:
+        pos += 6
+    elif kind in (3, 5):
+        pos = _skip_string(buf, pos + 2)
+    elif kind == 4:
+        pos += 18
+    else:
+        raise DecodeError(f"Unknown NodeId encoding {encoding}")
+    return pos, encoding
+
+
+def _numeric_nodeid(buf, pos):
+    """
+    identifier of a numeric NodeId and the position after it
+    """
+    encoding = buf[pos]
+    if encoding == 0:
+        return buf[pos + 1], pos + 2
+    if encoding == 1:
+        return _uint16(buf, pos + 2)[0], pos + 4
+    if encoding == 2:
+        return _uint32(buf, pos + 3)[0], pos + 7
+    raise DecodeError(f"Unexpected NodeId encoding {encoding}")
+
+
+def _skip_expanded_nodeid(buf, pos):
+    pos, encoding = _skip_nodeid(buf, pos)
+    if encoding & 0x80:
+        pos = _skip_string(buf, pos)
+    if encoding & 0x40:
+        pos += 4
+    return pos
+
+
+def _skip_diagnostic_info(buf, pos):
+    mask = buf[pos]
+    pos += 1
+    for bit in (0x01, 0x02, 0x04, 0x08):
+        if mask & bit:
+            pos += 4
+    if mask & 0x10:
+        pos = _skip_string(buf, pos)
+    if mask & 0x20:
+        pos += 4
+    if mask & 0x40:
+        pos = _skip_diagnostic_info(buf, pos)
+    return pos
+
+
+def _skip_localized_text(buf, pos):
+    mask = buf[pos]
+    pos += 1
+    if mask & 0x01:
+        pos = _skip_string(buf, pos)
+    if mask & 0x02:
+        pos = _skip_string(buf, pos)
+    return pos
+
+
+def _skip_extension_object(buf, pos):
+    pos, _ = _skip_nodeid(buf, pos)
+    encoding = buf[pos]
+    pos += 1
+    if encoding in (1, 2):
+        pos = _skip_string(buf, pos)
+    return pos
+
+
+def _skip_data_value(buf, pos):
+    mask = buf[pos]
+    pos += 1
+    if mask & 0x01:
+        pos = _skip_variant(buf, pos)
+    if mask & 0x02:
+        pos += 4
+    if mask & 0x04:
+        pos += 8
+    if mask & 0x10:
+        pos += 2
+    if mask & 0x08:
+        pos += 8
+    if mask & 0x20:
+        pos += 2
+    return pos
+
+
+def _skip_element(type_id, buf, pos):
+    size = FIXED_SIZES.get(type_id)
+    if size is not None:
+        return pos + size
+    if type_id in (12, 15, 16):
+        return _skip_string(buf, pos)
+    if type_id == 17:
+        return _skip_nodeid(buf, pos)[0]
+    if type_id == 18:
+        return _skip_expanded_nodeid(buf, pos)
+    if type_id == 20:
+        return _skip_string(buf, pos + 2)
+    if type_id == 21:
+        return _skip_localized_text(buf, pos)
+    if type_id == 22:
+        return _skip_extension_object(buf, pos)
+    if type_id == 23:
+        return _skip_data_value(buf, pos)
+    if type_id == 24:
+        return _skip_variant(buf, pos)
+    if type_id == 25:
+        return _skip_diagnostic_info(buf, pos)
+    raise DecodeError(f"Unknown Variant type {type_id}")
+
+
+def _skip_variant(buf, pos):
+    mask = buf[pos]
+    type_id = mask & 0x3F
+    pos += 1
+    if not mask & 0x80:
+        return _skip_element(type_id, buf, pos)
+    length = max(_int32(buf, pos)[0], 0)
+    pos += 4
+    size = FIXED_SIZES.get(type_id)
+    if size is not None:
+        pos += length * size
+    else:
+        for _ in range(length):
+            pos = _skip_element(type_id, buf, pos)
+    if mask & 0x40:
+        pos += 4 + 4 * max(_int32(buf, pos)[0], 0)
+    return pos
+
+
+def decode_read_response(data, columns, positions):
+    """
+    decode a binary ReadResponse (starting with its TypeId) into columns
+
+    The results are stored at the given plan positions. Scalars of the
+    numeric types go straight into the value column. The byte ranges of the
+    other Variants are returned as (position, start, end) so that the caller
+    can decode them with the generic decoder.
+    """
+    buf = memoryview(data).cast("B")
+    type_id, pos = _numeric_nodeid(buf, 0)
+    if type_id != READ_RESPONSE_ENCODING:
+        raise DecodeError(f"Not a ReadResponse : {type_id}")
+
+    # ResponseHeader
+    pos += 12  # Timestamp, RequestHandle
+    service_result = _uint32(buf, pos)[0]
+    if service_result & 0x80000000:
+        raise DecodeError(f"Bad ServiceResult {service_result:#010x}")
+    pos = _skip_diagnostic_info(buf, pos + 4)
+    strings = _int32(buf, pos)[0]
+    pos += 4
+    for _ in range(max(strings, 0)):
+        pos = _skip_string(buf, pos)
+    pos = _skip_extension_object(buf, pos)
+
+    count = _int32(buf, pos)[0]
+    pos += 4
+    if count != len(positions):
+        raise DecodeError(f"{count} results for {len(positions)} nodes")
+
+    values = columns.values
+    status = columns.status
+    source_time = columns.source_time
+    server_time = columns.server_time
+    objects = columns.objects
+    deferred = []
+    for position in positions:
+        mask = buf[pos]
+        pos += 1
+        if mask & 0x01:
+            variant_mask = buf[pos]
+            variant_type = variant_mask & 0x3F
+            scalar = None if variant_mask & 0xC0 else SCALAR_STRUCTS.get(variant_type)
+            if scalar is not None:
+                value = scalar.unpack_from(buf, pos + 1)[0]
+                pos += 1 + scalar.size
+                if variant_type == DATETIME:
+                    value = ticks_to_timestamp(value)
+                elif variant_type in INT64_TYPES and abs(value) > MAX_EXACT_INTEGER:
+                    objects[position] = value
+                    value = NAN
+                values[position] = value
+            elif variant_mask == 0:
+                pos += 1
+            else:
+                start = pos
+                pos = _skip_variant(buf, pos)
+                deferred.append((position, start, pos))
+        if mask & 0x02:
+            status[position] = _uint32(buf, pos)[0]
+            pos += 4
+        else:
+            status[position] = 0
+        if mask & 0x04:
+            source_time[position] = ticks_to_timestamp(_int64(buf, pos)[0])
+            pos += 8
+        if mask & 0x10:
+            pos += 2
+        if mask & 0x08:
+            server_time[position] = ticks_to_timestamp(_int64(buf, pos)[0])
+            pos += 8
+        if mask & 0x20:
+            pos += 2
+    return deferred
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .columns import BAD_NO_COMMUNICATION
+
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# quality levels derived from the StatusCode severity bits
+GOOD = 0
+UNCERTAIN = 1
+BAD = 2
+QUALITY_CHOICES = ((GOOD, "Good"), (UNCERTAIN, "Uncertain"), (BAD, "Bad"))
+
+
+def quality(status):
+    """
+    quality level of a StatusCode, the two most significant bits are the
+    severity (00 good, 01 uncertain, 10 and 11 bad)
+    """
+    severity = (int(status) >> 30) & 0x3
+    if severity == 0:
+        return GOOD
+    if severity == 1:
+        return UNCERTAIN
+    return BAD
+
+
+class HealthMap:
+    """
+    Latest StatusCode of every variable of a device and the time it was
+    first received, updated once per cycle from the read columns.
+
+    Only the variables whose StatusCode changed since the last cycle are
+    reported by update, so that the persisted quality is only written when
+    it changes. The methods only called by a write are left out, a read
+    gives them no status.
+    """
+
+    def __init__(self):
+        self._status = {}
+        self._since = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._status)
+
+    def update(self, plan, columns, read_time):
+        """
+        take over the status column of a cycle, returns the
+        (variable_id, status) tuples that changed
+        """
+        changed = []
+        status = columns.status
+        tolist = getattr(status, "tolist", None)
+        status = tolist() if tolist is not None else status
+        write_only = plan.write_only()
+        with self._lock:
+            known = self._status
+            for variable, code in zip(plan.variables, status):
+                variable_id = variable.pk
+                if variable_id in write_only:
+                    continue
+                if known.get(variable_id) != code:
+                    known[variable_id] = code
+                    self._since[variable_id] = read_time
+                    changed.append((variable_id, code))
+            if len(known) > len(plan) - len(write_only):
+                in_plan = set(v.pk for v in plan.variables) - write_only
+                for variable_id in [k for k in known if k not in in_plan]:
+                    known.pop(variable_id)
+                    self._since.pop(variable_id, None)
+        return changed
+
+    def set(self, variable_id, status, read_time):
+        """
+        correct the status of a single variable, returns True if it changed
+        """
+        with self._lock:
+            if self._status.get(variable_id) == status:
+                return False
+            self._status[variable_id] = status
+            self._since[variable_id] = read_time
+            return True
+
+    def status(self, variable_id):
+        """
+        (status, since) of a variable or None if it was never read
+        """
+        with self._lock:
+            status = self._status.get(variable_id)
+            if status is None:
+                return None
+            return status, self._since[variable_id]
+
+    def select(self, level):
+        """
+        {variable_id: (status, since)} of the variables with a quality level
+        """
+        with self._lock:
+            return {
+                variable_id: (status, self._since[variable_id])
+                for variable_id, status in self._status.items()
+                if quality(status) == level
+            }
+
+    def bad(self):
+        return self.select(BAD)
+
+    def uncertain(self):
+        return self.select(UNCERTAIN)
+
+    def summary(self):
+        """
+        number of variables per quality level
+        """
+        counts = {GOOD: 0, UNCERTAIN: 0, BAD: 0}
+        with self._lock:
+            for status in self._status.values():
+                counts[quality(status)] += 1
+        return counts
+
+    def disconnected(self, plan, read_time):
+        """
+        mark every variable of the plan as not communicating
+        """
+        changed = []
+        write_only = plan.write_only()
+        with self._lock:
+            for variable in plan.variables:
+                if variable.pk in write_only:
+                    continue
+                if self._status.get(variable.pk) != BAD_NO_COMMUNICATION:
+                    self._status[variable.pk] = BAD_NO_COMMUNICATION
+                    self._since[variable.pk] = read_time
+                    changed.append((variable.pk, BAD_NO_COMMUNICATION))
+        return changed
+
+
+_maps = {}
+_maps_lock = threading.Lock()
+
+
+def get_health(device_id):
+    """
+    health map of a device in this process, created on first use
+    """
+    health = _maps.get(device_id)
+    if health is None:
+        with _maps_lock:
+            health = _maps.setdefault(device_id, HealthMap())
+    return health
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+from math import ceil, floor
+from time import time
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# aggregate -> ObjectIds name of its AggregateFunction node
+AGGREGATES = {
+    "average": "AggregateFunction_Average",
+    "minimum": "AggregateFunction_Minimum",
+    "maximum": "AggregateFunction_Maximum",
+    "interpolative": "AggregateFunction_Interpolative",
+}
+# buckets asked for a trend by default and at most
+TREND_POINTS = 1000
+MAX_TREND_POINTS = 5000
+# processing intervals in seconds, the range of a trend is divided by the
+# smallest one giving at most the asked number of buckets, ranges of about
+# the same span share the interval and thereby the cached blocks
+INTERVALS = (
+    1,
+    2,
+    5,
+    10,
+    15,
+    30,
+    60,
+    120,
+    300,
+    600,
+    900,
+    1800,
+    3600,
+    7200,
+    10800,
+    21600,
+    43200,
+    86400,
+    172800,
+    604800,
+)
+# buckets per cached block, the blocks are aligned to a multiple of their
+# span so that a panned or zoomed trend reuses the blocks it overlaps
+BLOCK_BUCKETS = 100
+# cached blocks
+CACHE_MAX_SIZE = 20000
+
+
+def bucket_range(start, end, points=TREND_POINTS):
+    """
+    (start, end, interval) in seconds of a trend of start to end with at
+    most points buckets, start and end aligned to the interval
+    """
+    points = max(int(points), 1)
+    span = max(end - start, 1)
+    interval = INTERVALS[-1] * ceil(span / points / INTERVALS[-1])
+    for candidate in INTERVALS:
+        if span / candidate <= points:
+            interval = candidate
+            break
+    return (
+        floor(start / interval) * interval,
+        ceil(end / interval) * interval,
+        interval,
+    )
+
+
+def block_starts(start, end, interval):
+    """
+    starts of the aligned blocks of BLOCK_BUCKETS intervals covering start to
+    end
+    """
+    span = interval * BLOCK_BUCKETS
+    block = floor(start / span) * span
+    starts = []
+    while block < end:
+        starts.append(block)
+        block += span
+    return starts
+
+
+def split_blocks(values, interval):
+    """
+    {block start: [(timestamp, value), ...]} of the buckets of a trend
+    """
+    span = interval * BLOCK_BUCKETS
+    blocks = {}
+    for timestamp, value in values:
+        blocks.setdefault(floor(timestamp / span) * span, []).append((timestamp, value))
+    return blocks
+
+
+class AggregateCache:
+    """
+    LRU cache of the bucketed values of trends in aligned blocks of
+    BLOCK_BUCKETS intervals, keyed by variable, aggregate, interval and block
+    start.
+
+    A block reaching into the last interval is still growing, it expires after
+    one interval. Closed blocks are kept until evicted.
+    """
+
+    def __init__(self, max_size=CACHE_MAX_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or (entry[1] is not None and time() >= entry[1]):
+                self._data.pop(key, None)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, values):
+        """
+        cache the [(timestamp, value), ...] of a key, (variable_id, aggregate,
+        interval, block start)
+        """
+        interval = key[2]
+        end = key[3] + interval * BLOCK_BUCKETS
+        now = time()
+        expires = now + interval if end > now - interval else None
+        with self._lock:
+            self._data[key] = (values, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import asyncio
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopThread:
+    """
+    An asyncio event loop running forever in a daemon thread.
+
+    Used by a device handler alone or shared by all the devices of a shard
+    process, so that the sessions of several devices are served by one loop.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.loop = None
+        self.thread = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self.loop is not None and not self.loop.is_closed()
+
+    def start(self):
+        with self._lock:
+            if self.running:
+                return
+            self.loop = asyncio.new_event_loop()
+            self.thread = threading.Thread(
+                target=self.loop.run_forever, name=self.name, daemon=True
+            )
+            self.thread.start()
+
+    def submit(self, coro):
+        """
+        schedule a coroutine, returns a concurrent.futures.Future
+        """
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro):
+        """
+        run a coroutine and wait for its result
+        """
+        return self.submit(coro).result()
+
+    def stop(self):
+        with self._lock:
+            if not self.running:
+                return
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+            self.loop = None
+            self.thread = None
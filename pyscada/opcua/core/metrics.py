@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .scheduler import RunningStatistics
+
+from collections import namedtuple
+from time import time
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# seconds between two reports of the write metrics
+REPORT_INTERVAL = 300
+
+# outcome of one write, verified is None when no read-back was requested
+WriteResult = namedtuple(
+    "WriteResult", ["variable_id", "status", "value", "verified", "latency"]
+)
+
+
+class WriteMetrics:
+    """
+    Count and latency of the writes of a device since the last report, logged
+    every REPORT_INTERVAL seconds with writes
+    """
+
+    def __init__(self, name="opcua"):
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.writes = 0
+            self.failed = 0
+            self.verified = 0
+            self.mismatches = 0
+            self.latency = RunningStatistics()
+            self._last_report = time()
+
+    def record(self, result):
+        with self._lock:
+            self.writes += 1
+            if result.status & 0xC0000000:
+                self.failed += 1
+            if result.verified is True:
+                self.verified += 1
+            elif result.verified is False:
+                self.mismatches += 1
+            self.latency.add(result.latency)
+            due = time() - self._last_report >= REPORT_INTERVAL
+        if due:
+            self.report()
+
+    def summary(self):
+        with self._lock:
+            return {
+                "writes": self.writes,
+                "failed": self.failed,
+                "verified": self.verified,
+                "mismatches": self.mismatches,
+                "latency_mean": self.latency.mean,
+                "latency_std": self.latency.std,
+                "latency_max": self.latency.max,
+            }
+
+    def report(self):
+        """
+        log the summary since the last report and start over
+        """
+        summary = self.summary()
+        if summary["writes"]:
+            logger.info(
+                f"{self.name} writes : {summary['writes']}, "
+                f"failed {summary['failed']}, verified {summary['verified']}, "
+                f"mismatches {summary['mismatches']}, latency "
+                f"{summary['latency_mean'] * 1000:.1f}ms "
+                f"(max {summary['latency_max'] * 1000:.1f}ms)"
+            )
+        self.reset()
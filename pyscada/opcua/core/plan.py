@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from collections import namedtuple
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Call service parameters of a method-backed variable, arguments is None when
+# the method needs the variable value and can only be called by a write
+MethodCall = namedtuple("MethodCall", ["object_id", "method_id", "arguments"])
+# namespace index given to the entries whose URI is not in the NamespaceArray
+# of the server, reading them fails with BadNodeIdUnknown
+UNKNOWN_NAMESPACE = 0xFFFF
+
+
+class ReadPlan:
+    """
+    Ordered list of the variables of a device with the NodeId to read for each.
+
+    The plan is built once and then read with one request per chunk. Every
+    change increments `version` so that sessions can tell when their
+    registered nodes are outdated. Each entry is classified once as a
+    readable node or as a method that is called instead of read.
+
+    Entries can be addressed by namespace URI, their NodeId then holds the
+    configured index and each session resolves them against the
+    NamespaceArray of its server with resolve. Entries with a browse path
+    are translated to a NodeId by the session, see browse_positions.
+    """
+
+    def __init__(self):
+        self.variables = []
+        self.nodeids = []
+        self.converters = []
+        self.namespace_uris = []
+        self.browse_paths = []
+        self.methods = {}
+        self._index = {}
+        self._classified = set()
+        self._read_positions = None
+        self._write_only = None
+        self._uri_positions = None
+        self._path_positions = None
+        self.version = 0
+
+    def __len__(self):
+        return len(self.variables)
+
+    def __iter__(self):
+        return iter(zip(self.variables, self.nodeids))
+
+    def __contains__(self, variable_id):
+        return variable_id in self._index
+
+    def add(
+        self, variable, nodeid, converter=None, namespace_uri=None, browse_path=None
+    ):
+        """
+        add or replace the entry of a variable
+        """
+        position = self._index.get(variable.pk)
+        if position is None:
+            self._index[variable.pk] = len(self.variables)
+            self.variables.append(variable)
+            self.nodeids.append(nodeid)
+            self.converters.append(converter)
+            self.namespace_uris.append(namespace_uri or None)
+            self.browse_paths.append(browse_path or None)
+        else:
+            self.variables[position] = variable
+            self.nodeids[position] = nodeid
+            self.converters[position] = converter
+            self.namespace_uris[position] = namespace_uri or None
+            self.browse_paths[position] = browse_path or None
+        self._unclassify(variable.pk)
+        self._uri_positions = None
+        self._path_positions = None
+        self.version += 1
+
+    def remove(self, variable_id):
+        position = self._index.pop(variable_id, None)
+        if position is None:
+            return False
+        del self.variables[position]
+        del self.nodeids[position]
+        del self.converters[position]
+        del self.namespace_uris[position]
+        del self.browse_paths[position]
+        self._uri_positions = None
+        self._path_positions = None
+        for variable in self.variables[position:]:
+            self._index[variable.pk] -= 1
+        self._unclassify(variable_id)
+        self.version += 1
+        return True
+
+    def _unclassify(self, variable_id):
+        self._classified.discard(variable_id)
+        self.methods.pop(variable_id, None)
+        self._read_positions = None
+        self._write_only = None
+
+    def unclassified(self):
+        """
+        positions of the entries not classified yet
+        """
+        return [i for i, v in enumerate(self.variables) if v.pk not in self._classified]
+
+    def classify(self, variable_id, method=None):
+        """
+        mark an entry as a readable node or, with a MethodCall, as a method
+        """
+        self._classified.add(variable_id)
+        if method is not None:
+            self.methods[variable_id] = method
+        self._read_positions = None
+        self._write_only = None
+
+    def is_method(self, variable_id):
+        """
+        True for a method, False for a readable node, None if not classified
+        """
+        if variable_id not in self._classified:
+            return None
+        return variable_id in self.methods
+
+    def read_positions(self):
+        """
+        positions of the entries read with the Read service
+        """
+        if self._read_positions is None:
+            self._read_positions = [
+                i for i, v in enumerate(self.variables) if v.pk not in self.methods
+            ]
+        return self._read_positions
+
+    def write_only(self):
+        """
+        ids of the methods that can only be called by a write, a read gives
+        them no value and no status
+        """
+        if self._write_only is None:
+            self._write_only = frozenset(
+                variable_id
+                for variable_id, method in self.methods.items()
+                if method.arguments is None
+            )
+        return self._write_only
+
+    def method_calls(self):
+        """
+        (position, MethodCall) of the methods that can be called for a read
+        """
+        return [
+            (self._index[variable_id], method)
+            for variable_id, method in self.methods.items()
+            if method.arguments is not None
+        ]
+
+    def resolve(self, namespaces, renamespace):
+        """
+        NodeIds of all entries for a server NamespaceArray, the entries
+        addressed by URI get the index of their URI through
+        renamespace(nodeid, index) in one pass
+        """
+        if self._uri_positions is None:
+            self._uri_positions = [
+                i for i, uri in enumerate(self.namespace_uris) if uri is not None
+            ]
+        nodeids = list(self.nodeids)
+        if not len(self._uri_positions):
+            return nodeids
+        index = {uri: i for i, uri in enumerate(namespaces)}
+        for position in self._uri_positions:
+            nodeids[position] = renamespace(
+                nodeids[position],
+                index.get(self.namespace_uris[position], UNKNOWN_NAMESPACE),
+            )
+        return nodeids
+
+    def browse_positions(self):
+        """
+        positions of the entries addressed by browse path
+        """
+        if self._path_positions is None:
+            self._path_positions = [
+                i for i, path in enumerate(self.browse_paths) if path is not None
+            ]
+        return self._path_positions
+
+    def position(self, variable_id):
+        return self._index.get(variable_id)
+
+    def converter(self, variable_id):
+        position = self._index.get(variable_id)
+        return None if position is None else self.converters[position]
+
+    def chunks(self, size):
+        """
+        yield (start, stop) slices of at most size entries
+        """
+        size = max(1, int(size))
+        for start in range(0, len(self.variables), size):
+            yield start, min(start + size, len(self.variables))
@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .scheduler import RunningStatistics
+
+from contextlib import contextmanager, nullcontext
+from time import perf_counter, time
+import cProfile
+import os
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+OFF = 0
+TIMING = 1
+PROFILE = 2
+MODE_CHOICES = ((OFF, "Off"), (TIMING, "Phase timing"), (PROFILE, "cProfile"))
+
+# profile dumps kept per device, the oldest ones are deleted
+KEEP_DUMPS = 20
+# seconds between two phase breakdown reports
+REPORT_INTERVAL = 300
+
+_no_phase = nullcontext()
+# threads with an enabled cProfile.Profile, only one can be active per thread
+_profiling = threading.local()
+
+
+class CycleProfiler:
+    """
+    Opt-in timing of the acquisition and write cycles of a device.
+
+    With TIMING the wall time of each phase (connect, read, convert, persist,
+    write) is accumulated per cycle kind. With PROFILE, in addition, one cycle
+    every sample_every runs under cProfile and its stats are dumped to
+    directory, only the last keep dumps are kept. A cycle running in a loop
+    shared with other devices profiles their coroutines too.
+    """
+
+    def __init__(self, name, directory, mode=OFF, sample_every=10, keep=KEEP_DUMPS):
+        self.name = name
+        self.directory = directory
+        self.keep = keep
+        self.mode = OFF
+        self.sample_every = 1
+        self._cycles = 0
+        self._current = None
+        self._phases = {}
+        self._totals = {}
+        self._dumps = []
+        self._last_report = time()
+        self.configure(mode, sample_every)
+
+    @property
+    def enabled(self):
+        return self.mode != OFF
+
+    def configure(self, mode, sample_every=None):
+        """
+        change the mode at runtime, the statistics restart on a change
+        """
+        mode = int(mode or OFF)
+        if sample_every is not None:
+            self.sample_every = max(1, int(sample_every))
+        if mode == self.mode:
+            return False
+        if self.enabled:
+            self.report()
+        self.mode = mode
+        self.reset()
+        logger.info(f"{self.name} profiling {dict(MODE_CHOICES).get(mode, mode)}")
+        return True
+
+    def reset(self):
+        self._phases = {}
+        self._totals = {}
+        self._last_report = time()
+
+    def phase(self, name):
+        """
+        context manager timing a phase of the running cycle
+        """
+        if self._current is None:
+            return _no_phase
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name):
+        current = self._current
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            if current is not None:
+                current[name] = current.get(name, 0.0) + perf_counter() - start
+
+    @contextmanager
+    def cycle(self, kind):
+        """
+        context manager around a whole cycle of a kind ("read", "write")
+        """
+        if not self.enabled or self._current is not None:
+            yield
+            return
+        self._cycles += 1
+        self._current = phases = {}
+        profile = None
+        if (
+            self.mode == PROFILE
+            and self._cycles % self.sample_every == 0
+            and not getattr(_profiling, "active", False)
+        ):
+            profile = cProfile.Profile()
+            _profiling.active = True
+            profile.enable()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            duration = perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                _profiling.active = False
+            self._current = None
+            self._record(kind, duration, phases)
+            if profile is not None:
+                self._dump(kind, profile)
+            if time() - self._last_report >= REPORT_INTERVAL:
+                self.report()
+
+    def _record(self, kind, duration, phases):
+        self._totals.setdefault(kind, RunningStatistics()).add(duration)
+        statistics = self._phases.setdefault(kind, {})
+        for name, value in phases.items():
+            statistics.setdefault(name, RunningStatistics()).add(value)
+
+    def _dump(self, kind, profile):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(
+                self.directory, f"{self.name}-{kind}-{self._cycles:08d}.prof"
+            )
+            profile.dump_stats(path)
+        except OSError as e:
+            logger.info(f"{self.name} profile dump failed : {e}")
+            return
+        self._dumps.append(path)
+        while len(self._dumps) > self.keep:
+            try:
+                os.remove(self._dumps.pop(0))
+            except OSError:
+                pass
+
+    @property
+    def dumps(self):
+        return list(self._dumps)
+
+    def breakdown(self):
+        """
+        {kind: {"total": (count, mean, max), phase: (count, mean, max)}} in
+        seconds
+        """
+        result = {}
+        for kind, total in self._totals.items():
+            result[kind] = {"total": (total.count, total.mean, total.max)}
+            for name, statistics in self._phases.get(kind, {}).items():
+                result[kind][name] = (
+                    statistics.count,
+                    statistics.mean,
+                    statistics.max,
+                )
+        return result
+
+    def report(self):
+        for kind, phases in self.breakdown().items():
+            logger.info(
+                f"{self.name} {kind} cycles : "
+                + ", ".join(
+                    f"{name} {mean * 1000:.1f}ms (max {maximum * 1000:.1f}ms)"
+                    for name, (count, mean, maximum) in phases.items()
+                )
+                + f" over {phases['total'][0]} cycles"
+            )
+        self.reset()
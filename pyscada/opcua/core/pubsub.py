@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .conversion import VALUE_CLASS_VARIANT_TYPE, VARIANT_TYPE_STRUCT
+
+from collections import deque
+from urllib.parse import urlparse
+import struct
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# default OPC-UA PubSub UDP port and multicast group
+PUBSUB_PORT = 4840
+# samples kept per variable between two drains, the oldest are dropped
+MAX_SAMPLES = 100000
+
+
+def parse_pubsub_url(url):
+    """
+    (host, port) of an "opc.udp://239.0.0.1:4840" address
+    """
+    parsed = urlparse(str(url).strip())
+    if parsed.scheme != "opc.udp" or not parsed.hostname:
+        raise ValueError(f"{url} is not an opc.udp:// address")
+    return parsed.hostname, parsed.port or PUBSUB_PORT
+
+
+def raw_struct(value_classes):
+    """
+    struct of a DataSetMessage with RawData field encoding, None if a field
+    has a type without fixed size
+    """
+    formats = []
+    for value_class in value_classes:
+        name = VALUE_CLASS_VARIANT_TYPE.get(str(value_class).upper())
+        if name not in VARIANT_TYPE_STRUCT:
+            return None
+        formats.append(VARIANT_TYPE_STRUCT[name][1:])
+    return struct.Struct("<" + "".join(formats))
+
+
+class DataSetReader:
+    """
+    Filter and field mapping of the DataSetMessages of one DataSetWriter.
+
+    publisher_id, writer_group_id and dataset_writer_id select the messages,
+    None matches any value. fields holds the variable id of each field of the
+    DataSet by position, None for the fields that are not mapped.
+    """
+
+    def __init__(
+        self,
+        name,
+        fields,
+        publisher_id=None,
+        writer_group_id=None,
+        dataset_writer_id=None,
+        value_classes=None,
+    ):
+        self.name = name
+        self.fields = list(fields)
+        self.publisher_id = None if publisher_id in (None, "") else str(publisher_id)
+        self.writer_group_id = writer_group_id
+        self.dataset_writer_id = dataset_writer_id
+        self.raw = None if value_classes is None else raw_struct(value_classes)
+        self.messages = 0
+
+    def matches(self, publisher_id, writer_group_id, dataset_writer_id):
+        return (
+            (self.publisher_id is None or self.publisher_id == str(publisher_id))
+            and (
+                self.writer_group_id is None or self.writer_group_id == writer_group_id
+            )
+            and (
+                self.dataset_writer_id is None
+                or self.dataset_writer_id == dataset_writer_id
+            )
+        )
+
+    def unpack_raw(self, data):
+        """
+        field values of a RawData DataSetMessage
+        """
+        if self.raw is None:
+            raise ValueError(f"{self.name} : RawData needs fixed size fields")
+        return self.raw.unpack_from(data)
+
+
+class SampleBuffer:
+    """
+    Samples received between two reads of the device, per variable.
+
+    append is called by the receiving thread, drain by the DAQ process. At
+    most max_samples are kept per variable, the older ones are counted as
+    dropped.
+    """
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._samples = {}
+        self.received = 0
+        self.dropped = 0
+
+    def append(self, variable_id, value, timestamp, status=0):
+        with self._lock:
+            samples = self._samples.get(variable_id)
+            if samples is None:
+                samples = self._samples[variable_id] = deque(maxlen=self.max_samples)
+            if len(samples) == self.max_samples:
+                self.dropped += 1
+            samples.append((value, timestamp, status))
+            self.received += 1
+
+    def drain(self):
+        """
+        {variable_id: [(value, timestamp, status), ...]} received since the
+        last drain, oldest first
+        """
+        with self._lock:
+            samples, self._samples = self._samples, {}
+        return {variable_id: list(items) for variable_id, items in samples.items()}
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(samples) for samples in self._samples.values())
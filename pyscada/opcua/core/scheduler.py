@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from math import ceil, sqrt
+from time import time, sleep
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class RunningStatistics:
+    """
+    count, mean, standard deviation and maximum of a series (Welford)
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.max = max(self.max, value)
+
+    @property
+    def std(self):
+        return sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class CycleScheduler:
+    """
+    Start cycles at wall-clock multiples of the interval.
+
+    The start of a cycle does not depend on the duration of the previous one,
+    so the samples stay evenly spaced. When a cycle overruns the next tick the
+    policy decides what happens:
+
+    - skip: the missed ticks are dropped, the next cycle starts at the next
+      multiple of the interval
+    - catch_up: the missed ticks are run back to back, but never more than
+      max_catch_up of them
+    """
+
+    SKIP = "skip"
+    CATCH_UP = "catch_up"
+
+    def __init__(
+        self, interval, policy=SKIP, max_catch_up=3, offset=0.0, clock=time, wait=sleep
+    ):
+        if policy not in (self.SKIP, self.CATCH_UP):
+            raise ValueError(f"Unknown overrun policy {policy}")
+        self.interval = float(interval)
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.offset = offset
+        self.clock = clock
+        self.wait = wait
+        self.next_tick = None
+        self.lateness = RunningStatistics()
+        self.duration = RunningStatistics()
+        self.overruns = 0
+        self.skipped = 0
+
+    def align(self, timestamp):
+        """
+        first tick at or after timestamp
+        """
+        return (
+            ceil((timestamp - self.offset) / self.interval) * self.interval
+            + self.offset
+        )
+
+    def wait_for_tick(self, max_wait=None):
+        """
+        sleep until the next tick and return its timestamp, None without
+        sleeping if the tick is more than max_wait seconds away
+        """
+        now = self.clock()
+        if self.next_tick is None:
+            self.next_tick = self.align(now)
+        delay = self.next_tick - now
+        if max_wait is not None and delay > max_wait:
+            return None
+        if delay > 0:
+            self.wait(delay)
+            now = self.clock()
+        self.lateness.add(max(0.0, now - self.next_tick))
+        return self.next_tick
+
+    def cycle_done(self, tick):
+        """
+        record the duration of the cycle started at tick and plan the next one
+        """
+        now = self.clock()
+        self.duration.add(now - tick)
+        next_tick = tick + self.interval
+        if now <= next_tick:
+            self.next_tick = next_tick
+            return
+        self.overruns += 1
+        if self.policy == self.SKIP:
+            self.next_tick = self.align(now)
+            self.skipped += int(round((self.next_tick - next_tick) / self.interval))
+        else:
+            oldest = now - self.max_catch_up * self.interval
+            if next_tick < oldest:
+                missed = int(ceil((oldest - next_tick) / self.interval))
+                next_tick += missed * self.interval
+                self.skipped += missed
+            self.next_tick = next_tick
+
+    def statistics(self):
+        return {
+            "interval": self.interval,
+            "cycles": self.duration.count,
+            "lateness_mean": self.lateness.mean,
+            "lateness_std": self.lateness.std,
+            "lateness_max": self.lateness.max,
+            "duration_mean": self.duration.mean,
+            "duration_max": self.duration.max,
+            "overruns": self.overruns,
+            "skipped": self.skipped,
+        }
+
+    def reset_statistics(self):
+        self.lateness.reset()
+        self.duration.reset()
+        self.overruns = 0
+        self.skipped = 0
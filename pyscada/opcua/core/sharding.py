@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+import heapq
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# shortest polling interval used for the load of a device, in seconds
+MIN_INTERVAL = 0.1
+# ratio of the most loaded shard to the mean above which all devices are
+# redistributed instead of only placing the new ones
+REBALANCE_THRESHOLD = 1.25
+
+
+def device_load(tags, polling_interval):
+    """
+    load of a device as the number of tags read per second
+    """
+    return max(int(tags), 1) / max(float(polling_interval), MIN_INTERVAL)
+
+
+def shard_loads(assignment, loads, shards):
+    totals = [0.0] * shards
+    for device_id, shard in assignment.items():
+        totals[shard] += loads.get(device_id, 0.0)
+    return totals
+
+
+def imbalance(assignment, loads, shards):
+    """
+    load of the most loaded shard relative to the mean load, 1.0 is perfect
+    """
+    totals = shard_loads(assignment, loads, shards)
+    mean = sum(totals) / shards if shards else 0.0
+    return max(totals) / mean if mean > 0 else 1.0
+
+
+def _place(devices, loads, totals, assignment):
+    # longest processing time first, each device on the least loaded shard
+    heap = [(total, shard) for shard, total in enumerate(totals)]
+    heapq.heapify(heap)
+    for device_id in sorted(devices, key=lambda d: (-loads[d], d)):
+        total, shard = heapq.heappop(heap)
+        assignment[device_id] = shard
+        heapq.heappush(heap, (total + loads[device_id], shard))
+    return assignment
+
+
+def assign(loads, shards):
+    """
+    distribute {device_id: load} over shards, returns {device_id: shard}
+    """
+    shards = max(int(shards), 1)
+    return _place(loads.keys(), loads, [0.0] * shards, {})
+
+
+def rebalance(loads, previous, shards, threshold=REBALANCE_THRESHOLD):
+    """
+    place the new devices of {device_id: load} on the least loaded shards,
+    the devices in previous keep their shard unless the result is more
+    unbalanced than threshold, then everything is redistributed
+    """
+    shards = max(int(shards), 1)
+    assignment = {
+        device_id: shard
+        for device_id, shard in previous.items()
+        if device_id in loads and shard < shards
+    }
+    totals = shard_loads(assignment, loads, shards)
+    new = [device_id for device_id in loads if device_id not in assignment]
+    _place(new, loads, totals, assignment)
+    if imbalance(assignment, loads, shards) > threshold:
+        balanced = assign(loads, shards)
+        if imbalance(balanced, loads, shards) < imbalance(assignment, loads, shards):
+            return balanced
+    return assignment
+
+
+def members(assignment, shards):
+    """
+    sorted device ids of each shard
+    """
+    result = [[] for _ in range(max(int(shards), 1))]
+    for device_id, shard in assignment.items():
+        result[shard].append(device_id)
+    return [sorted(devices) for devices in result]
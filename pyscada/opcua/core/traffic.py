@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from base64 import b64decode, b64encode
+from time import time
+import gzip
+import json
+import os
+import threading
+import zlib
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+FILE_FORMAT = "pyscada-opcua-traffic"
+FILE_VERSION = 1
+
+# error kinds of an exchange without response
+STATUS = "status"
+TIMEOUT = "timeout"
+CONNECTION = "connection"
+
+
+def _encode(data):
+    return None if data is None else b64encode(data).decode("ascii")
+
+
+def _decode(data):
+    return None if data is None else b64decode(data)
+
+
+class TrafficRecorder:
+    """
+    Append the request/response exchanges of the sessions of a device to a
+    gzip compressed JSON lines file.
+
+    An exchange holds the service, the request encoded without its header, the
+    binary response or the error and the latency. The file is readable up to
+    the last complete line if the process dies while recording.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.exchanges = 0
+        self._file = None
+        self._start = None
+        self._lock = threading.Lock()
+
+    @property
+    def recording(self):
+        return self._file is not None
+
+    def open(self):
+        with self._lock:
+            if self._file is not None:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = gzip.open(self.path, "wt", encoding="utf-8")
+            self._start = time()
+            self._file.write(
+                json.dumps(
+                    {
+                        "format": FILE_FORMAT,
+                        "version": FILE_VERSION,
+                        "started": self._start,
+                    }
+                )
+                + "\n"
+            )
+        logger.info(f"OPC-UA traffic recorded to {self.path}")
+
+    def record(
+        self,
+        url,
+        service,
+        key,
+        started,
+        latency,
+        response=None,
+        error=None,
+        code=None,
+    ):
+        line = json.dumps(
+            {
+                "t": started - (self._start or started),
+                "url": url,
+                "service": service,
+                "key": _encode(key),
+                "latency": latency,
+                "response": _encode(response),
+                "error": error,
+                "code": code,
+            }
+        )
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.write(line + "\n")
+            self.exchanges += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is None:
+                return
+            self._file.close()
+            self._file = None
+        logger.info(f"OPC-UA traffic : {self.exchanges} exchanges in {self.path}")
+
+
+def read_traffic(path):
+    """
+    exchanges of a traffic file in the order they were recorded
+    """
+    exchanges = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            header = json.loads(f.readline())
+            if header.get("format") != FILE_FORMAT:
+                raise ValueError(f"{path} is not an OPC-UA traffic file")
+            if header.get("version") != FILE_VERSION:
+                raise ValueError(
+                    f"{path} : unsupported version {header.get('version')}"
+                )
+            for line in f:
+                exchange = json.loads(line)
+                exchange["key"] = _decode(exchange["key"]) or b""
+                exchange["response"] = _decode(exchange["response"])
+                exchanges.append(exchange)
+        except (EOFError, zlib.error, json.JSONDecodeError) as e:
+            # the end of a file whose recording was interrupted
+            logger.info(f"{path} truncated after {len(exchanges)} exchanges : {e}")
+    return exchanges
+
+
+class TrafficReplay:
+    """
+    Answer requests with the responses of a recording.
+
+    A request gets the next unused response recorded for the same server,
+    service and request body. Requests whose body differs from the recording
+    (nonces, acknowledgements) get the next unused response of the service,
+    and once those are used up the last matching one is answered again.
+    speed scales the recorded latencies, 2.0 replays twice as fast, 0 without
+    delay.
+    """
+
+    def __init__(self, exchanges, speed=1.0):
+        self.exchanges = list(exchanges)
+        self.speed = speed
+        self.urls = []
+        self._used = [False] * len(self.exchanges)
+        self._by_key = {}
+        self._by_service = {}
+        self._next = {}
+        for position, exchange in enumerate(self.exchanges):
+            if exchange["url"] not in self.urls:
+                self.urls.append(exchange["url"])
+            service = (exchange["url"], exchange["service"])
+            self._by_key.setdefault(service + (exchange["key"],), []).append(position)
+            self._by_service.setdefault(service, []).append(position)
+        self._key_next = {key: 0 for key in self._by_key}
+        self._lock = threading.Lock()
+        self.matched = 0
+        self.substituted = 0
+        self.repeated = 0
+        self.missing = 0
+
+    @classmethod
+    def load(cls, path, speed=1.0):
+        return cls(read_traffic(path), speed)
+
+    def resolve_url(self, url):
+        """
+        url if it was recorded, else the first recorded server so that a
+        recording can be replayed on a differently configured device
+        """
+        if url in self.urls or not len(self.urls):
+            return url
+        return self.urls[0]
+
+    def _unused(self, positions, start):
+        while start < len(positions) and self._used[positions[start]]:
+            start += 1
+        return start
+
+    def match(self, url, service, key):
+        """
+        recorded exchange answering a request, None if the service has never
+        been recorded for the server
+        """
+        service = (self.resolve_url(url), service)
+        with self._lock:
+            exact = self._by_key.get(service + (key,))
+            if exact is not None:
+                start = self._unused(exact, self._key_next[service + (key,)])
+                self._key_next[service + (key,)] = start
+                if start < len(exact):
+                    self._used[exact[start]] = True
+                    self.matched += 1
+                    return self.exchanges[exact[start]]
+            positions = self._by_service.get(service)
+            if positions is None:
+                self.missing += 1
+                return None
+            start = self._unused(positions, self._next.get(service, 0))
+            self._next[service] = start
+            if start < len(positions):
+                self._used[positions[start]] = True
+                self.substituted += 1
+                return self.exchanges[positions[start]]
+            self.repeated += 1
+            return self.exchanges[(exact or positions)[-1]]
+
+    def delay(self, exchange):
+        if not self.speed:
+            return 0.0
+        return exchange["latency"] / self.speed
+
+    def statistics(self):
+        return {
+            "exchanges": len(self.exchanges),
+            "matched": self.matched,
+            "substituted": self.substituted,
+            "repeated": self.repeated,
+            "missing": self.missing,
+        }
@@ -4,19 +4,16 @@ from time import time, sleep
 from pyscada.device import GenericDevice
 from .devices import GenericDevice as GenericHandlerDevice
 
-import sys
+from importlib.util import find_spec
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-try:
-    import asyncua
-
-    driver_ok = True
-except ImportError:
-    logger.info("Cannot import smbus")
-    driver_ok = False
+# asyncua is only imported by the handler, when the device is acquired
+driver_ok = find_spec("asyncua") is not None
+if not driver_ok:
+    logger.info("Cannot import asyncua")
 
 
 class Device(GenericDevice):
@@ -1,14 +1,44 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 from .. import PROTOCOL_ID
+from ..core.batch import BatchUpdate
+from ..core.cache import get_cache
+from ..core.capabilities import INTERVAL_MARGIN, Capabilities, Tuner
+from ..core.capture import condition_met
+from ..core.columns import ReadColumns
+from ..core.conversion import get_converter, scale_value, variant_type
+from ..core.decoding import DecodeError, decode_read_response
+from ..core.health import get_health, quality
+from ..core.loop import EventLoopThread
+from ..core.metrics import WriteMetrics, WriteResult
+from ..core.profiling import CycleProfiler
+from ..core.plan import MethodCall, ReadPlan
+from ..core.pubsub import DataSetReader
+from ..core.traffic import TrafficRecorder
+from .capture import CaptureRecorder
+from .pubsub import PubSubSubscriber
+from .redundancy import ServerSession, SessionSet
+from .traffic import ReplayClient
 from pyscada.device import GenericHandlerDevice
 from pyscada.models import DeviceProtocol, Variable
-from pyscada.opcua.models import OPCUADevice
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from pyscada.opcua.capture import capture_path
+from pyscada.opcua.models import (
+    OPCUACapture,
+    OPCUADataSetReader,
+    OPCUADevice,
+    OPCUAMethodArgument,
+    OPCUAReadPlanUpdate,
+    OPCUAVariable,
+)
 
 try:
     from asyncua import Client, Node, ua
     from asyncua.common.methods import uamethod, call_method_full
-    from asyncua.common.ua_utils import *
+    from asyncua.common.ua_utils import string_to_variant, data_type_to_variant_type
+    from asyncua.common.utils import Buffer
+    from asyncua.ua.ua_binary import struct_from_binary, variant_from_binary
     from concurrent.futures._base import TimeoutError
 
     try:
@@ -23,14 +53,153 @@ except ImportError:
     # asyncua = None
     driver_ok = False
 
+from datetime import datetime, timezone
+from functools import partial
+from math import isclose
 from time import time
-
-from asgiref.sync import async_to_sync
+import asyncio
+import os
+import tempfile
+import struct
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# initial number of nodes per Read request
+READ_CHUNK_SIZE = 500
+# initial number of nodes per Write request
+WRITE_CHUNK_SIZE = 500
+# initial number of methods per Call request
+METHOD_CHUNK_SIZE = 50
+# request kind -> (initial size, largest size on a server without limit,
+# OperationLimits capping the size)
+REQUEST_SIZES = {
+    "read": (READ_CHUNK_SIZE, 10 * READ_CHUNK_SIZE, "max_nodes_per_read"),
+    "write": (WRITE_CHUNK_SIZE, 10 * WRITE_CHUNK_SIZE, "max_nodes_per_write"),
+    "call": (METHOD_CHUNK_SIZE, 10 * METHOD_CHUNK_SIZE, "max_nodes_per_method_call"),
+}
+# weight of the last cycle in the smoothed read time
+READ_TIME_WEIGHT = 0.2
+
+# number of variables per UPDATE of the persisted status
+STATUS_CHUNK_SIZE = 500
+# seconds between two checks of the profiling settings of the device
+PROFILING_POLL = 10
+# seconds between two checks of the armed and stopped captures of the device
+CAPTURE_POLL = 2
+
+# StatusCode severity bits, a value is only used if both are clear
+STATUS_NOT_GOOD = 0xC0000000
+NAN = float("nan")
+
+
+def _timestamp(value):
+    return NAN if value is None else value.timestamp()
+
+
+def profile_directory():
+    return getattr(
+        settings,
+        "PYSCADA_OPCUA_PROFILE_DIR",
+        os.path.join(tempfile.gettempdir(), "pyscada-opcua-profiles"),
+    )
+
+
+def traffic_directory():
+    return getattr(
+        settings,
+        "PYSCADA_OPCUA_TRAFFIC_DIR",
+        os.path.join(tempfile.gettempdir(), "pyscada-opcua-traffic"),
+    )
+
+
+def _datetime(timestamp):
+    if settings.USE_TZ:
+        return datetime.fromtimestamp(timestamp, timezone.utc)
+    return datetime.fromtimestamp(timestamp)
+
+
+def device_url(opcuadevice, ip_address, port, path):
+    url = "opc."
+    url += str(opcuadevice.protocol_choices[opcuadevice.protocol][1])
+    url += "://"
+    url += str(ip_address)
+    url += ":"
+    url += str(port)
+    url += str(path)
+    return url
+
+
+def device_session_set(opcuadevice, hot_standby=True):
+    """
+    SessionSet of a device, one session for its server and, with hot standby,
+    one for each redundant server. Without hot_standby the redundant servers
+    are only connected, in order of priority, when the ones before fail.
+    """
+    sessions = [
+        ServerSession(
+            device_url(
+                opcuadevice, opcuadevice.IP_address, opcuadevice.port, opcuadevice.path
+            ),
+            0,
+            opcuadevice.user,
+            opcuadevice.password,
+            timeout=10,
+        )
+    ]
+    redundant = opcuadevice.redundancy == 1
+    if redundant:
+        for server in opcuadevice.opcuaredundantserver_set.all():
+            sessions.append(
+                ServerSession(
+                    device_url(
+                        opcuadevice, server.IP_address, server.port, server.path
+                    ),
+                    server.priority,
+                    opcuadevice.user,
+                    opcuadevice.password,
+                    timeout=10,
+                )
+            )
+    return SessionSet(
+        sessions,
+        hot_standby=redundant and hot_standby,
+        service_level_threshold=opcuadevice.service_level_threshold,
+    )
+
+
+def get_nodeid(variable):
+    return ua.NodeId(
+        variable.opcuavariable.Identifier,
+        variable.opcuavariable.NamespaceIndex,
+    )
+
+
+async def resolve_nodeids(session, variables):
+    """
+    NodeIds of variables on the server of a session, with the namespace index
+    of their namespace URI and the translation of their browse path
+    """
+    nodeids = [get_nodeid(v) for v in variables]
+    if session is None:
+        return nodeids
+    paths = []
+    for i, variable in enumerate(variables):
+        nodeids[i] = session.resolve(nodeids[i], variable.opcuavariable.namespace_uri)
+        if variable.opcuavariable.browse_path:
+            paths.append(i)
+    if len(paths):
+        translated = await session.translate_paths(
+            [
+                (variables[i].opcuavariable.browse_path, nodeids[i].NamespaceIndex)
+                for i in paths
+            ]
+        )
+        for i, nodeid in zip(paths, translated):
+            nodeids[i] = nodeid
+    return nodeids
+
 
 class GenericDevice(GenericHandlerDevice):
     def __init__(self, pyscada_device, variables):
@@ -39,53 +208,105 @@ class GenericDevice(GenericHandlerDevice):
         self.driver_ok = driver_ok
         self.is_connected = 0
         self.inst = None
+        self._loop = None
+        self._shared_loop = False
+        self._prefetched = None
+        self._plan = None
+        self._columns = ReadColumns()
+        self._batch = BatchUpdate()
+        self._sessions = None
+        self._subscriber = None
+        self.cache = get_cache(pyscada_device.pk)
+        self.health = get_health(pyscada_device.pk)
+        self.write_metrics = WriteMetrics(f"opcua-{pyscada_device.pk}")
+        self._write_classes = {}
+        self._tuners = {}
+        self._read_time = None
+        self._too_fast = False
+        self.profiler = CycleProfiler(
+            f"opcua-{pyscada_device.pk}",
+            profile_directory(),
+            pyscada_device.opcuadevice.profiling,
+            pyscada_device.opcuadevice.profiling_sample,
+        )
+        self._profiling_checked = time()
+        self._traffic = None
+        self._replay = None
+        self.record_traffic(pyscada_device.opcuadevice.record_traffic)
+        # armed captures {pk: OPCUACapture}, running ones {pk: CaptureRecorder}
+        self._captures = {}
+        self._recorders = {}
+        self._trigger_values = {}
+        self._captures_checked = 0
         self.set_url()
 
     def set_url(self):
-        self.url = "opc."
-        self.url += str(
-            self._device.opcuadevice.protocol_choices[
-                self._device.opcuadevice.protocol
-            ][1]
+        self.url = self.get_url(
+            self._device.opcuadevice.IP_address,
+            self._device.opcuadevice.port,
+            self._device.opcuadevice.path,
         )
-        self.url += "://"
-        self.url += str(self._device.opcuadevice.IP_address)
-        self.url += ":"
-        self.url += str(self._device.opcuadevice.port)
-        self.url += str(self._device.opcuadevice.path)
+
+    def get_url(self, ip_address, port, path):
+        return device_url(self._device.opcuadevice, ip_address, port, path)
+
+    def get_session_set(self):
+        """
+        one session for the device server and, with hot standby, one for each
+        redundant server
+        """
+        sessions = device_session_set(self._device.opcuadevice)
+        for session in sessions.sessions:
+            session.traffic = self._traffic
+            if self._replay is not None:
+                session.client_factory = partial(ReplayClient, replay=self._replay)
+        return sessions
+
+    def use_event_loop(self, loop):
+        """
+        run the sessions of this device in a loop shared with other devices
+        """
+        self._loop = loop
+        self._shared_loop = True
+
+    def _run(self, coro):
+        """
+        run a coroutine in the event loop of this device
+
+        The loop lives in its own thread for the lifetime of the handler so
+        that the sessions (keep alive, subscriptions) survive between cycles.
+        """
+        if self._loop is None:
+            self._loop = EventLoopThread(f"pyscada.opcua-{self._device.pk}")
+        return self._loop.run(coro)
+
+    def close(self):
+        """
+        close all sessions and stop the event loop if it is not shared
+        """
+        self.record_traffic(False)
+        self.write_metrics.report()
+        if self._loop is None or not self._loop.running:
+            return
+        self._run(self.adisconnect())
+        if not self._shared_loop:
+            self._loop.stop()
+            self._loop = None
 
     async def aconnect(self):
         """
         establish a connection to the Instrument
         """
-        result = True
         if not self.connect():
             return False
 
-        self.inst = Client(url=self.url, timeout=10)
-        if self._device.opcuadevice.user is not None:
-            self.inst.set_user(str(self._device.opcuadevice.user))
-            if self._device.opcuadevice.password is not None:
-                self.inst.set_password(str(self._device.opcuadevice.password))
+        was_connected = self.inst is not None
+        result = await self._sessions.connect()
+        self.inst = self._sessions.client
+        if not result:
+            self._not_accessible_reason = self._sessions.reason
 
-        try:
-            await self.inst.connect()
-        except (TimeoutError, asyncioTimeoutError):
-            result = False
-            self._not_accessible_reason = f"Timeout connecting to {self._device}"
-            await self.adisconnect()
-        except CancelledError:
-            result = False
-            self._not_accessible_reason = (
-                f"Cancelled while connecting to {self._device}"
-            )
-            await self.adisconnect()
-        except OSError:
-            result = False
-            self._not_accessible_reason = f"Connect call to {self._device} failed"
-            await self.adisconnect()
-
-        if self._device_not_accessible > 0:
+        if result and not was_connected and self._device_not_accessible > 0:
             tree = []
             # await self.browse_nodes(self.inst.nodes.objects, tree)
             # await self.browse_nodes(self.inst.nodes.types, tree)
@@ -117,7 +338,7 @@ class GenericDevice(GenericHandlerDevice):
                 : OPCUADevice._meta.get_field("remote_devices_objects").max_length
             ]
             # logger.debug(self._device.opcuadevice.remote_devices_objects)
-            OPCUADevice.objects.abulk_update(
+            await OPCUADevice.objects.abulk_update(
                 [self._device.opcuadevice], ["remote_devices_objects"]
             )
 
@@ -127,41 +348,837 @@ class GenericDevice(GenericHandlerDevice):
 
     async def adisconnect(self):
         result = False
-        if self.inst is not None and hasattr(self.inst, "disconnect"):
-            await self.inst.disconnect()
+        for pk in list(self._recorders):
+            await self.afinish_capture(pk, "interrupted by a disconnect")
+        if self._subscriber is not None:
+            self._subscriber.stop()
+            self._subscriber = None
+            result = True
+        if self._sessions is not None:
+            await self._sessions.disconnect()
             result = True
         self.inst = None
         return result
 
+    def get_nodeid(self, variable):
+        return get_nodeid(variable)
+
+    async def aresolve_nodeids(self, variables):
+        """
+        NodeIds of variables on the active server, with the namespace index of
+        their namespace URI and the translation of their browse path
+        """
+        session = None if self._sessions is None else self._sessions.active
+        return await resolve_nodeids(session, variables)
+
+    def get_converter(self, variable):
+        """
+        value conversion bound to the variable in the read plan
+        """
+        if self._plan is not None:
+            converter = self._plan.converter(variable.pk)
+            if converter is not None:
+                return converter
+        return get_converter(
+            variable.value_class,
+            variable.opcuavariable.bit,
+            getattr(variable, "byte_order", None),
+        )
+
+    def get_read_plan(self, variables_dict):
+        """
+        build the read plan on the first cycle, later changes are applied
+        incrementally by apply_plan_updates
+        """
+        if self._plan is not None:
+            return self._plan
+        # the scaling is needed by the batch update, inside the event loop
+        # the ORM can not load it
+        prefetch_related_objects(list(variables_dict.values()), "scaling")
+        plan = ReadPlan()
+        for variable in variables_dict.values():
+            if variable.readable:
+                plan.add(
+                    variable,
+                    self.get_nodeid(variable),
+                    self.get_converter(variable),
+                    variable.opcuavariable.namespace_uri,
+                    variable.opcuavariable.browse_path,
+                )
+        self._plan = plan
+        return plan
+
+    def update_profiling(self):
+        """
+        apply the profiling settings changed in the admin, the worker is not
+        restarted for them
+        """
+        if self._replay is not None:
+            # set by the replaying command
+            return
+        if time() - self._profiling_checked < PROFILING_POLL:
+            return
+        self._profiling_checked = time()
+        config = (
+            OPCUADevice.objects.filter(pk=self._device.opcuadevice.pk)
+            .values_list("profiling", "profiling_sample", "record_traffic")
+            .first()
+        )
+        if config is not None:
+            self.profiler.configure(*config[:2])
+            self.record_traffic(config[2])
+
+    def record_traffic(self, enabled):
+        """
+        start or stop recording the exchanges of the sessions, one file per
+        recording
+        """
+        if bool(enabled) == (self._traffic is not None):
+            return
+        if enabled:
+            self._traffic = TrafficRecorder(
+                os.path.join(
+                    traffic_directory(),
+                    f"opcua-{self._device.pk}-"
+                    f"{datetime.now().strftime('%Y%m%d-%H%M%S')}.jsonl.gz",
+                )
+            )
+            self._traffic.open()
+        else:
+            self._traffic.close()
+            self._traffic = None
+        if self._sessions is not None:
+            for session in self._sessions.sessions:
+                session.traffic = self._traffic
+
+    def use_traffic_replay(self, replay):
+        """
+        answer the requests of the sessions from a TrafficReplay instead of
+        the servers, to benchmark the acquisition against recorded traffic
+        """
+        self._replay = replay
+        if self._sessions is not None:
+            self._run(self._sessions.disconnect())
+            self._sessions = None
+
+    def apply_plan_updates(self):
+        """
+        add, replace or remove the variables queued by the signals
+        """
+        updates = list(
+            OPCUAReadPlanUpdate.objects.filter(device_id=self._device.pk).values_list(
+                "pk", "variable_id"
+            )
+        )
+        if not len(updates):
+            return 0
+        variable_ids = set(variable_id for _, variable_id in updates)
+        variables = {
+            v.pk: v
+            for v in Variable.objects.filter(
+                pk__in=variable_ids,
+                device_id=self._device.pk,
+                active=1,
+                opcuavariable__isnull=False,
+            ).select_related("opcuavariable", "scaling")
+        }
+        for variable_id in variable_ids:
+            variable = variables.get(variable_id)
+            self._write_classes.pop(variable_id, None)
+            if variable is None:
+                self._variables.pop(variable_id, None)
+            else:
+                self._variables[variable_id] = variable
+            if self._plan is None:
+                continue
+            if variable is not None and variable.readable:
+                self._plan.remove(variable_id)
+                self._plan.add(
+                    variable,
+                    self.get_nodeid(variable),
+                    self.get_converter(variable),
+                    variable.opcuavariable.namespace_uri,
+                    variable.opcuavariable.browse_path,
+                )
+            else:
+                self._plan.remove(variable_id)
+        OPCUAReadPlanUpdate.objects.filter(pk__in=[pk for pk, _ in updates]).delete()
+        logger.debug(
+            f"{self._device} read plan updated for {len(variable_ids)} variables"
+        )
+        return len(variable_ids)
+
+    def prepare_read(self, variables_dict):
+        """
+        the synchronous (ORM) part of a read, done outside of the event loop
+        """
+        if self._sessions is None:
+            self._sessions = self.get_session_set()
+        self.update_profiling()
+        self.apply_plan_updates()
+        self.get_read_plan(variables_dict)
+        self.update_captures()
+
+    def update_captures(self):
+        """
+        start the armed captures whose trigger fired and finish the running
+        ones, the captures are saved without restarting the device workers
+        """
+        if self._replay is not None:
+            return
+        if time() - self._captures_checked >= CAPTURE_POLL:
+            self._captures_checked = time()
+            self.load_captures()
+        for pk, recorder in list(self._recorders.items()):
+            if recorder.client is not self.inst:
+                self._run(self.afinish_capture(pk, "the session was lost"))
+            elif recorder.done:
+                self._run(self.afinish_capture(pk))
+        if self.inst is None:
+            return
+        for capture in list(self._captures.values()):
+            if self.capture_triggered(capture):
+                self.start_capture(capture)
+
+    def load_captures(self):
+        self._captures = {}
+        for capture in OPCUACapture.objects.filter(
+            opcua_device=self._device.opcuadevice,
+            state__in=(OPCUACapture.ARMED, OPCUACapture.STOPPING),
+        ):
+            if capture.state == OPCUACapture.ARMED:
+                if capture.pk not in self._recorders:
+                    self._captures[capture.pk] = capture
+            elif capture.pk in self._recorders:
+                self._run(self.afinish_capture(capture.pk, "stopped"))
+            else:
+                # recording in a worker that has been restarted since
+                OPCUACapture.objects.filter(pk=capture.pk).update(
+                    state=OPCUACapture.FAILED, message="interrupted"
+                )
+        for trigger in set(self._trigger_values) - set(self._captures):
+            del self._trigger_values[trigger]
+        for pk, recorder in self._recorders.items():
+            OPCUACapture.objects.filter(pk=pk).update(samples=recorder.samples)
+
+    def capture_triggered(self, capture):
+        """
+        True if a capture is manual or the condition on the cached value of
+        its trigger variable is met
+        """
+        if capture.trigger == OPCUACapture.MANUAL:
+            return True
+        entry = self.cache.get(capture.trigger_variable_id)
+        if entry is None:
+            return False
+        previous = self._trigger_values.get(capture.pk)
+        self._trigger_values[capture.pk] = entry.value
+        return condition_met(
+            capture.trigger_condition, entry.value, capture.trigger_value, previous
+        )
+
+    def start_capture(self, capture):
+        del self._captures[capture.pk]
+        self._trigger_values.pop(capture.pk, None)
+        variables = list(
+            capture.variables.filter(
+                device_id=self._device.pk, opcuavariable__isnull=False
+            ).select_related("opcuavariable")
+        )
+        if not len(variables):
+            OPCUACapture.objects.filter(pk=capture.pk).update(
+                state=OPCUACapture.FAILED, message="no OPC-UA variable of the device"
+            )
+            return
+        recorder = CaptureRecorder(
+            capture.pk,
+            capture_path(capture),
+            [variable.pk for variable in variables],
+            self._run(self.aresolve_nodeids(variables)),
+            capture.max_samples,
+            capture.duration,
+            capture.sampling_interval,
+        )
+        session = self._sessions.active
+        capabilities = Capabilities() if session is None else session.capabilities
+        if not self._run(
+            recorder.start(
+                self.inst,
+                capabilities.min_interval,
+                capabilities.max_monitored_items_per_call,
+            )
+        ):
+            OPCUACapture.objects.filter(pk=capture.pk).update(
+                state=OPCUACapture.FAILED, message=recorder.message[:254]
+            )
+            return
+        self._recorders[capture.pk] = recorder
+        OPCUACapture.objects.filter(pk=capture.pk).update(
+            state=OPCUACapture.RECORDING,
+            file=recorder.path,
+            samples=0,
+            started=_datetime(recorder.started),
+            finished=None,
+            message=recorder.message[:254],
+        )
+
+    async def afinish_capture(self, pk, message=None):
+        recorder = self._recorders.pop(pk)
+        await recorder.stop()
+        if message is None and recorder.dropped:
+            message = f"file full, {recorder.dropped} samples dropped"
+        await OPCUACapture.objects.filter(pk=pk).aupdate(
+            state=OPCUACapture.DONE,
+            samples=recorder.samples,
+            finished=_datetime(time()),
+            message=(message or recorder.message)[:254],
+        )
+        logger.info(
+            f"OPC-UA capture {pk} of {self._device} done, {recorder.samples} samples"
+        )
+
+    def submit_read(self, variables_dict, erase_cache=False):
+        """
+        start a read in the event loop without waiting for it, the next
+        read_data_all returns its result
+        """
+        if self.pubsub:
+            # the subscriber receives all the time, read_data_all drains it
+            return None
+        self.prepare_read(variables_dict)
+        if self._loop is None:
+            self._loop = EventLoopThread(f"pyscada.opcua-{self._device.pk}")
+        self._prefetched = self._loop.submit(
+            self.aread_data_all(variables_dict, erase_cache)
+        )
+        return self._prefetched
+
     def read_data_all(self, variables_dict, erase_cache=False):
-        return async_to_sync(self.aread_data_all)(variables_dict, erase_cache)
+        if self.pubsub:
+            return self.read_pubsub(variables_dict, erase_cache)
+        if self._prefetched is not None:
+            future, self._prefetched = self._prefetched, None
+            return future.result()
+        self.prepare_read(variables_dict)
+        return self._run(self.aread_data_all(variables_dict, erase_cache))
+
+    @property
+    def pubsub(self):
+        """
+        True in PubSub subscriber mode
+        """
+        return bool(self._device.opcuadevice.pubsub_url)
+
+    def get_subscriber(self):
+        """
+        PubSubSubscriber with the DataSetReaders of the device
+        """
+        opcua_device = self._device.opcuadevice
+        return PubSubSubscriber(
+            opcua_device.pubsub_url,
+            self.get_dataset_readers(),
+            opcua_device.pubsub_interface,
+        )
+
+    def get_dataset_readers(self):
+        """
+        DataSetReaders of the device, their fields mapped onto the variables
+        """
+        opcua_device = self._device.opcuadevice
+        readers = []
+        for reader in OPCUADataSetReader.objects.filter(opcua_device=opcua_device):
+            mapped = {}
+            for variable in self._variables.values():
+                if (
+                    variable.opcuavariable.dataset_reader_id == reader.pk
+                    and variable.opcuavariable.dataset_field is not None
+                ):
+                    mapped[variable.opcuavariable.dataset_field] = variable
+            size = max(mapped) + 1 if len(mapped) else 0
+            readers.append(
+                DataSetReader(
+                    reader.name,
+                    [mapped[i].pk if i in mapped else None for i in range(size)],
+                    reader.publisher_id,
+                    reader.writer_group_id,
+                    reader.dataset_writer_id,
+                    # the RawData layout is only known if all fields are mapped
+                    (
+                        [mapped[i].value_class for i in range(size)]
+                        if len(mapped) == size
+                        else None
+                    ),
+                )
+            )
+        return readers
+
+    def read_pubsub(self, variables_dict, erase_cache=False):
+        """
+        hand the samples received since the last read to PyScada, all the
+        samples of a variable in one update_values call
+        """
+        if self.apply_plan_updates() and self._subscriber is not None:
+            # the fields of the readers follow the changed variables
+            self._subscriber.readers = self.get_dataset_readers()
+        if self._subscriber is None:
+            self._subscriber = self.get_subscriber()
+        if not self._subscriber.running and not self._run(self._subscriber.start()):
+            return []
+        output = []
+        cached = []
+        for variable_id, samples in self._subscriber.buffer.drain().items():
+            variable = variables_dict.get(variable_id)
+            if variable is None:
+                continue
+            converter = self.get_converter(variable)
+            values = []
+            timestamps = []
+            for value, timestamp, status in samples:
+                if status & STATUS_NOT_GOOD:
+                    continue
+                try:
+                    value = converter.decode(value)
+                except (TypeError, ValueError, struct.error):
+                    continue
+                if value is None:
+                    continue
+                values.append(value)
+                timestamps.append(timestamp)
+                last_status = status
+            if not len(values):
+                continue
+            cached.append(
+                (
+                    variable_id,
+                    scale_value(variable, values[-1]),
+                    timestamps[-1],
+                    last_status,
+                )
+            )
+            if variable.update_values(values, timestamps, erase_cache=erase_cache):
+                output.append(variable)
+        self.cache.put_many(cached)
+        return output
 
     async def aread_data_all(self, variables_dict, erase_cache=False):
+        with self.profiler.cycle("read"):
+            return await self._aread_data_all(variables_dict, erase_cache)
+
+    async def _aread_data_all(self, variables_dict, erase_cache=False):
         output = []
+        phase = self.profiler.phase
 
-        if await self.abefore_read():
-            for item in variables_dict.values():
-                if item.readable:
-                    value, read_time = await self.aread_data_and_time(item)
-                    if (
-                        value is not None
-                        and read_time is not None
-                        and item.update_values(
-                            value, read_time, erase_cache=erase_cache
+        with phase("connect"):
+            connected = await self.abefore_read()
+        if connected:
+            plan = self.get_read_plan(variables_dict)
+            with phase("read"):
+                columns = await self.aread_plan(plan)
+            read_time = await self.atime()
+            with phase("convert"):
+                changed, unchanged = self._batch.candidates(plan, columns, read_time)
+                status = columns.status
+                # the cache holds the values like update_values stores them,
+                # the unchanged ones are already scaled by the batch update
+                cached = [
+                    (
+                        plan.variables[i].pk,
+                        float(self._batch.scaled[i]),
+                        read_time,
+                        int(status[i]),
+                    )
+                    for i in unchanged
+                ]
+                for position in changed:
+                    item = plan.variables[position]
+                    value = await self.avalue_from_columns(item, columns, position)
+                    if value is None:
+                        continue
+                    if status[position] == ua.StatusCodes.BadAttributeIdInvalid:
+                        # the value was returned by a method call
+                        status[position] = ua.StatusCodes.Good
+                    cached.append(
+                        (
+                            item.pk,
+                            scale_value(item, value),
+                            read_time,
+                            int(status[position]),
                         )
-                    ):
+                    )
+                    if item.update_values(value, read_time, erase_cache=erase_cache):
+                        self._batch.stored(position, read_time)
                         output.append(item)
+            with phase("persist"):
+                self.cache.put_many(cached)
+                await self.asave_status(
+                    self.health.update(plan, columns, read_time), read_time
+                )
+        elif self._plan is not None:
+            read_time = await self.atime()
+            with phase("persist"):
+                await self.asave_status(
+                    self.health.disconnected(self._plan, read_time), read_time
+                )
         await self.aafter_read()
         return output
 
+    async def asave_status(self, changes, read_time):
+        """
+        persist the StatusCode of the variables whose status changed, one
+        UPDATE per distinct StatusCode
+        """
+        if not len(changes):
+            return
+        status_time = _datetime(read_time)
+        groups = {}
+        for variable_id, status in changes:
+            groups.setdefault(status, []).append(variable_id)
+        try:
+            for status, variable_ids in groups.items():
+                for start in range(0, len(variable_ids), STATUS_CHUNK_SIZE):
+                    await OPCUAVariable.objects.filter(
+                        opcua_variable_id__in=variable_ids[
+                            start : start + STATUS_CHUNK_SIZE
+                        ]
+                    ).aupdate(
+                        quality=quality(status),
+                        status_code=status,
+                        status_time=status_time,
+                    )
+        except Exception as e:
+            logger.warning(f"OPC-UA saving the status of {self._device} failed : {e}")
+
+    async def aread_plan(self, plan):
+        """
+        read all nodes of the plan, chunk by chunk, on the active session and
+        call the method-backed variables, returns the ReadColumns of the cycle
+        """
+        columns = self._columns
+        columns.resize(len(plan))
+        columns.reset()
+        if not await self._sessions.prepare(plan):
+            return columns
+        await self.aclassify_plan(plan)
+        cycle_start = time()
+        fast_decoding = self._device.opcuadevice.fast_decoding
+        tuner = self.tuner("read")
+        for positions in tuner.chunks(plan.read_positions()):
+            start = time()
+            if fast_decoding:
+                data = await self._on_active(
+                    lambda session: session.read_raw(positions)
+                )
+            else:
+                data = await self._on_active(lambda session: session.read(positions))
+            tuner.record(len(positions), time() - start, data is None)
+            if data is None:
+                return columns
+            if fast_decoding:
+                self.decode_read_response(data, columns, positions)
+                continue
+            for position, data_value in zip(positions, data):
+                self.set_data_value(columns, position, data_value)
+        if self._sessions.active is not None:
+            self._sessions.active.check_paths(plan, columns.status)
+        await self.acall_methods(plan, columns)
+        self.record_read_time(time() - cycle_start)
+        return columns
+
+    def tuner(self, kind):
+        """
+        Tuner of the size of the requests of kind ("read", "write", "call") or
+        of the number of method calls in flight ("concurrency"), capped by the
+        OperationLimits of the active server
+        """
+        tuner = self._tuners.get(kind)
+        if kind == "concurrency":
+            concurrency = self.method_call_concurrency
+            if tuner is None:
+                tuner = self._tuners[kind] = Tuner(
+                    concurrency,
+                    step=1,
+                    target=self._device.opcuadevice.method_call_timeout / 2,
+                )
+            tuner.set_limit(concurrency)
+            return tuner
+        start, maximum, capability = REQUEST_SIZES[kind]
+        if tuner is None:
+            tuner = self._tuners[kind] = Tuner(start, maximum)
+        session = None if self._sessions is None else self._sessions.active
+        if session is not None:
+            tuner.set_limit(session.capabilities.limit(capability, maximum))
+        return tuner
+
+    def record_read_time(self, duration):
+        """
+        smooth the time the server needs for a read cycle and warn when the
+        polling interval is shorter
+        """
+        if self._read_time is None:
+            self._read_time = duration
+        else:
+            self._read_time += READ_TIME_WEIGHT * (duration - self._read_time)
+        too_fast = self._device.polling_interval < self.min_polling_interval
+        if too_fast and not self._too_fast:
+            logger.warning(
+                f"OPC-UA {self._device} polling interval "
+                f"{self._device.polling_interval}s is shorter than the "
+                f"{self.min_polling_interval:.3f}s the server needs"
+            )
+        self._too_fast = too_fast
+
+    @property
+    def min_polling_interval(self):
+        """
+        shortest polling interval the server keeps up with, from its
+        MinSupportedSampleRate and the measured read time
+        """
+        interval = 0.0
+        if self._read_time is not None:
+            interval = self._read_time * INTERVAL_MARGIN
+        session = None if self._sessions is None else self._sessions.active
+        if session is not None:
+            interval = max(interval, session.capabilities.min_interval)
+        return interval
+
+    def set_data_value(self, columns, position, data_value):
+        columns.set(
+            position,
+            None if data_value.Value is None else data_value.Value.Value,
+            data_value.StatusCode.value,
+            _timestamp(data_value.SourceTimestamp),
+            _timestamp(data_value.ServerTimestamp),
+        )
+
+    def decode_read_response(self, data, columns, positions):
+        """
+        decode the numeric scalars of a binary ReadResponse straight into the
+        columns, the other values with the asyncua decoder
+        """
+        try:
+            deferred = decode_read_response(data, columns, positions)
+        except (DecodeError, IndexError, struct.error) as e:
+            logger.info(f"OPC-UA fast decoding failed for {self._device} : {e}")
+            response = struct_from_binary(ua.ReadResponse, Buffer(data))
+            for position, data_value in zip(positions, response.Results):
+                self.set_data_value(columns, position, data_value)
+            return
+        for position, start, end in deferred:
+            columns.objects[position] = variant_from_binary(
+                Buffer(data[start:end])
+            ).Value
+
+    async def _on_active(self, request):
+        """
+        run request(session) on the active session
+
+        A failed request is repeated once on each remaining server of the set
+        so that a failover happens within the current cycle.
+        """
+        for attempt in range(len(self._sessions.sessions)):
+            session = self._sessions.active
+            try:
+                return await request(session)
+            except (TimeoutError, asyncioTimeoutError):
+                logger.info(f"OPC-UA request timeout on {session}")
+            except CancelledError:
+                # the deadline of the caller ran out, the server is not at fault
+                raise
+            except Exception as e:
+                logger.info(f"OPC-UA request on {session} failed : {e}")
+            if not await self._sessions.failover():
+                self.inst = None
+                return None
+            self.inst = self._sessions.client
+        return None
+
+    async def aclassify_plan(self, plan):
+        """
+        find the method nodes among the new entries of the plan and prepare
+        their Call parameters, done once per entry
+        """
+        positions = plan.unclassified()
+        if not len(positions):
+            return
+        # NodeIds with the namespace URIs resolved on the active server
+        nodeids = self._sessions.active.resolved
+        try:
+            classes = []
+            for chunk in self.tuner("read").chunks(positions):
+                classes += await self.inst.uaclient.read_attributes(
+                    [nodeids[i] for i in chunk], ua.AttributeIds.NodeClass
+                )
+            methods = []
+            for position, node_class in zip(positions, classes):
+                if (
+                    node_class.StatusCode.is_good()
+                    and node_class.Value.Value == ua.NodeClass.Method
+                ):
+                    methods.append(position)
+                else:
+                    plan.classify(plan.variables[position].pk)
+            if not len(methods):
+                return
+            arguments = {}
+            async for arg in OPCUAMethodArgument.objects.filter(
+                opcua_method__opcua_variable_id__in=[
+                    plan.variables[i].pk for i in methods
+                ]
+            ).order_by("position"):
+                arguments.setdefault(arg.opcua_method_id, []).append(arg)
+            semaphore = asyncio.Semaphore(self.tuner("concurrency").size)
+            await asyncio.gather(
+                *[
+                    self._aprepare_method(
+                        plan,
+                        plan.variables[i],
+                        nodeids[i],
+                        arguments.get(plan.variables[i].opcuavariable.pk, []),
+                        semaphore,
+                    )
+                    for i in methods
+                ]
+            )
+            # a status persisted before the method was known to be write only
+            write_only = [
+                plan.variables[i].pk
+                for i in methods
+                if plan.variables[i].pk in plan.write_only()
+            ]
+            if len(write_only):
+                await OPCUAVariable.objects.filter(
+                    opcua_variable_id__in=write_only, quality__isnull=False
+                ).aupdate(quality=None, status_code=None, status_time=None)
+        except Exception as e:
+            logger.info(f"OPC-UA classifying nodes of {self._device} failed : {e}")
+
+    async def _aprepare_method(self, plan, variable, nodeid, args, semaphore):
+        node = self.inst.get_node(nodeid)
+        async with semaphore:
+            parent = await node.get_parent()
+            try:
+                inputs = await (await node.get_child("0:InputArguments")).read_value()
+            except ua.UaStatusCodeError:
+                inputs = []
+            if len(inputs) != len(args):
+                logger.debug(
+                    f"Bad method arguments quantity for : {variable}. Should be {len(inputs)} not {len(args)}."
+                )
+                plan.classify(variable.pk, MethodCall(parent.nodeid, nodeid, None))
+                return
+            arguments = []
+            for arg, argument in zip(args, inputs):
+                if arg.data_type != 0:
+                    # the variable value is needed, only a write can call it
+                    arguments = None
+                    break
+                arguments.append(
+                    string_to_variant(
+                        str(arg.value),
+                        await data_type_to_variant_type(
+                            Node(node.session, argument.DataType)
+                        ),
+                    )
+                )
+        plan.classify(variable.pk, MethodCall(parent.nodeid, nodeid, arguments))
+
+    @property
+    def method_call_concurrency(self):
+        return max(1, self._device.opcuadevice.method_call_concurrency)
+
+    async def acall_methods(self, plan, columns):
+        """
+        call the method-backed variables packed in Call requests, with at most
+        method_call_concurrency requests in flight and a deadline per request,
+        both the request size and the concurrency are tuned on the response
+        time
+        """
+        calls = plan.method_calls()
+        if not len(calls):
+            return
+        tuner = self.tuner("call")
+        concurrency = self.tuner("concurrency")
+        semaphore = asyncio.Semaphore(concurrency.size)
+        timeout = self._device.opcuadevice.method_call_timeout
+
+        async def call(chunk):
+            requests = [
+                ua.CallMethodRequest(
+                    ObjectId=method.object_id,
+                    MethodId=method.method_id,
+                    InputArguments=list(method.arguments),
+                )
+                for _, method in chunk
+            ]
+            async with semaphore:
+                start = time()
+                timed_out = False
+                try:
+                    # a slow method is not a failure of the server, the
+                    # deadline is kept out of the failover
+                    call_results = await asyncio.wait_for(
+                        self._on_active(
+                            lambda session: session.client.uaclient.call(requests)
+                        ),
+                        timeout,
+                    )
+                except (TimeoutError, asyncioTimeoutError):
+                    logger.info(
+                        f"OPC-UA call of {len(chunk)} methods on {self._device} "
+                        f"exceeded {timeout}s"
+                    )
+                    call_results = None
+                    timed_out = True
+                duration = time() - start
+            tuner.record(len(chunk), duration, call_results is None)
+            concurrency.record(concurrency.size, duration, call_results is None)
+            if timed_out:
+                for position, _ in chunk:
+                    columns.set(position, None, ua.StatusCodes.BadTimeout)
+            if call_results is None:
+                return
+            for (position, _), result in zip(chunk, call_results):
+                columns.set(
+                    position,
+                    (
+                        result.OutputArguments[0].Value
+                        if len(result.OutputArguments)
+                        else None
+                    ),
+                    result.StatusCode.value,
+                )
+
+        await asyncio.gather(*[call(chunk) for chunk in tuner.chunks(calls)])
+
+    async def avalue_from_columns(self, variable, columns, position):
+        """
+        converted value of a plan entry, methods are called instead of read
+        """
+        status = int(columns.status[position])
+        if status == ua.StatusCodes.BadAttributeIdInvalid:
+            # logger.debug('BadAttributeIdInvalid : %s' % variable)
+            value = await self._call_method(variable)
+        elif status & STATUS_NOT_GOOD:
+            logger.debug(f"OPC-UA read of {variable} : {status:#010x}")
+            return None
+        else:
+            value = columns.value(position)
+        if value is None:
+            return None
+        try:
+            return self.get_converter(variable).decode(value)
+        except (TypeError, ValueError, struct.error) as e:
+            logger.info(f"OPC-UA value of {variable} could not be converted : {e}")
+            return None
+
     async def abefore_read(self):
         return await self.aconnect()
 
     async def aafter_read(self):
         """
-        will be called after the last read_data
+        will be called after the last read_data, the sessions stay open
         """
-        return await self.adisconnect()
+        return True
 
     async def aread_data_and_time(self, variable_instance):
         """
@@ -175,18 +1192,15 @@ class GenericDevice(GenericHandlerDevice):
 
     async def aread_data(self, variable):
         value = None
+        ns_i = None
         try:
-            node = self.inst.get_node(
-                ua.NodeId(
-                    variable.opcuavariable.Identifier,
-                    variable.opcuavariable.NamespaceIndex,
-                )
-            )
+            ns_i = (await self.aresolve_nodeids([variable]))[0]
+            node = self.inst.get_node(ns_i)
             value = await node.read_value()
         except (TimeoutError, asyncioTimeoutError):
-            logger.info(f"OPC-UA read value timeout for {self.ns_i}")
+            logger.info(f"OPC-UA read value timeout for {ns_i}")
         except CancelledError:
-            logger.info(f"OPC-UA read value cancelled for {self.ns_i}")
+            logger.info(f"OPC-UA read value cancelled for {ns_i}")
         except ua.uaerrors._auto.BadAttributeIdInvalid:
             # logger.debug('BadAttributeIdInvalid : %s' % variable)
             value = await self._call_method(variable)
@@ -199,34 +1213,297 @@ class GenericDevice(GenericHandlerDevice):
         """
         write values to the device
         """
-        return async_to_sync(self.awrite_data)(variable_id, value, task)
+        if self._sessions is None:
+            self._sessions = self.get_session_set()
+        self.update_profiling()
+        return self._run(self.awrite_data(variable_id, value, task))
 
     async def awrite_data(self, variable_id, value, task):
-        result = None
+        variable = await Variable.objects.select_related("opcuavariable").aget(
+            id=variable_id
+        )
+        result = (await self.awrite([(variable, value)]))[0]
+        if result.status & STATUS_NOT_GOOD or result.verified is False:
+            return None
+        return result.value
 
-        variable = Variable.objects.get(id=variable_id)
+    def write(self, writes, verify=None):
+        """
+        write [(variable, value)] and wait for the WriteResults, see awrite
+        """
+        if self._sessions is None:
+            self._sessions = self.get_session_set()
+        return self._run(self.awrite(writes, verify))
 
-        if await self.aconnect():
-            result = await self._call_method(variable, value)
-        await self.adisconnect()
+    async def awrite(self, writes, verify=None):
+        """
+        write [(variable, value)] on the live session, returns a WriteResult
+        per write in the same order
 
-        return result
+        Variable nodes are written with one Write request, method nodes are
+        called. With verify (default: the verify_writes setting of the device)
+        the written nodes are read back with a Read request sent right behind
+        the Write request, and read again once the Write is confirmed if the
+        first read-back does not match.
+        """
+        with self.profiler.cycle("write"):
+            return await self._awrite(writes, verify)
+
+    async def _awrite(self, writes, verify=None):
+        if verify is None:
+            verify = self._device.opcuadevice.verify_writes
+        phase = self.profiler.phase
+        start = time()
+        writes = list(writes)
+        results = [None] * len(writes)
+        with phase("connect"):
+            connected = await self.aconnect()
+        if connected:
+            nodes = []
+            with phase("classify"):
+                classes = await self.aclassify_writes(writes)
+            for index, is_method in enumerate(classes):
+                variable, value = writes[index]
+                if is_method:
+                    with phase("call"):
+                        status, output = await self._acall_method(variable, value)
+                    results[index] = WriteResult(
+                        variable.pk,
+                        status,
+                        output,
+                        (output is not None) if verify else None,
+                        time() - start,
+                    )
+                else:
+                    nodes.append(index)
+            if len(nodes):
+                with phase("write"):
+                    await self._awrite_nodes(writes, nodes, results, verify, start)
+        read_time = await self.atime()
+        for index, (variable, value) in enumerate(writes):
+            result = results[index]
+            if result is None:
+                result = WriteResult(
+                    variable.pk,
+                    ua.StatusCodes.BadNotConnected,
+                    None,
+                    False if verify else None,
+                    time() - start,
+                )
+                results[index] = result
+            self.write_metrics.record(result)
+            if not result.status & STATUS_NOT_GOOD and result.value is not None:
+                self.cache.put(
+                    variable.pk,
+                    scale_value(variable, result.value),
+                    read_time,
+                    result.status,
+                )
+        return results
+
+    async def aclassify_writes(self, writes):
+        """
+        True for the variables of writes that are methods, the node class of
+        the variables not classified by the read plan is read in one request
+        """
+        classes = []
+        unknown = []
+        for variable, _ in writes:
+            is_method = self._write_classes.get(variable.pk)
+            if is_method is None and self._plan is not None:
+                is_method = self._plan.is_method(variable.pk)
+            if is_method is None:
+                unknown.append(variable)
+            classes.append(is_method)
+        if len(unknown):
+            nodeids = await self.aresolve_nodeids(unknown)
+            node_classes = await self._on_active(
+                lambda session: session.client.uaclient.read_attributes(
+                    nodeids, ua.AttributeIds.NodeClass
+                )
+            )
+            for variable, node_class in zip(unknown, node_classes or []):
+                if node_class.StatusCode.is_good():
+                    self._write_classes[variable.pk] = (
+                        node_class.Value.Value == ua.NodeClass.Method
+                    )
+        return [
+            self._write_classes.get(variable.pk, False) if c is None else c
+            for (variable, _), c in zip(writes, classes)
+        ]
+
+    async def _awrite_nodes(self, writes, indexes, results, verify, start):
+        """
+        write the variable nodes at indexes of writes, in Write requests
+        tuned on their response time
+        """
+        values = []
+        written = []
+        for index in indexes:
+            variable, value = writes[index]
+            try:
+                variant = self.get_converter(variable).encode(value)
+            except (TypeError, ValueError, OverflowError, struct.error) as e:
+                logger.info(f"OPC-UA value {value} for {variable} not encoded : {e}")
+                results[index] = WriteResult(
+                    variable.pk,
+                    ua.StatusCodes.BadTypeMismatch,
+                    None,
+                    False if verify else None,
+                    time() - start,
+                )
+                continue
+            values.append(ua.DataValue(variant))
+            written.append((index, variable, variant.Value))
+        if not len(written):
+            return
+        nodeids = await self.aresolve_nodeids([variable for _, variable, _ in written])
+        tuner = self.tuner("write")
+        size = tuner.size
+        for offset in range(0, len(written), size):
+            chunk = written[offset : offset + size]
+            chunk_start = time()
+            done = await self._awrite_chunk(
+                chunk,
+                nodeids[offset : offset + size],
+                values[offset : offset + size],
+                results,
+                verify,
+                start,
+            )
+            tuner.record(len(chunk), time() - chunk_start, not done)
+
+    async def _awrite_chunk(self, written, nodeids, values, results, verify, start):
+        """
+        one Write request, with its read-back when verify is set, returns
+        False if the server did not answer
+        """
+
+        async def request(session):
+            uaclient = session.client.uaclient
+            write = uaclient.write_attributes(nodeids, values, ua.AttributeIds.Value)
+            if not verify:
+                return await write, None
+            return await asyncio.gather(
+                write, uaclient.read_attributes(nodeids, ua.AttributeIds.Value)
+            )
+
+        response = await self._on_active(request)
+        if response is None:
+            return False
+        statuses, read_back = response
+        if verify and not all(
+            self._applied(variable, value, data_value) is not False
+            for (_, variable, value), data_value in zip(written, read_back)
+        ):
+            # the server may have served the Read before the Write
+            read_back = await self._on_active(
+                lambda session: session.client.uaclient.read_attributes(
+                    nodeids, ua.AttributeIds.Value
+                )
+            )
+        latency = time() - start
+        for position, (index, variable, value) in enumerate(written):
+            status = statuses[position].value
+            verified = None
+            if verify:
+                verified = read_back is not None and bool(
+                    self._applied(variable, value, read_back[position])
+                )
+                if verified:
+                    value = read_back[position].Value.Value
+            results[index] = WriteResult(
+                variable.pk,
+                status,
+                (
+                    None
+                    if status & STATUS_NOT_GOOD
+                    else self.get_converter(variable).decode(value)
+                ),
+                verified,
+                latency,
+            )
+        return True
+
+    def _applied(self, variable, value, data_value):
+        """
+        True if a read-back DataValue holds the written value, None if it
+        can not be told
+        """
+        if not data_value.StatusCode.is_good() or data_value.Value is None:
+            return None
+        converter = self.get_converter(variable)
+        try:
+            expected = converter.decode(value)
+            actual = converter.decode(data_value.Value.Value)
+        except (TypeError, ValueError, struct.error):
+            return None
+        if isinstance(expected, float) or isinstance(actual, float):
+            try:
+                return isclose(float(expected), float(actual), rel_tol=1e-6)
+            except (TypeError, ValueError):
+                return False
+        return expected == actual
+
+    def read_cached(self, variable_id, max_age=None):
+        """
+        latest value of a variable, the server is only asked if the cached
+        value is older than max_age seconds
+        """
+        entry = self.cache.get(variable_id, max_age)
+        if entry is not None:
+            return entry.value
+        variable = self._variables.get(variable_id)
+        if variable is None:
+            return None
+        if self._sessions is None:
+            self._sessions = self.get_session_set()
+        return self._run(self.aread_cached(variable, max_age))
+
+    async def aread_cached(self, variable, max_age=None):
+        entry = self.cache.get(variable.pk, max_age)
+        if entry is not None:
+            return entry.value
+        value = None
+        if await self.aconnect():
+            value = await self.aread_data(variable)
+        if value is None:
+            return None
+        try:
+            value = self.get_converter(variable).decode(value)
+        except (TypeError, ValueError, struct.error) as e:
+            logger.info(f"OPC-UA value of {variable} could not be converted : {e}")
+            return None
+        value = scale_value(variable, value)
+        self.cache.put(variable.pk, value, await self.atime())
+        return value
 
     async def _call_method(self, variable, value=None):
-        args = variable.opcuavariable.opcuamethodargument_set.all().order_by("position")
+        return (await self._acall_method(variable, value))[1]
+
+    async def _acall_method(self, variable, value=None):
+        """
+        call a method-backed variable, returns (StatusCode, output or value)
+        """
+        args = [
+            arg
+            async for arg in variable.opcuavariable.opcuamethodargument_set.all().order_by(
+                "position"
+            )
+        ]
         result = None
+        status = ua.StatusCodes.BadUnexpectedError
+        ns_i = None
 
         try:
-            ns_i = ua.NodeId(
-                variable.opcuavariable.Identifier, variable.opcuavariable.NamespaceIndex
-            )
+            ns_i = (await self.aresolve_nodeids([variable]))[0]
             node = self.inst.get_node(ns_i)
             inputs = await (await node.get_child("0:InputArguments")).read_value()
             if len(inputs) != len(args):
                 logger.debug(
                     f"Bad method arguments quantity for : {variable}. Should be {len(inputs)} not {len(args)}."
                 )
-                return None
+                return ua.StatusCodes.BadArgumentsMissing, None
             args_values = []
             for i in range(0, len(inputs)):
                 val = None
@@ -234,43 +1511,56 @@ class GenericDevice(GenericHandlerDevice):
                     val = string_to_variant(
                         str(args[i].value),
                         await data_type_to_variant_type(
-                            Node(node.server, inputs[i].DataType)
+                            Node(node.session, inputs[i].DataType)
                         ),
                     )
                 elif args[i].data_type == 1:
                     if value is None:
-                        return None
-                    try:
-                        val = string_to_variant(
-                            str(value),
-                            self.value_class_to_variant_type(variable.value_class),
-                        )
-                    except ValueError:
-                        val = string_to_variant(
-                            str(int(value)),
-                            self.value_class_to_variant_type(variable.value_class),
-                        )
+                        return ua.StatusCodes.BadArgumentsMissing, None
+                    val = self.get_converter(variable).encode(value)
                 if val is not None:
                     args_values.append(val)
-            result = await call_method_full(await node.get_parent(), node, *args_values)
-            if result.StatusCode.is_good():
-                if hasattr(result, "OutputArguments") and len(result.OutputArguments):
-                    result = result.OutputArguments[0]
+            call_result = await call_method_full(
+                await node.get_parent(), node, *args_values
+            )
+            status = call_result.StatusCode.value
+            if call_result.StatusCode.is_good():
+                if len(call_result.OutputArguments):
+                    result = call_result.OutputArguments[0]
                 else:
                     result = value
 
         except (TimeoutError, asyncioTimeoutError):
             logger.info(f"OPC-UA read value timeout for {ns_i}")
+            status = ua.StatusCodes.BadTimeout
         except CancelledError:
             logger.info(f"OPC-UA read value cancelled for {ns_i}")
+            status = ua.StatusCodes.BadRequestCancelledByClient
         except ua.uaerrors._auto.BadAttributeIdInvalid:
             logger.info(f"BadAttributeIdInvalid : {variable}")
-            pass
+            status = ua.StatusCodes.BadAttributeIdInvalid
+        except ua.UaStatusCodeError as e:
+            logger.info(e)
+            status = e.code
         except Exception as e:
             logger.info(e)
-        return result
+        return status, result
+
+    def browse(self):
+        """
+        browse the Objects folder of the server, returns a flat list of nodes
+        """
+        if self._sessions is None:
+            self._sessions = self.get_session_set()
+        return self._run(self.abrowse())
+
+    async def abrowse(self):
+        tree = []
+        if await self.aconnect():
+            tree.append(await self.browse_nodes(self.inst.nodes.objects, tree))
+        return tree
 
-    async def browse_nodes(self, node: Node, tree):
+    async def browse_nodes(self, node: "Node", tree):
         """
         Build a nested node tree dict by recursion (filtered by OPC UA objects and variables).
         """
@@ -300,28 +1590,4 @@ class GenericDevice(GenericHandlerDevice):
         return d
 
     def value_class_to_variant_type(self, class_str):
-        VT = ua.VariantType
-        if class_str.upper() in ["FLOAT64", "DOUBLE", "FLOAT", "LREAL", "UNIXTIMEF64"]:
-            return VT.Float
-        if class_str.upper() in ["FLOAT32", "SINGLE", "REAL", "UNIXTIMEF32"]:
-            return VT.Float
-        if class_str.upper() in ["UINT64"]:
-            return VT.UInt64
-        if class_str.upper() in ["INT64", "UNIXTIMEI64"]:
-            return VT.Int64
-        if class_str.upper() in ["INT32"]:
-            return VT.Int32
-        if class_str.upper() in ["UINT32", "DWORD", "UNIXTIMEI32"]:
-            return VT.UInt32
-        if class_str.upper() in ["INT16", "INT"]:
-            return VT.Int16
-        if class_str.upper() in ["UINT", "UINT16", "WORD"]:
-            return VT.UInt16
-        if class_str.upper() in ["INT8"]:
-            return VT.SByte
-        if class_str.upper() in ["UINT8", "BYTE"]:
-            return VT.Byte
-        if class_str.upper() in ["BOOL", "BOOLEAN"]:
-            return VT.Boolean
-        else:
-            return VT.Variant
+        return variant_type(class_str)
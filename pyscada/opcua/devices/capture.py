@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from ..core.capture import CaptureFile
+
+from time import time
+
+try:
+    from asyncua import ua
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# publishing interval of the capture subscription in milliseconds, the
+# samples of one interval arrive in one notification
+PUBLISH_INTERVAL = 100
+# bounds of the monitored item queues holding the samples of one interval
+MIN_QUEUE_SIZE = 10
+MAX_QUEUE_SIZE = 10000
+
+
+def _timestamp(data_value):
+    for timestamp in (data_value.SourceTimestamp, data_value.ServerTimestamp):
+        if timestamp is not None:
+            return timestamp.timestamp()
+    return time()
+
+
+def queue_size(sampling_interval):
+    """
+    monitored item queue size holding the samples of two publishing intervals
+    """
+    if sampling_interval <= 0:
+        return MAX_QUEUE_SIZE
+    size = int(2 * PUBLISH_INTERVAL / sampling_interval) + 1
+    return max(MIN_QUEUE_SIZE, min(size, MAX_QUEUE_SIZE))
+
+
+class CaptureRecorder:
+    """
+    Record the samples of a subscription to a CaptureFile.
+
+    The variables are monitored at the requested sampling interval, or the
+    fastest rate of the server, the notifications are written to the file
+    as they arrive in the event loop. Nothing reaches the database until the
+    capture is imported.
+    """
+
+    def __init__(
+        self, capture_id, path, variable_ids, nodeids, capacity, duration, interval
+    ):
+        self.capture_id = capture_id
+        self.path = path
+        self.variable_ids = list(variable_ids)
+        self.nodeids = list(nodeids)
+        self.capacity = capacity
+        self.duration = duration
+        self.sampling_interval = interval
+        self.file = None
+        self.client = None
+        self.subscription = None
+        self.started = None
+        self.dropped = 0
+        self.message = ""
+        # NodeId -> columns of the variables of the node
+        self._columns = {}
+        for column, nodeid in enumerate(self.nodeids):
+            self._columns.setdefault(nodeid, []).append(column)
+
+    @property
+    def recording(self):
+        return self.subscription is not None
+
+    @property
+    def done(self):
+        """
+        True after duration seconds or if the file is full
+        """
+        if self.file is None or self.started is None:
+            return False
+        return self.file.full or time() - self.started >= self.duration
+
+    @property
+    def samples(self):
+        return 0 if self.file is None else len(self.file)
+
+    async def start(self, client, min_interval=0.0, max_items=0):
+        """
+        create the file and subscribe to the variables, with at most
+        max_items monitored items per CreateMonitoredItems request
+        """
+        if self.sampling_interval <= 0:
+            # the MinSupportedSampleRate, or 0 for the fastest practical rate
+            self.sampling_interval = min_interval * 1000.0
+        self.file = CaptureFile.create(self.path, self.variable_ids, self.capacity)
+        self.client = client
+        try:
+            self.subscription = await client.create_subscription(PUBLISH_INTERVAL, self)
+            nodes = [client.get_node(nodeid) for nodeid in self.nodeids]
+            size = int(max_items) if max_items > 0 else len(nodes)
+            results = []
+            for first in range(0, len(nodes), max(1, size)):
+                results += await self.subscription.subscribe_data_change(
+                    nodes[first : first + size],
+                    queuesize=queue_size(self.sampling_interval),
+                    sampling_interval=self.sampling_interval,
+                )
+        except (ua.UaError, OSError, TimeoutError) as e:
+            self.message = f"subscription failed : {e}"
+            await self.stop()
+            return False
+        failed = [r for r in results if isinstance(r, ua.StatusCode)]
+        if len(failed):
+            self.message = (
+                f"{len(failed)} of {len(results)} variables not monitored : "
+                f"{failed[0].name}"
+            )
+            logger.info(f"OPC-UA capture {self.capture_id} : {self.message}")
+        self.started = time()
+        logger.info(
+            f"OPC-UA capture {self.capture_id} recording {len(self.nodeids)} "
+            f"variables at {self.sampling_interval} ms to {self.path}"
+        )
+        return True
+
+    async def stop(self):
+        """
+        delete the subscription and close the file
+        """
+        if self.subscription is not None:
+            subscription, self.subscription = self.subscription, None
+            try:
+                await subscription.delete()
+            except Exception as e:
+                logger.debug(f"OPC-UA capture {self.capture_id} : {e}")
+        if self.file is not None:
+            self.file.close()
+
+    def datachange_notification(self, node, val, data):
+        if self.file is None or self.file.closed:
+            return
+        if self.started is not None and time() - self.started > self.duration:
+            # notifications of the last publishing interval
+            return
+        data_value = data.monitored_item.Value
+        timestamp = _timestamp(data_value)
+        status = data_value.StatusCode.value if data_value.StatusCode else 0
+        value = None if data_value.Value is None else data_value.Value.Value
+        for column in self._columns.get(node.nodeid, ()):
+            if not self.file.append(column, timestamp, value, status):
+                self.dropped += 1
+
+    def status_change_notification(self, status):
+        self.message = f"subscription status {status}"
+        logger.info(f"OPC-UA capture {self.capture_id} : {self.message}")
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from ..core.conversion import sample_converter
+from ..core.history import AGGREGATES
+from ..core.loop import EventLoopThread
+from . import resolve_nodeids
+
+from datetime import datetime, timezone
+import asyncio
+import struct
+
+try:
+    from asyncua import ua
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# initial number of nodes per HistoryRead request
+HISTORY_CHUNK_SIZE = 100
+# seconds without request after which the history sessions are closed
+IDLE_TIMEOUT = 60
+# StatusCode severity bits, a value is only used if both are clear
+STATUS_NOT_GOOD = 0xC0000000
+
+
+class HistoryClient:
+    """
+    Read-only client of the history of a device for the web processes.
+
+    It holds its own sessions, without the traffic recording, profiling,
+    captures and read plan of the acquisition handler. The sessions are
+    closed after IDLE_TIMEOUT seconds without request, and after every
+    request on a server announcing a MaxSessions limit, so that the web
+    processes do not hold sessions the acquisition needs.
+    """
+
+    def __init__(self, sessions, name):
+        self.sessions = sessions
+        self.loop = EventLoopThread(name)
+        self._lock = None
+        self._idle = None
+
+    def read_processed(self, variables, start, end, interval, aggregate):
+        """
+        {variable_id: [(timestamp, value), ...]} of the aggregate of the
+        history of variables per interval seconds from start to end
+        """
+        return self.loop.run(
+            self.aread_processed(variables, start, end, interval, aggregate)
+        )
+
+    async def aread_processed(self, variables, start, end, interval, aggregate):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._idle is not None:
+                self._idle.cancel()
+                self._idle = None
+            try:
+                return await self._aread_processed(
+                    variables, start, end, interval, aggregate
+                )
+            finally:
+                await self._release()
+
+    async def _release(self):
+        session = self.sessions.active
+        if session is None:
+            return
+        if session.capabilities.values.get("max_sessions"):
+            await self.sessions.disconnect()
+            return
+        self._idle = asyncio.get_running_loop().call_later(
+            IDLE_TIMEOUT, lambda: asyncio.ensure_future(self._close_idle())
+        )
+
+    async def _close_idle(self):
+        async with self._lock:
+            self._idle = None
+            await self.sessions.disconnect()
+
+    async def _aread_processed(self, variables, start, end, interval, aggregate):
+        """
+        HistoryReadProcessed of the variables through the active session,
+        following the continuation points of the server
+        """
+        if not await self.sessions.connect():
+            raise ConnectionError(self.sessions.reason or "no server connected")
+        session = self.sessions.active
+        aggregate = ua.NodeId(getattr(ua.ObjectIds, AGGREGATES[aggregate]))
+        nodeids = await resolve_nodeids(session, variables)
+        size = session.capabilities.limit(
+            "max_nodes_per_history_read_data", HISTORY_CHUNK_SIZE
+        )
+        # the history holds raw server values, the trends show the values
+        # the acquisition records
+        converters = [sample_converter(variable) for variable in variables]
+        result = {}
+        try:
+            for first in range(0, len(variables), size):
+                chunk = list(range(first, min(first + size, len(variables))))
+                details = ua.ReadProcessedDetails()
+                details.StartTime = datetime.fromtimestamp(start, timezone.utc)
+                details.EndTime = datetime.fromtimestamp(end, timezone.utc)
+                details.ProcessingInterval = interval * 1000.0
+                continuation = {i: None for i in chunk}
+                while len(continuation):
+                    params = ua.HistoryReadParameters()
+                    params.HistoryReadDetails = details
+                    params.TimestampsToReturn = ua.TimestampsToReturn.Source
+                    params.ReleaseContinuationPoints = False
+                    pending = list(continuation)
+                    for i in pending:
+                        read = ua.HistoryReadValueId()
+                        read.NodeId = nodeids[i]
+                        read.ContinuationPoint = continuation[i]
+                        params.NodesToRead.append(read)
+                    details.AggregateType = [aggregate] * len(pending)
+                    continuation = {}
+                    for i, data in zip(
+                        pending, await session.client.uaclient.history_read(params)
+                    ):
+                        values = result.setdefault(variables[i].pk, [])
+                        if not data.StatusCode.is_good():
+                            logger.info(
+                                f"{session} history of {variables[i]} : "
+                                f"{data.StatusCode.name}"
+                            )
+                            continue
+                        for data_value in getattr(data.HistoryData, "DataValues", []):
+                            value = self._value(data_value, converters[i])
+                            if value is not None:
+                                values.append(value)
+                        if data.ContinuationPoint:
+                            continuation[i] = data.ContinuationPoint
+        except (
+            ua.UaStatusCodeError,
+            ConnectionError,
+            OSError,
+            TimeoutError,
+            asyncio.TimeoutError,
+        ):
+            # the next request connects again
+            await self.sessions.failover()
+            raise
+        return result
+
+    def _value(self, data_value, convert):
+        """
+        (timestamp, converted value) of a good DataValue, else None
+        """
+        timestamp = data_value.SourceTimestamp or data_value.ServerTimestamp
+        value = data_value.Value.Value
+        if (
+            data_value.StatusCode.value & STATUS_NOT_GOOD
+            or timestamp is None
+            or value is None
+        ):
+            return None
+        try:
+            value = convert(value)
+        except (TypeError, ValueError, struct.error):
+            return None
+        if value is None:
+            return None
+        return timestamp.timestamp(), value
+
+    def close(self):
+        if not self.loop.running:
+            return
+        self.loop.run(self.sessions.disconnect())
+        self.loop.stop()
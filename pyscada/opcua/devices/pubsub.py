@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from ..core.pubsub import SampleBuffer, parse_pubsub_url
+
+from time import time
+import asyncio
+import ipaddress
+import socket
+import struct
+
+try:
+    from asyncua.common.utils import Buffer
+    from asyncua.pubsub.uadp import (
+        UadpDataSetDataValue,
+        UadpDataSetDeltaDataValue,
+        UadpDataSetDeltaVariant,
+        UadpDataSetRaw,
+        UadpDataSetVariant,
+        UadpNetworkMessage,
+    )
+
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# receive buffer asked for the socket, bursts at kHz rates overflow the
+# default one
+RECEIVE_BUFFER = 4 * 1024 * 1024
+
+
+def _timestamp(value):
+    return None if value is None else value.timestamp()
+
+
+def _fields(reader, dataset):
+    """
+    (position, value, status, source timestamp or None) of the fields of a
+    DataSetMessage, keep alive messages have none
+    """
+    if isinstance(dataset, UadpDataSetRaw):
+        for position, value in enumerate(reader.unpack_raw(dataset.Data)):
+            yield position, value, 0, None
+    elif isinstance(dataset, UadpDataSetVariant):
+        for position, variant in enumerate(dataset.Data):
+            yield position, variant.Value, 0, None
+    elif isinstance(dataset, UadpDataSetDataValue):
+        for position, data_value in enumerate(dataset.Data):
+            yield position, *_data_value(data_value)
+    elif isinstance(dataset, UadpDataSetDeltaVariant):
+        for delta in dataset.Data:
+            yield delta.No, delta.Value.Value, 0, None
+    elif isinstance(dataset, UadpDataSetDeltaDataValue):
+        for delta in dataset.Data:
+            yield delta.No, *_data_value(delta.Value)
+
+
+def _data_value(data_value):
+    return (
+        None if data_value.Value is None else data_value.Value.Value,
+        data_value.StatusCode.value,
+        _timestamp(data_value.SourceTimestamp),
+    )
+
+
+class UadpProtocol(asyncio.DatagramProtocol):
+    def __init__(self, subscriber):
+        self.subscriber = subscriber
+
+    def datagram_received(self, data, addr):
+        self.subscriber.receive(data, time())
+
+    def error_received(self, exc):
+        logger.info(f"OPC-UA PubSub {self.subscriber.url} : {exc}")
+
+
+class PubSubSubscriber:
+    """
+    Receive the UADP NetworkMessages sent to a UDP address, unicast or
+    multicast, and buffer the fields of the DataSetMessages selected by the
+    DataSetReaders per variable.
+
+    Decoding happens in the event loop as datagrams arrive, the DAQ process
+    drains the buffer once per polling interval.
+    """
+
+    def __init__(self, url, readers, interface=None, buffer=None):
+        self.url = url
+        self.host, self.port = parse_pubsub_url(url)
+        self.readers = list(readers)
+        self.interface = interface or None
+        self.buffer = SampleBuffer() if buffer is None else buffer
+        self.transport = None
+        self.messages = 0
+        self.errors = 0
+
+    @property
+    def running(self):
+        return self.transport is not None
+
+    def open_socket(self):
+        address = ipaddress.ip_address(socket.gethostbyname(self.host))
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        except OSError as e:
+            logger.debug(f"OPC-UA PubSub receive buffer not set : {e}")
+        if address.is_multicast:
+            sock.bind(("", self.port))
+            sock.setsockopt(
+                socket.IPPROTO_IP,
+                socket.IP_ADD_MEMBERSHIP,
+                address.packed + socket.inet_aton(self.interface or "0.0.0.0"),
+            )
+        else:
+            sock.bind((str(address), self.port))
+        sock.setblocking(False)
+        return sock
+
+    async def start(self):
+        if self.transport is not None:
+            return True
+        try:
+            sock = self.open_socket()
+        except OSError as e:
+            logger.warning(f"OPC-UA PubSub listening on {self.url} failed : {e}")
+            return False
+        loop = asyncio.get_running_loop()
+        self.transport, _ = await loop.create_datagram_endpoint(
+            lambda: UadpProtocol(self), sock=sock
+        )
+        logger.info(
+            f"OPC-UA PubSub listening on {self.url} with {len(self.readers)} readers"
+        )
+        return True
+
+    def stop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+
+    def receive(self, data, receive_time):
+        """
+        decode one NetworkMessage and buffer the fields of its DataSetMessages
+        """
+        try:
+            message = UadpNetworkMessage.from_binary(Buffer(data))
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"OPC-UA PubSub message from {self.url} not decoded : {e}")
+            return
+        payload = message.Payload
+        if not isinstance(payload, list):
+            # discovery and chunked messages are not used
+            return
+        self.messages += 1
+        publisher_id = message.Header.PublisherId
+        group = message.GroupHeader
+        writer_group_id = None if group is None else group.WriterGroupId
+        writer_ids = message.DataSetPayloadHeader or [None] * len(payload)
+        message_time = _timestamp(message.Timestamp) or receive_time
+        for writer_id, dataset in zip(writer_ids, payload):
+            for reader in self.readers:
+                if reader.matches(publisher_id, writer_group_id, writer_id):
+                    self.dispatch(reader, dataset, message_time)
+
+    def dispatch(self, reader, dataset, message_time):
+        header = dataset.Header
+        timestamp = _timestamp(header.Timestamp) or message_time
+        # the DataSetMessage status holds the upper 16 bits of a StatusCode
+        message_status = (header.Status or 0) << 16
+        fields = reader.fields
+        try:
+            for position, value, status, source_time in _fields(reader, dataset):
+                if position >= len(fields) or fields[position] is None:
+                    continue
+                self.buffer.append(
+                    fields[position],
+                    value,
+                    source_time or timestamp,
+                    status or message_status,
+                )
+        except (ValueError, TypeError, struct.error) as e:
+            self.errors += 1
+            logger.debug(f"OPC-UA PubSub DataSet of {reader.name} not decoded : {e}")
+            return
+        reader.messages += 1
+
+    def statistics(self):
+        return {
+            "messages": self.messages,
+            "errors": self.errors,
+            "samples": self.buffer.received,
+            "dropped": self.buffer.dropped,
+        }
@@ -0,0 +1,513 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from ..core.browsepath import TRANSLATE_CHUNK_SIZE, browse_path_request
+from ..core.capabilities import Capabilities, read_capabilities
+from ..core.plan import UNKNOWN_NAMESPACE
+from .traffic import record_client
+
+from time import time
+import asyncio
+
+try:
+    from asyncua import Client, ua
+    from concurrent.futures._base import TimeoutError
+
+    try:
+        from asyncio.exceptions import TimeoutError as asyncioTimeoutError
+        from asyncio.exceptions import CancelledError
+    except ModuleNotFoundError:
+        # for python version < 3.8
+        from asyncio import TimeoutError as asyncioTimeoutError
+        from asyncio import CancelledError
+    driver_ok = True
+except ImportError:
+    driver_ok = False
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# deadline of the ServiceLevel/ServerStatus probe, a dead server must not
+# block the cycle for the full request timeout
+HEALTH_TIMEOUT = 2
+# RegisterNodes request size, servers rarely announce a limit for it
+REGISTER_CHUNK_SIZE = 1000
+# ServerState enumeration value of a running server
+SERVER_STATE_RUNNING = 0
+# seconds before reconnecting a standby session, doubled after every failed
+# attempt up to RECONNECT_BACKOFF_MAX
+RECONNECT_BACKOFF = 2
+RECONNECT_BACKOFF_MAX = 60
+
+
+class ServerSession:
+    """
+    One client session on one server of a (redundant) server set.
+    """
+
+    def __init__(self, url, priority=0, user=None, password=None, timeout=10):
+        self.url = url
+        self.priority = priority
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self.client = None
+        self.service_level = None
+        self.server_state = None
+        self.nodeids = []
+        self.resolved = []
+        self.namespaces = []
+        # {(browse path, namespace index): NodeId or None if not found}
+        self.paths = {}
+        self.capabilities = Capabilities()
+        self.plan_version = None
+        self.reason = None
+        # Client class of the sessions, a ReplayClient to replay a recording
+        self.client_factory = Client if driver_ok else None
+        # TrafficRecorder of the exchanges of the session or None
+        self.traffic = None
+
+    def __str__(self):
+        return self.url
+
+    @property
+    def connected(self):
+        return self.client is not None
+
+    def healthy(self, threshold):
+        """
+        a server is healthy if it is running and reports enough ServiceLevel,
+        unknown values (no probe done) are considered healthy
+        """
+        if not self.connected:
+            return False
+        if self.server_state not in (None, SERVER_STATE_RUNNING):
+            return False
+        return self.service_level is None or self.service_level >= threshold
+
+    async def connect(self):
+        if self.client is not None:
+            return True
+
+        client = record_client(
+            self.client_factory(url=self.url, timeout=self.timeout),
+            self.url,
+            lambda: self.traffic,
+        )
+        if self.user is not None:
+            client.set_user(str(self.user))
+            if self.password is not None:
+                client.set_password(str(self.password))
+
+        try:
+            await client.connect()
+            await self.read_namespaces(client)
+            await self.read_capabilities(client)
+        except (TimeoutError, asyncioTimeoutError):
+            self.reason = f"Timeout connecting to {self.url}"
+        except CancelledError:
+            self.reason = f"Cancelled while connecting to {self.url}"
+        except OSError:
+            self.reason = f"Connect call to {self.url} failed"
+        except Exception as e:
+            # UaStatusCodeError of a refused session, the client is closed
+            # below like after any other failure
+            self.reason = f"Connecting to {self.url} failed : {e}"
+        else:
+            self.reason = None
+            self.service_level = None
+            self.server_state = None
+            self.nodeids = []
+            self.resolved = []
+            self.plan_version = None
+            # the address space may have changed while disconnected
+            self.paths = {}
+            # set last, a session is only used once it is fully set up
+            self.client = client
+            return True
+
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.debug(f"OPC-UA disconnect of {self.url} failed : {e}")
+        return False
+
+    async def disconnect(self):
+        client = self.client
+        self.client = None
+        self.nodeids = []
+        self.resolved = []
+        self.plan_version = None
+        if client is None:
+            return False
+        try:
+            await client.disconnect()
+        except Exception as e:
+            logger.debug(f"OPC-UA disconnect of {self.url} failed : {e}")
+        return True
+
+    async def read_namespaces(self, client):
+        """
+        read the NamespaceArray once per session, the nodes addressed by URI
+        are resolved against it when the plan is prepared
+        """
+        try:
+            namespaces = await client.get_namespace_array()
+        except Exception as e:
+            logger.info(f"OPC-UA reading the NamespaceArray of {self.url} failed : {e}")
+            namespaces = []
+        if len(self.namespaces) and namespaces != self.namespaces:
+            logger.warning(f"OPC-UA NamespaceArray of {self.url} changed")
+        self.namespaces = namespaces
+
+    async def read_capabilities(self, client):
+        """
+        read the OperationLimits of the server once per session, the request
+        sizes of the device are capped by them
+        """
+        try:
+            self.capabilities = await read_capabilities(client)
+        except Exception as e:
+            logger.info(f"OPC-UA reading the capabilities of {self.url} failed : {e}")
+            self.capabilities = Capabilities()
+        logger.debug(f"OPC-UA {self.url} : {self.capabilities}")
+
+    def namespace_index(self, uri):
+        try:
+            return self.namespaces.index(uri)
+        except ValueError:
+            return UNKNOWN_NAMESPACE
+
+    def resolve(self, nodeid, uri=None):
+        """
+        nodeid with the index of the namespace uri on this server
+        """
+        if not uri:
+            return nodeid
+        return ua.NodeId(nodeid.Identifier, self.namespace_index(uri))
+
+    async def translate_paths(self, keys):
+        """
+        NodeIds of (browse path, namespace index) keys, the paths not cached
+        yet are translated with TranslateBrowsePathsToNodeIds in chunks, a path
+        not found gets a NodeId in UNKNOWN_NAMESPACE
+        """
+        requests = []
+        for key in dict.fromkeys(keys):
+            if key in self.paths:
+                continue
+            try:
+                requests.append((key, browse_path_request(*key)))
+            except ValueError as e:
+                logger.warning(f"OPC-UA {e}")
+                self.paths[key] = None
+        size = self.capabilities.limit("max_nodes_per_translate", TRANSLATE_CHUNK_SIZE)
+        for start in range(0, len(requests), size):
+            chunk = requests[start : start + size]
+            try:
+                results = await self.client.uaclient.translate_browsepaths_to_nodeids(
+                    [browse_path for _, browse_path in chunk]
+                )
+            except Exception as e:
+                # not cached, translated again by the next call
+                logger.info(
+                    f"OPC-UA translating browse paths on {self.url} failed : {e}"
+                )
+                break
+            for (key, _), result in zip(chunk, results):
+                self.paths[key] = self._target(key[0], result)
+        unknown = ua.NodeId(0, UNKNOWN_NAMESPACE)
+        return [self.paths.get(key) or unknown for key in keys]
+
+    def _target(self, path, result):
+        # targets with a RemainingPathIndex are only partial matches
+        targets = [
+            t.TargetId for t in result.Targets if t.RemainingPathIndex == 0xFFFFFFFF
+        ]
+        if not result.StatusCode.is_good() or not len(targets):
+            logger.warning(
+                f"OPC-UA browse path {path} not found on {self.url} : "
+                f"{result.StatusCode.name}"
+            )
+            return None
+        if len(targets) > 1:
+            logger.warning(
+                f"OPC-UA browse path {path} matches {len(targets)} nodes on "
+                f"{self.url}, using {targets[0].to_string()}"
+            )
+        return ua.NodeId(targets[0].Identifier, targets[0].NamespaceIndex)
+
+    def check_paths(self, plan, status):
+        """
+        forget the translated browse paths when one of their nodes was read
+        with BadNodeIdUnknown, the model of the server changed and the plan is
+        translated again on the next prepare
+        """
+        for position in plan.browse_positions():
+            if (
+                int(status[position]) == ua.StatusCodes.BadNodeIdUnknown
+                and self.resolved[position].NamespaceIndex != UNKNOWN_NAMESPACE
+            ):
+                logger.info(
+                    f"OPC-UA node of browse path {plan.browse_paths[position]} "
+                    f"disappeared from {self.url}, translating again"
+                )
+                self.paths = {}
+                self.plan_version = None
+                return True
+        return False
+
+    async def probe(self, timeout=HEALTH_TIMEOUT):
+        """
+        read ServiceLevel and ServerStatus.State, drop the session on failure
+        """
+        if self.client is None:
+            return False
+        try:
+            level, state = await asyncio.wait_for(
+                self.client.uaclient.read_attributes(
+                    [
+                        ua.NodeId(ua.ObjectIds.Server_ServiceLevel),
+                        ua.NodeId(ua.ObjectIds.Server_ServerStatus_State),
+                    ],
+                    ua.AttributeIds.Value,
+                ),
+                timeout,
+            )
+        except Exception as e:
+            logger.info(f"OPC-UA health check of {self.url} failed : {e}")
+            await self.disconnect()
+            return False
+        self.service_level = (
+            int(level.Value.Value) if level.StatusCode.is_good() else None
+        )
+        self.server_state = (
+            int(state.Value.Value) if state.StatusCode.is_good() else None
+        )
+        return True
+
+    async def prepare(self, plan):
+        """
+        resolve the namespace URIs of the read plan and register its nodes on
+        this server
+        """
+        if self.client is None or self.plan_version == plan.version:
+            return
+        resolved = plan.resolve(
+            self.namespaces, lambda nodeid, index: ua.NodeId(nodeid.Identifier, index)
+        )
+        positions = plan.browse_positions()
+        if len(positions):
+            translated = await self.translate_paths(
+                [(plan.browse_paths[i], resolved[i].NamespaceIndex) for i in positions]
+            )
+            for position, nodeid in zip(positions, translated):
+                resolved[position] = nodeid
+        if self.nodeids:
+            try:
+                await self.client.uaclient.unregister_nodes(self.nodeids)
+            except Exception as e:
+                logger.debug(f"OPC-UA unregister nodes on {self.url} failed : {e}")
+        registered = []
+        try:
+            for start, stop in plan.chunks(
+                self.capabilities.limit(
+                    "max_nodes_per_register_nodes", REGISTER_CHUNK_SIZE
+                )
+            ):
+                registered += await self.client.uaclient.register_nodes(
+                    resolved[start:stop]
+                )
+        except ua.UaStatusCodeError as e:
+            logger.debug(f"OPC-UA register nodes on {self.url} failed : {e}")
+            registered = list(resolved)
+        self.resolved = resolved
+        self.nodeids = registered
+        self.plan_version = plan.version
+
+    async def read(self, positions):
+        """
+        read the Value attribute of the prepared nodes at positions
+        """
+        return await self.client.uaclient.read_attributes(
+            [self.nodeids[i] for i in positions], ua.AttributeIds.Value
+        )
+
+    async def read_raw(self, positions):
+        """
+        read like read() but return the undecoded binary ReadResponse
+        """
+        request = ua.ReadRequest()
+        for i in positions:
+            rv = ua.ReadValueId()
+            rv.NodeId = self.nodeids[i]
+            rv.AttributeId = ua.AttributeIds.Value
+            request.Parameters.NodesToRead.append(rv)
+        data = await self.client.uaclient.protocol.send_request(request)
+        return data.copy().read(len(data))
+
+
+class SessionSet:
+    """
+    The sessions of a device, a single one or one per server of a redundant set.
+
+    With hot standby every server keeps an open session with the nodes of the
+    read plan registered, so switching over is a matter of picking another
+    session instead of a timeout plus a fresh connection. Lost standby
+    sessions are reconnected in the background with a backoff, the reads
+    only use the sessions that are connected.
+    """
+
+    def __init__(self, sessions, hot_standby=False, service_level_threshold=200):
+        self.sessions = sorted(sessions, key=lambda s: s.priority)
+        self.hot_standby = hot_standby
+        self.service_level_threshold = service_level_threshold
+        self.active = None
+        # running background reconnect of the standby sessions
+        self._reconnecting = None
+        # {session: (time of the next attempt, backoff)}
+        self._retry = {}
+        # read plan of the last prepare, a session is only selected once it
+        # has the plan registered
+        self._plan = None
+
+    @property
+    def client(self):
+        return None if self.active is None else self.active.client
+
+    @property
+    def reason(self):
+        reasons = [s.reason for s in self.sessions if s.reason is not None]
+        return ", ".join(reasons) if reasons else None
+
+    async def connect(self):
+        """
+        open the missing sessions and select the active one
+        """
+        if not self.hot_standby and self.active is not None:
+            if self.active.connected:
+                return True
+        if self.hot_standby:
+            if self._reconnecting is not None and self._reconnecting.done():
+                self._reconnecting = None
+            disconnected = [s for s in self.sessions if not s.connected]
+            if len(disconnected) == len(self.sessions):
+                # nothing to read from, wait for the servers
+                if self._reconnecting is not None:
+                    await asyncio.shield(self._reconnecting)
+                else:
+                    await self.reconnect(disconnected)
+            elif self._reconnecting is None:
+                now = time()
+                due = [s for s in disconnected if self._retry.get(s, (0,))[0] <= now]
+                if len(due):
+                    self._reconnecting = asyncio.ensure_future(self.reconnect(due))
+        else:
+            for session in self.sessions:
+                if await session.connect():
+                    break
+        return await self.select()
+
+    async def reconnect(self, sessions):
+        """
+        connect sessions, the ones that fail are retried after their backoff
+        """
+        results = await asyncio.gather(
+            *[s.connect() for s in sessions], return_exceptions=True
+        )
+        now = time()
+        for session, result in zip(sessions, results):
+            if result is True:
+                if session in self._retry:
+                    logger.info(f"OPC-UA {session} reconnected")
+                self._retry.pop(session, None)
+                continue
+            if isinstance(result, Exception):
+                logger.info(f"OPC-UA connecting {session} failed : {result}")
+            backoff = self._retry.get(session, (0, RECONNECT_BACKOFF / 2))[1]
+            backoff = min(backoff * 2, RECONNECT_BACKOFF_MAX)
+            self._retry[session] = (now + backoff, backoff)
+
+    async def select(self):
+        """
+        keep the active session while it is healthy, otherwise switch to the
+        healthy session with the best priority or the highest ServiceLevel
+        """
+        if self.hot_standby:
+            await asyncio.gather(*[s.probe() for s in self.sessions if s.connected])
+        while True:
+            candidates = [s for s in self.sessions if s.connected]
+            if not len(candidates):
+                self.active = None
+                return False
+            threshold = self.service_level_threshold
+            if self.active in candidates and self.active.healthy(threshold):
+                best = self.active
+            else:
+                healthy = [s for s in candidates if s.healthy(threshold)]
+                if len(healthy):
+                    best = healthy[0]
+                else:
+                    best = max(
+                        candidates, key=lambda s: (s.service_level or 0, -s.priority)
+                    )
+            # a standby reconnected in the background since the last prepare
+            # has no nodes registered yet
+            if not await self._prepared(best):
+                continue
+            if self.active is not None and best is not self.active:
+                logger.warning(f"OPC-UA switching from {self.active} to {best}")
+            self.active = best
+            return True
+
+    async def _prepared(self, session):
+        """
+        register the read plan on a session that does not have it yet, a
+        session that fails is dropped
+        """
+        plan = self._plan
+        if plan is None or session.plan_version == plan.version:
+            return True
+        try:
+            await session.prepare(plan)
+        except Exception as e:
+            logger.info(f"OPC-UA preparing {session} failed : {e}")
+            await session.disconnect()
+            return False
+        return True
+
+    async def failover(self):
+        """
+        drop the active session after a failed request and select another one
+        """
+        if self.active is not None:
+            await self.active.disconnect()
+        self.active = None
+        return await self.select()
+
+    async def prepare(self, plan):
+        """
+        register the read plan on the active session and mirror it on the standbys
+        """
+        self._plan = plan
+        connected = [s for s in self.sessions if s.connected]
+        results = await asyncio.gather(
+            *[s.prepare(plan) for s in connected], return_exceptions=True
+        )
+        for session, result in zip(connected, results):
+            if isinstance(result, Exception):
+                logger.info(f"OPC-UA preparing {session} failed : {result}")
+                await session.disconnect()
+        if self.active is None or not self.active.connected:
+            return await self.failover()
+        return True
+
+    async def disconnect(self):
+        if self._reconnecting is not None:
+            self._reconnecting.cancel()
+            await asyncio.gather(self._reconnecting, return_exceptions=True)
+            self._reconnecting = None
+        await asyncio.gather(*[s.disconnect() for s in self.sessions])
+        self._retry = {}
+        self.active = None
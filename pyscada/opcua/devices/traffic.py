@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from ..core.traffic import CONNECTION, STATUS, TIMEOUT
+
+from time import perf_counter, time
+import asyncio
+
+try:
+    from asyncua import Client, ua
+    from asyncua.common.utils import Buffer
+    from asyncua.ua.ua_binary import struct_to_binary
+
+    driver_ok = True
+except ImportError:
+    Client = object
+    driver_ok = False
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(request):
+    """
+    binary encoding of a request without its RequestHeader, which changes
+    on every request (handle, timestamp)
+    """
+    parameters = getattr(request, "Parameters", None)
+    if parameters is None:
+        return b""
+    return struct_to_binary(parameters)
+
+
+def record_client(client, url, get_recorder):
+    """
+    record the exchanges of the sessions of client with get_recorder(), the
+    recorder can be enabled and disabled while the session is open
+    """
+    uaclient = client.uaclient
+    make_protocol = uaclient._make_protocol
+
+    def _make_protocol():
+        protocol = make_protocol()
+        send_request = protocol.send_request
+
+        async def recorded(request, *args, **kwargs):
+            recorder = get_recorder()
+            if recorder is None:
+                return await send_request(request, *args, **kwargs)
+            service = type(request).__name__
+            key = request_key(request)
+            started = time()
+            start = perf_counter()
+            try:
+                data = await send_request(request, *args, **kwargs)
+            except ua.UaStatusCodeError as e:
+                recorder.record(
+                    url,
+                    service,
+                    key,
+                    started,
+                    perf_counter() - start,
+                    error=STATUS,
+                    code=e.code,
+                )
+                raise
+            except (TimeoutError, asyncio.TimeoutError):
+                recorder.record(
+                    url, service, key, started, perf_counter() - start, error=TIMEOUT
+                )
+                raise
+            except (ConnectionError, OSError):
+                recorder.record(
+                    url, service, key, started, perf_counter() - start, error=CONNECTION
+                )
+                raise
+            recorder.record(
+                url,
+                service,
+                key,
+                started,
+                perf_counter() - start,
+                response=data.copy().read(len(data)),
+            )
+            return data
+
+        protocol.send_request = recorded
+        return protocol
+
+    uaclient._make_protocol = _make_protocol
+    return client
+
+
+class ReplayProtocol:
+    """
+    Stand-in for the socket protocol of a client answering the requests from
+    a TrafficReplay after the recorded (scaled) latency, no server involved.
+    """
+
+    def __init__(self, replay, url):
+        self.replay = replay
+        self.url = url
+        self.authentication_token = ua.NodeId()
+        self.pre_request_hook = None
+        self.on_connection_lost = None
+        self.is_session_closing = None
+        self.closed = False
+
+    @property
+    def is_closed(self):
+        return self.closed
+
+    async def send_request(self, request, timeout=None, message_type=None):
+        if self.closed:
+            raise ConnectionError("Connection is closed")
+        service = type(request).__name__
+        exchange = self.replay.match(self.url, service, request_key(request))
+        if exchange is None:
+            logger.debug(f"OPC-UA replay of {self.url} : no {service} recorded")
+            raise ua.UaStatusCodeError(ua.StatusCodes.BadServiceUnsupported)
+        await asyncio.sleep(self.replay.delay(exchange))
+        if exchange["error"] == STATUS:
+            raise ua.UaStatusCodeError(exchange["code"])
+        if exchange["error"] == TIMEOUT:
+            raise asyncio.TimeoutError()
+        if exchange["error"] == CONNECTION:
+            raise ConnectionError(f"recorded connection error of {service}")
+        return Buffer(exchange["response"])
+
+    def revolve_security_token(self):
+        pass
+
+    async def close_secure_channel(self):
+        pass
+
+    def disconnect_socket(self):
+        self.closed = True
+
+
+class ReplayClient(Client):
+    """
+    asyncua Client whose session is replayed from a recording: connect
+    attaches a ReplayProtocol instead of opening a socket, secure channel
+    and session, the services of the handler are answered from the file.
+    """
+
+    def __init__(self, url, timeout=4, replay=None):
+        super().__init__(url=url, timeout=timeout)
+        self.replay = replay
+        self.replay_url = url
+
+    async def connect(self):
+        self.uaclient.protocol = ReplayProtocol(self.replay, self.replay_url)
+
+    async def disconnect(self):
+        protocol = self.uaclient.protocol
+        if protocol is not None:
+            protocol.disconnect_socket()
+            self.uaclient.protocol = None
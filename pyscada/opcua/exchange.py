@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Variable, Unit
+from pyscada.opcua.models import OPCUAVariable, OPCUAMethodArgument
+
+from django.db import transaction
+
+import gzip
+import json
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+FILE_FORMAT = "pyscada-opcua-nodes"
+FILE_VERSION = 1
+
+VARIABLE_COLUMNS = (
+    "name",
+    "description",
+    "active",
+    "writeable",
+    "value_class",
+    "unit",
+    "NamespaceIndex",
+    "Identifier",
+)
+ARGUMENT_COLUMNS = ("variable", "position", "data_type", "value")
+NODE_COLUMNS = ("ns", "i", "name", "cls", "type")
+# upper bound of OPCUAVariable.Identifier
+IDENTIFIER_MAX = 32767
+# value class of the variables created from browsed nodes
+VARIANT_TYPE_VALUE_CLASS = {
+    "Double": "FLOAT64",
+    "Float": "FLOAT32",
+    "Int64": "INT64",
+    "UInt64": "UINT64",
+    "Int32": "INT32",
+    "UInt32": "UINT32",
+    "Int16": "INT16",
+    "UInt16": "UINT16",
+    "SByte": "INT8",
+    "Byte": "UINT8",
+    "Boolean": "BOOLEAN",
+}
+
+
+def _columns(names, rows):
+    """
+    transpose a list of row tuples to a dict of column lists
+    """
+    columns = {name: [] for name in names}
+    for row in rows:
+        for name, value in zip(names, row):
+            columns[name].append(value)
+    return columns
+
+
+def _rows(names, columns):
+    return zip(*[columns[name] for name in names])
+
+
+def export_device(device, nodes=None):
+    """
+    collect the variable mapping, the method arguments and optionally the
+    browsed nodes of a device in a columnar dict
+    """
+    variables = (
+        Variable.objects.filter(device=device, opcuavariable__isnull=False)
+        .select_related("unit", "opcuavariable")
+        .order_by("pk")
+    )
+    arguments = (
+        OPCUAMethodArgument.objects.filter(opcua_method__opcua_variable__device=device)
+        .select_related("opcua_method__opcua_variable")
+        .order_by("opcua_method__opcua_variable__pk", "position")
+    )
+    data = {
+        "format": FILE_FORMAT,
+        "version": FILE_VERSION,
+        "device": device.short_name,
+        "variables": _columns(
+            VARIABLE_COLUMNS,
+            (
+                (
+                    v.name,
+                    v.description,
+                    v.active,
+                    v.writeable,
+                    v.value_class,
+                    v.unit.unit,
+                    v.opcuavariable.NamespaceIndex,
+                    v.opcuavariable.Identifier,
+                )
+                for v in variables
+            ),
+        ),
+        "arguments": _columns(
+            ARGUMENT_COLUMNS,
+            (
+                (
+                    a.opcua_method.opcua_variable.name,
+                    a.position,
+                    a.data_type,
+                    a.value,
+                )
+                for a in arguments
+            ),
+        ),
+    }
+    if nodes is not None:
+        data["nodes"] = _columns(
+            NODE_COLUMNS,
+            (
+                (n["ns"], n["i"], n["name"], n["cls"], n["type"])
+                for n in nodes
+                if n is not None
+            ),
+        )
+    return data
+
+
+def write_file(path, data):
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"), default=str)
+
+
+def read_file(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("format") != FILE_FORMAT:
+        raise ValueError(f"{path} is not a {FILE_FORMAT} file")
+    if data.get("version", 0) > FILE_VERSION:
+        raise ValueError(f"{path} has an unsupported version {data['version']}")
+    return data
+
+
+def nodes_to_variables(data):
+    """
+    add a variable for every browsed Variable node that is not mapped yet
+    """
+    variables = data["variables"]
+    nodes = data.get("nodes", {})
+    mapped = set(zip(variables["NamespaceIndex"], variables["Identifier"]))
+    names = set(variables["name"])
+    for ns, i, name, cls, var_type in _rows(NODE_COLUMNS, nodes):
+        if cls != "Variable" or not isinstance(i, int) or (ns, i) in mapped:
+            continue
+        if i > IDENTIFIER_MAX:
+            logger.info(f"Identifier of node ns={ns};i={i} is too large, skipped")
+            continue
+        name = f"{data['device']}_{name}"
+        if name in names:
+            name = f"{name}_{ns}_{i}"
+        names.add(name)
+        mapped.add((ns, i))
+        for column, value in zip(
+            VARIABLE_COLUMNS,
+            (
+                name,
+                "",
+                False,
+                False,
+                VARIANT_TYPE_VALUE_CLASS.get(var_type, "FLOAT64"),
+                "",
+                ns,
+                i,
+            ),
+        ):
+            variables[column].append(value)
+    return data
+
+
+@transaction.atomic
+def import_device(device, data):
+    """
+    create or update the variables, OPC-UA nodes and method arguments of a
+    device with bulk queries, no post_save signal is sent
+
+    returns the number of created and updated variables
+    """
+    units = {u.unit: u for u in Unit.objects.all()}
+    default_unit = Unit.objects.order_by("pk").first()
+    existing = {
+        v.name: v
+        for v in Variable.objects.filter(
+            name__in=data["variables"]["name"]
+        ).select_related("opcuavariable")
+    }
+
+    new_variables = []
+    changed_variables = []
+    nodes = {}
+    for name, description, active, writeable, value_class, unit, ns, i in _rows(
+        VARIABLE_COLUMNS, data["variables"]
+    ):
+        variable = existing.get(name)
+        if variable is None:
+            variable = Variable(name=name, device=device)
+            new_variables.append(variable)
+        elif variable.device_id != device.pk:
+            raise ValueError(f"Variable {name} belongs to another device")
+        else:
+            changed_variables.append(variable)
+        variable.description = description
+        variable.active = active
+        variable.writeable = writeable
+        variable.value_class = value_class
+        variable.unit = units.get(unit, default_unit)
+        nodes[name] = (ns, i)
+
+    Variable.objects.bulk_create(new_variables)
+    Variable.objects.bulk_update(
+        changed_variables,
+        ["description", "active", "writeable", "value_class", "unit"],
+    )
+
+    # bulk_create does not return primary keys on every database backend
+    variable_ids = dict(
+        Variable.objects.filter(device=device, name__in=nodes.keys()).values_list(
+            "name", "pk"
+        )
+    )
+    opcua_variables = {
+        o.opcua_variable_id: o
+        for o in OPCUAVariable.objects.filter(
+            opcua_variable_id__in=variable_ids.values()
+        )
+    }
+    new_nodes = []
+    for name, (ns, i) in nodes.items():
+        opcua_variable = opcua_variables.get(variable_ids[name])
+        if opcua_variable is None:
+            opcua_variable = OPCUAVariable(opcua_variable_id=variable_ids[name])
+            new_nodes.append(opcua_variable)
+        opcua_variable.NamespaceIndex = ns
+        opcua_variable.Identifier = i
+    OPCUAVariable.objects.bulk_create(new_nodes)
+    OPCUAVariable.objects.bulk_update(
+        opcua_variables.values(), ["NamespaceIndex", "Identifier"]
+    )
+
+    method_ids = dict(
+        OPCUAVariable.objects.filter(
+            opcua_variable_id__in=variable_ids.values()
+        ).values_list("opcua_variable__name", "pk")
+    )
+    arguments = [
+        OPCUAMethodArgument(
+            opcua_method_id=method_ids[name],
+            position=position,
+            data_type=data_type,
+            value=value,
+        )
+        for name, position, data_type, value in _rows(
+            ARGUMENT_COLUMNS, data["arguments"]
+        )
+        if name in method_ids
+    ]
+    OPCUAMethodArgument.objects.filter(
+        opcua_method_id__in=set(a.opcua_method_id for a in arguments)
+    ).delete()
+    OPCUAMethodArgument.objects.bulk_create(arguments)
+
+    return len(new_variables), len(changed_variables)
@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Variable
+from pyscada.opcua import PROTOCOL_ID
+from pyscada.opcua.core.history import (
+    BLOCK_BUCKETS,
+    TREND_POINTS,
+    AggregateCache,
+    block_starts,
+    bucket_range,
+    split_blocks,
+)
+
+import atexit
+import threading
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# bucketed trends of this process
+cache = AggregateCache()
+# device pk -> (connection configuration, HistoryClient)
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def _configuration(device):
+    """
+    connection settings of a device, a change replaces its history client
+    """
+    opcuadevice = device.opcuadevice
+    return (
+        opcuadevice.protocol,
+        opcuadevice.IP_address,
+        opcuadevice.port,
+        opcuadevice.path,
+        opcuadevice.user,
+        opcuadevice.password,
+        opcuadevice.redundancy,
+        opcuadevice.service_level_threshold,
+        tuple(
+            opcuadevice.opcuaredundantserver_set.values_list(
+                "IP_address", "port", "path", "priority"
+            )
+        ),
+    )
+
+
+def get_client(device):
+    """
+    history client of a device for this process, replaced when the connection
+    settings of the device changed
+    """
+    # imported here, asyncua is only needed to read the history
+    from pyscada.opcua.devices import device_session_set
+    from pyscada.opcua.devices.history import HistoryClient
+
+    configuration = _configuration(device)
+    with _clients_lock:
+        previous = _clients.get(device.pk)
+        if previous is not None and previous[0] == configuration:
+            return previous[1]
+        client = HistoryClient(
+            # a single session, the standbys are only tried when it fails
+            device_session_set(device.opcuadevice, hot_standby=False),
+            f"pyscada.opcua-history-{device.pk}",
+        )
+        _clients[device.pk] = (configuration, client)
+    if previous is not None:
+        previous[1].close()
+    return client
+
+
+def close_clients():
+    with _clients_lock:
+        clients = [client for _, client in _clients.values()]
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+atexit.register(close_clients)
+
+
+def read_trend(variable_ids, start, end, points=TREND_POINTS, aggregate="average"):
+    """
+    (interval, {variable_id: [(timestamp, value), ...]}) of the historized
+    variables among variable_ids from start to end in at most points buckets,
+    the other variables are left out
+
+    The buckets are cached in aligned blocks, only the blocks missing for a
+    device are read from its server, in one HistoryRead over their range.
+    """
+    start, end, interval = bucket_range(start, end, points)
+    starts = block_starts(start, end, interval)
+    variables = Variable.objects.filter(
+        pk__in=variable_ids,
+        device__protocol_id=PROTOCOL_ID,
+        opcuavariable__historized=True,
+    ).select_related("opcuavariable", "scaling", "device__opcuadevice")
+    blocks = {}
+    missing = {}
+    for variable in variables:
+        blocks[variable.pk] = {}
+        for block in starts:
+            values = cache.get((variable.pk, aggregate, interval, block))
+            if values is None:
+                missing.setdefault(variable.device_id, {}).setdefault(
+                    variable, []
+                ).append(block)
+            else:
+                blocks[variable.pk][block] = values
+    for device_missing in missing.values():
+        device_variables = list(device_missing)
+        device = device_variables[0].device
+        first = min(min(b) for b in device_missing.values())
+        last = max(max(b) for b in device_missing.values())
+        try:
+            data = get_client(device).read_processed(
+                device_variables,
+                first,
+                last + interval * BLOCK_BUCKETS,
+                interval,
+                aggregate,
+            )
+        except Exception as e:
+            logger.info(f"{device} history read failed : {e}")
+            data = {}
+        for variable in device_variables:
+            if variable.pk not in data:
+                # left out, a partial trend would look like missing data
+                blocks.pop(variable.pk, None)
+                continue
+            read = split_blocks(data[variable.pk], interval)
+            for block in starts:
+                if first <= block <= last:
+                    values = read.get(block, [])
+                    cache.put((variable.pk, aggregate, interval, block), values)
+                    blocks[variable.pk][block] = values
+    result = {}
+    for variable_id, variable_blocks in blocks.items():
+        result[variable_id] = [
+            (timestamp, value)
+            for block in starts
+            for timestamp, value in variable_blocks.get(block, [])
+            if start <= timestamp < end
+        ]
+    return interval, result
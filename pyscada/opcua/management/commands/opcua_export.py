@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device
+from pyscada.opcua import PROTOCOL_ID
+from pyscada.opcua.exchange import export_device, write_file
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Export the OPC-UA variables, method arguments and optionally the browsed "
+        "address space of a device to a compressed columnar file"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_id", type=int)
+        parser.add_argument("file", type=str)
+        parser.add_argument(
+            "--browse",
+            action="store_true",
+            help="connect to the server and include its browsed nodes",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            device = Device.objects.get(
+                pk=options["device_id"], protocol_id=PROTOCOL_ID
+            )
+        except Device.DoesNotExist:
+            raise CommandError(f"OPC-UA device {options['device_id']} not found")
+
+        nodes = None
+        if options["browse"]:
+            # imported here, asyncua is only needed to browse
+            from pyscada.opcua.devices import GenericDevice
+
+            handler = GenericDevice(device, {})
+            try:
+                nodes = handler.browse()
+            finally:
+                handler.close()
+            if not len(nodes):
+                raise CommandError(f"Browsing {device} failed")
+
+        data = export_device(device, nodes)
+        write_file(options["file"], data)
+        self.stdout.write(
+            f"Exported {len(data['variables']['name'])} variables, "
+            f"{len(data['arguments']['variable'])} method arguments"
+            + (f" and {len(data['nodes']['ns'])} nodes" if nodes is not None else "")
+            + f" of {device} to {options['file']}"
+        )
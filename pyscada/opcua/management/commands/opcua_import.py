@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device
+from pyscada.opcua import PROTOCOL_ID
+from pyscada.opcua.exchange import import_device, nodes_to_variables, read_file
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.signals import post_save
+
+
+class Command(BaseCommand):
+    help = (
+        "Import OPC-UA variables and method arguments of a device from a file "
+        "written by opcua_export, in a single transaction"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_id", type=int)
+        parser.add_argument("file", type=str)
+        parser.add_argument(
+            "--nodes",
+            action="store_true",
+            help="also create an inactive variable for every browsed Variable "
+            "node that is not mapped yet",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            device = Device.objects.get(
+                pk=options["device_id"], protocol_id=PROTOCOL_ID
+            )
+        except Device.DoesNotExist:
+            raise CommandError(f"OPC-UA device {options['device_id']} not found")
+
+        try:
+            data = read_file(options["file"])
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        if options["nodes"]:
+            nodes_to_variables(data)
+
+        try:
+            created, updated = import_device(device, data)
+        except ValueError as e:
+            raise CommandError(e)
+
+        # one reinit of the daq daemon for the whole import
+        post_save.send_robust(sender=Device, instance=device)
+        self.stdout.write(
+            f"Imported {options['file']} to {device} : "
+            f"{created} variables created, {updated} updated"
+        )
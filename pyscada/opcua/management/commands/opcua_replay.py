@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device
+from pyscada.opcua import PROTOCOL_ID
+from pyscada.opcua.core.profiling import TIMING
+from pyscada.opcua.core.traffic import TrafficReplay
+
+from django.core.management.base import BaseCommand, CommandError
+
+from time import perf_counter, sleep
+
+
+class Command(BaseCommand):
+    help = (
+        "Run read cycles of a device against OPC-UA traffic recorded with "
+        "record_traffic instead of the server and report their timing"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_id", type=int)
+        parser.add_argument("file", type=str)
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1.0,
+            help="scale of the recorded response times, 2 replays twice as fast, "
+            "0 without delay",
+        )
+        parser.add_argument("--cycles", type=int, default=100)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0.0,
+            help="seconds between the start of two cycles, back to back by default",
+        )
+
+    def handle(self, *args, **options):
+        if options["cycles"] < 1:
+            raise CommandError("--cycles must be at least 1")
+        try:
+            device = Device.objects.select_related("opcuadevice").get(
+                pk=options["device_id"], protocol_id=PROTOCOL_ID
+            )
+        except Device.DoesNotExist:
+            raise CommandError(f"OPC-UA device {options['device_id']} not found")
+        try:
+            replay = TrafficReplay.load(options["file"], options["speed"])
+        except (OSError, ValueError) as e:
+            raise CommandError(e)
+        if not len(replay.exchanges):
+            raise CommandError(f"No exchange recorded in {options['file']}")
+
+        # imported here, asyncua is only needed to replay
+        from pyscada.opcua.devices import GenericDevice
+
+        variables = {
+            v.pk: v
+            for v in device.variable_set.filter(
+                active=1, opcuavariable__isnull=False
+            ).select_related("opcuavariable")
+        }
+        handler = GenericDevice(device, variables)
+        handler.use_traffic_replay(replay)
+        handler.profiler.configure(TIMING)
+        durations = []
+        try:
+            for _ in range(options["cycles"]):
+                start = perf_counter()
+                handler.read_data_all(variables)
+                durations.append(perf_counter() - start)
+                if options["interval"] > durations[-1]:
+                    sleep(options["interval"] - durations[-1])
+        finally:
+            handler.close()
+
+        durations.sort()
+        self.stdout.write(
+            f"{len(durations)} cycles of {len(variables)} variables : "
+            f"mean {sum(durations) / len(durations) * 1000:.1f}ms, "
+            f"median {durations[len(durations) // 2] * 1000:.1f}ms, "
+            f"p95 {durations[int(len(durations) * 0.95)] * 1000:.1f}ms, "
+            f"max {durations[-1] * 1000:.1f}ms"
+        )
+        for kind, phases in handler.profiler.breakdown().items():
+            self.stdout.write(
+                f"{kind} : "
+                + ", ".join(
+                    f"{name} {mean * 1000:.1f}ms"
+                    for name, (count, mean, maximum) in phases.items()
+                )
+            )
+        self.stdout.write(", ".join(f"{k} {v}" for k, v in replay.statistics().items()))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.models import Device
+from pyscada.opcua import PROTOCOL_ID
+from pyscada.opcua.simulation import SimulatedServer, device_variables
+
+from django.core.management.base import BaseCommand, CommandError
+
+import asyncio
+
+
+class Command(BaseCommand):
+    help = (
+        "Start local OPC-UA servers exposing the configured nodes and methods of "
+        "devices with synthetic values"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_ids", type=int, nargs="+")
+        parser.add_argument(
+            "--host",
+            type=str,
+            default="127.0.0.1",
+            help="address to listen on, the device address is not used",
+        )
+        parser.add_argument(
+            "--port",
+            type=int,
+            default=None,
+            help="port of the first device, the next devices use the following "
+            "ports, default to the configured port of each device",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1.0,
+            help="seconds between two value updates",
+        )
+        parser.add_argument(
+            "--change-rate",
+            type=float,
+            default=0.1,
+            help="share of the variables getting a new value at each update (0-1)",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=None,
+            help="stop after this many seconds, run until interrupted otherwise",
+        )
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        servers = []
+        for index, device_id in enumerate(options["device_ids"]):
+            try:
+                device = Device.objects.select_related("opcuadevice").get(
+                    pk=device_id, protocol_id=PROTOCOL_ID
+                )
+            except Device.DoesNotExist:
+                raise CommandError(f"OPC-UA device {device_id} not found")
+            port = (
+                device.opcuadevice.port
+                if options["port"] is None
+                else options["port"] + index
+            )
+            url = f"opc.tcp://{options['host']}:{port}{device.opcuadevice.path}"
+            variables = device_variables(device)
+            servers.append(
+                SimulatedServer(
+                    url,
+                    variables,
+                    interval=options["interval"],
+                    change_rate=options["change_rate"],
+                    seed=options["seed"],
+                )
+            )
+            self.stdout.write(f"{device} : {len(variables)} variables on {url}")
+
+        async def run():
+            await asyncio.gather(*[s.run(options["duration"]) for s in servers])
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
+        self.stdout.write(
+            f"Stopped after {sum(s.updates for s in servers)} value updates"
+        )
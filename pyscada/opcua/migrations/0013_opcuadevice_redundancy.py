@@ -0,0 +1,71 @@
+# Generated by Django 5.1.3 on 2026-10-19 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0012_alter_opcuadevice_password_alter_opcuadevice_user"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="redundancy",
+            field=models.PositiveSmallIntegerField(
+                choices=[(0, "None"), (1, "Hot standby")],
+                default=0,
+                help_text="Hot standby: keep a session open on every redundant server and switch reads and writes to the healthiest one",
+            ),
+        ),
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="service_level_threshold",
+            field=models.PositiveSmallIntegerField(
+                default=200,
+                help_text="Switch to a standby server when the ServiceLevel of the active server drops below this value (0-255)",
+            ),
+        ),
+        migrations.CreateModel(
+            name="OPCUARedundantServer",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "IP_address",
+                    models.GenericIPAddressField(help_text="Example: 192.168.0.235"),
+                ),
+                ("port", models.PositiveSmallIntegerField(default=4840)),
+                (
+                    "path",
+                    models.CharField(
+                        default="/", help_text="Example: /hbk/clipx", max_length=254
+                    ),
+                ),
+                (
+                    "priority",
+                    models.PositiveSmallIntegerField(
+                        default=1,
+                        help_text="Servers with a lower value are preferred, the server of the device itself has priority 0",
+                    ),
+                ),
+                (
+                    "opcua_device",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="opcua.opcuadevice",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.3 on 2026-10-19 10:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pyscada", "0100_device_instrument_handler"),
+        ("opcua", "0013_opcuadevice_redundancy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OPCUAReadPlanUpdate",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("variable_id", models.PositiveIntegerField()),
+                (
+                    "device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="pyscada.device",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.3 on 2026-10-19 10:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0014_opcuareadplanupdate"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="bit",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="Read a single bit of an integer value, 0 is the least significant bit",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.1.3 on 2026-10-19 11:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0015_opcuavariable_bit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="method_call_concurrency",
+            field=models.PositiveSmallIntegerField(
+                default=4,
+                help_text="Maximum number of Call requests in flight for the methods read in one cycle",
+            ),
+        ),
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="method_call_timeout",
+            field=models.FloatField(
+                default=5.0, help_text="Deadline of a Call request in seconds"
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0016_opcuadevice_method_call"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="fast_decoding",
+            field=models.BooleanField(
+                default=False,
+                help_text="Decode the numeric values of Read responses directly into arrays, other values are still decoded by asyncua",
+            ),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.3 on 2026-10-19 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0017_opcuadevice_fast_decoding"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="quality",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                choices=[(0, "Good"), (1, "Uncertain"), (2, "Bad")],
+                db_index=True,
+                editable=False,
+                help_text="Quality of the last read, empty if never read",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="status_code",
+            field=models.PositiveBigIntegerField(
+                blank=True,
+                editable=False,
+                help_text="OPC-UA StatusCode of the last read",
+                null=True,
+            ),
+        ),
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="status_time",
+            field=models.DateTimeField(
+                blank=True,
+                editable=False,
+                help_text="Time the StatusCode was first received",
+                null=True,
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0018_opcuavariable_status"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="verify_writes",
+            field=models.BooleanField(
+                default=False,
+                help_text="Read the written nodes back and only confirm a write if the server applied the value",
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.3 on 2026-10-19 15:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0019_opcuadevice_verify_writes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="profiling",
+            field=models.PositiveSmallIntegerField(
+                choices=[(0, "Off"), (1, "Phase timing"), (2, "cProfile")],
+                default=0,
+                help_text="Phase timing: log the time spent connecting, reading, converting and persisting. cProfile: also dump the profile of sampled cycles. Applied by the running worker within 10 seconds",
+            ),
+        ),
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="profiling_sample",
+            field=models.PositiveSmallIntegerField(
+                default=10, help_text="Run one cycle out of this many under cProfile"
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0020_opcuadevice_profiling"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="namespace_uri",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Namespace URI, when set the NamespaceIndex is looked up in the NamespaceArray of the server at each connection",
+                max_length=254,
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1.3 on 2026-10-19 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0021_opcuavariable_namespace_uri"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="browse_path",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text='Browse path from the root folder, like "Objects/2:PLC1/DB10/Temperature", used instead of the Identifier. Names without index are in the namespace of the NamespaceIndex',
+                max_length=1000,
+            ),
+        ),
+    ]
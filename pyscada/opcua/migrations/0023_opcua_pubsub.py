@@ -0,0 +1,101 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0022_opcuavariable_browse_path"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="pubsub_url",
+            field=models.CharField(
+                blank=True,
+                default="",
+                help_text="Example: opc.udp://239.0.0.1:4840<br>PubSub subscriber mode: receive the UADP DataSetMessages sent to this address instead of polling the server, the variables are mapped by DataSetReader",
+                max_length=254,
+            ),
+        ),
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="pubsub_interface",
+            field=models.GenericIPAddressField(
+                blank=True,
+                help_text="Address of the local interface joining the multicast group, default to any",
+                null=True,
+            ),
+        ),
+        migrations.CreateModel(
+            name="OPCUADataSetReader",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=254)),
+                (
+                    "publisher_id",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        help_text="PublisherId of the messages, empty for any",
+                        max_length=254,
+                    ),
+                ),
+                (
+                    "writer_group_id",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="WriterGroupId of the messages, empty for any",
+                        null=True,
+                    ),
+                ),
+                (
+                    "dataset_writer_id",
+                    models.PositiveIntegerField(
+                        blank=True,
+                        help_text="DataSetWriterId of the messages, empty for any",
+                        null=True,
+                    ),
+                ),
+                (
+                    "opcua_device",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="opcua.opcuadevice",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="dataset_reader",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="PubSub subscriber mode: DataSetReader receiving the variable",
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="opcua.opcuadatasetreader",
+            ),
+        ),
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="dataset_field",
+            field=models.PositiveSmallIntegerField(
+                blank=True,
+                help_text="Position of the variable in the fields of the DataSet, RawData DataSets need all their fields mapped",
+                null=True,
+            ),
+        ),
+    ]
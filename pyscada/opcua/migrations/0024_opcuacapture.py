@@ -0,0 +1,143 @@
+# Generated by Django 5.1.3 on 2026-10-19 17:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("pyscada", "0001_initial"),
+        ("opcua", "0023_opcua_pubsub"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="OPCUACapture",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=254)),
+                (
+                    "sampling_interval",
+                    models.FloatField(
+                        default=0,
+                        help_text="Requested sampling interval in milliseconds, 0 for the fastest rate the server supports",
+                    ),
+                ),
+                (
+                    "duration",
+                    models.FloatField(default=10.0, help_text="Length in seconds"),
+                ),
+                (
+                    "max_samples",
+                    models.PositiveIntegerField(
+                        default=1000000,
+                        help_text="Size of the file in samples per variable",
+                    ),
+                ),
+                (
+                    "trigger",
+                    models.PositiveSmallIntegerField(
+                        choices=[(0, "Manual"), (1, "Variable condition")], default=0
+                    ),
+                ),
+                (
+                    "trigger_condition",
+                    models.CharField(
+                        choices=[
+                            (">", ">"),
+                            (">=", ">="),
+                            ("<", "<"),
+                            ("<=", "<="),
+                            ("==", "=="),
+                            ("!=", "!="),
+                            ("rising", "rising"),
+                            ("falling", "falling"),
+                        ],
+                        default=">",
+                        max_length=10,
+                    ),
+                ),
+                ("trigger_value", models.FloatField(default=0)),
+                (
+                    "import_interval",
+                    models.FloatField(
+                        default=1.0,
+                        help_text="Downsampling interval in seconds of the import into the recorded data",
+                    ),
+                ),
+                (
+                    "state",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (0, "Idle"),
+                            (1, "Armed"),
+                            (2, "Recording"),
+                            (3, "Stopping"),
+                            (4, "Done"),
+                            (5, "Failed"),
+                        ],
+                        default=0,
+                        editable=False,
+                    ),
+                ),
+                (
+                    "file",
+                    models.CharField(
+                        blank=True, default="", editable=False, max_length=1000
+                    ),
+                ),
+                (
+                    "samples",
+                    models.PositiveBigIntegerField(default=0, editable=False),
+                ),
+                (
+                    "started",
+                    models.DateTimeField(blank=True, editable=False, null=True),
+                ),
+                (
+                    "finished",
+                    models.DateTimeField(blank=True, editable=False, null=True),
+                ),
+                (
+                    "message",
+                    models.CharField(
+                        blank=True, default="", editable=False, max_length=254
+                    ),
+                ),
+                (
+                    "opcua_device",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="opcua.opcuadevice",
+                    ),
+                ),
+                (
+                    "trigger_variable",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Variable of the device polled for the trigger condition",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="pyscada.variable",
+                    ),
+                ),
+                (
+                    "variables",
+                    models.ManyToManyField(
+                        help_text="Variables of the device to record",
+                        related_name="opcua_captures",
+                        to="pyscada.variable",
+                    ),
+                ),
+            ],
+        ),
+    ]
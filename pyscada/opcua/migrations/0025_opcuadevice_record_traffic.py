@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0024_opcuacapture"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuadevice",
+            name="record_traffic",
+            field=models.BooleanField(
+                default=False,
+                help_text="Record the requests, responses and response times of the sessions to a file for replay with the opcua_replay command. Applied by the running worker within 10 seconds",
+            ),
+        ),
+    ]
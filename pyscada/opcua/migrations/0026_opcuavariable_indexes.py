@@ -0,0 +1,33 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0025_opcuadevice_record_traffic"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="opcuavariable",
+            index=models.Index(
+                fields=["NamespaceIndex", "Identifier"], name="opcua_nodeid_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="opcuavariable",
+            index=models.Index(
+                fields=["namespace_uri"], name="opcua_namespace_uri_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="opcuavariable",
+            index=models.Index(
+                condition=models.Q(("browse_path", ""), _negated=True),
+                fields=["browse_path"],
+                name="opcua_browse_path_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.3 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("opcua", "0026_opcuavariable_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="opcuavariable",
+            name="historized",
+            field=models.BooleanField(
+                default=False,
+                help_text="The server keeps the history of the variable, trends are answered with the HistoryReadProcessed aggregates of the server",
+            ),
+        ),
+    ]
@@ -4,8 +4,9 @@ from __future__ import unicode_literals
 from pyscada.models import Device, DeviceHandler
 from pyscada.models import Variable
 from . import PROTOCOL_ID
-
-import asyncua
+from .core.capture import CONDITIONS
+from .core.health import BAD, GOOD, QUALITY_CHOICES, UNCERTAIN
+from .core.profiling import MODE_CHOICES
 
 from django.db import models
 from django.forms.models import BaseInlineFormSet
@@ -41,7 +42,71 @@ class OPCUADevice(models.Model):
         "refresh the page until you see the result",
     )
 
+    redundancy_choices = ((0, "None"), (1, "Hot standby"))
+    redundancy = models.PositiveSmallIntegerField(
+        default=0,
+        choices=redundancy_choices,
+        help_text="Hot standby: keep a session open on every redundant server "
+        "and switch reads and writes to the healthiest one",
+    )
+    service_level_threshold = models.PositiveSmallIntegerField(
+        default=200,
+        help_text="Switch to a standby server when the ServiceLevel "
+        "of the active server drops below this value (0-255)",
+    )
+    method_call_concurrency = models.PositiveSmallIntegerField(
+        default=4,
+        help_text="Maximum number of Call requests in flight "
+        "for the methods read in one cycle",
+    )
+    method_call_timeout = models.FloatField(
+        default=5.0, help_text="Deadline of a Call request in seconds"
+    )
+    fast_decoding = models.BooleanField(
+        default=False,
+        help_text="Decode the numeric values of Read responses directly into "
+        "arrays, other values are still decoded by asyncua",
+    )
+    verify_writes = models.BooleanField(
+        default=False,
+        help_text="Read the written nodes back and only confirm a write "
+        "if the server applied the value",
+    )
+    profiling = models.PositiveSmallIntegerField(
+        default=0,
+        choices=MODE_CHOICES,
+        help_text="Phase timing: log the time spent connecting, reading, "
+        "converting and persisting. cProfile: also dump the profile of "
+        "sampled cycles. Applied by the running worker within 10 seconds",
+    )
+    profiling_sample = models.PositiveSmallIntegerField(
+        default=10, help_text="Run one cycle out of this many under cProfile"
+    )
+    record_traffic = models.BooleanField(
+        default=False,
+        help_text="Record the requests, responses and response times of the "
+        "sessions to a file for replay with the opcua_replay command. "
+        "Applied by the running worker within 10 seconds",
+    )
+    pubsub_url = models.CharField(
+        default="",
+        max_length=254,
+        blank=True,
+        help_text="Example: opc.udp://239.0.0.1:4840<br>PubSub subscriber mode: "
+        "receive the UADP DataSetMessages sent to this address instead of "
+        "polling the server, the variables are mapped by DataSetReader",
+    )
+    pubsub_interface = models.GenericIPAddressField(
+        null=True,
+        blank=True,
+        help_text="Address of the local interface joining the multicast group, "
+        "default to any",
+    )
+
     protocol_id = PROTOCOL_ID
+    # fields applied by the running worker, changing only them does not
+    # restart it
+    runtime_fields = ("profiling", "profiling_sample", "record_traffic")
 
     def parent_device(self):
         try:
@@ -59,6 +124,137 @@ class OPCUADevice(models.Model):
             form.fields["remote_devices_objects"].disabled = True
 
 
+class OPCUARedundantServer(models.Model):
+    opcua_device = models.ForeignKey(
+        OPCUADevice, null=True, blank=True, on_delete=models.CASCADE
+    )
+    IP_address = models.GenericIPAddressField(help_text="Example: 192.168.0.235")
+    port = models.PositiveSmallIntegerField(default=4840)
+    path = models.CharField(
+        default="/", max_length=254, help_text="Example: /hbk/clipx"
+    )
+    priority = models.PositiveSmallIntegerField(
+        default=1,
+        help_text="Servers with a lower value are preferred, "
+        "the server of the device itself has priority 0",
+    )
+
+    def __str__(self):
+        return f"{self.opcua_device} - {self.IP_address}:{self.port}{self.path}"
+
+
+class OPCUADataSetReader(models.Model):
+    opcua_device = models.ForeignKey(
+        OPCUADevice, null=True, blank=True, on_delete=models.CASCADE
+    )
+    name = models.CharField(max_length=254)
+    publisher_id = models.CharField(
+        default="",
+        max_length=254,
+        blank=True,
+        help_text="PublisherId of the messages, empty for any",
+    )
+    writer_group_id = models.PositiveIntegerField(
+        null=True, blank=True, help_text="WriterGroupId of the messages, empty for any"
+    )
+    dataset_writer_id = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="DataSetWriterId of the messages, empty for any",
+    )
+
+    def __str__(self):
+        return f"{self.opcua_device} - {self.name}"
+
+
+class OPCUACapture(models.Model):
+    """
+    Burst capture of selected variables of a device into a memory-mapped file
+    """
+
+    IDLE = 0
+    ARMED = 1
+    RECORDING = 2
+    STOPPING = 3
+    DONE = 4
+    FAILED = 5
+    state_choices = (
+        (IDLE, "Idle"),
+        (ARMED, "Armed"),
+        (RECORDING, "Recording"),
+        (STOPPING, "Stopping"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    )
+    MANUAL = 0
+    CONDITION = 1
+    trigger_choices = ((MANUAL, "Manual"), (CONDITION, "Variable condition"))
+    condition_choices = tuple((c, c) for c in CONDITIONS)
+
+    opcua_device = models.ForeignKey(OPCUADevice, on_delete=models.CASCADE)
+    name = models.CharField(max_length=254)
+    variables = models.ManyToManyField(
+        Variable,
+        related_name="opcua_captures",
+        help_text="Variables of the device to record",
+    )
+    sampling_interval = models.FloatField(
+        default=0,
+        help_text="Requested sampling interval in milliseconds, "
+        "0 for the fastest rate the server supports",
+    )
+    duration = models.FloatField(default=10.0, help_text="Length in seconds")
+    max_samples = models.PositiveIntegerField(
+        default=1000000, help_text="Size of the file in samples per variable"
+    )
+    trigger = models.PositiveSmallIntegerField(default=MANUAL, choices=trigger_choices)
+    trigger_variable = models.ForeignKey(
+        Variable,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="+",
+        help_text="Variable of the device polled for the trigger condition",
+    )
+    trigger_condition = models.CharField(
+        default=">", max_length=10, choices=condition_choices
+    )
+    trigger_value = models.FloatField(default=0)
+    import_interval = models.FloatField(
+        default=1.0,
+        help_text="Downsampling interval in seconds of the import into the "
+        "recorded data",
+    )
+    state = models.PositiveSmallIntegerField(
+        default=IDLE, choices=state_choices, editable=False
+    )
+    file = models.CharField(default="", max_length=1000, blank=True, editable=False)
+    samples = models.PositiveBigIntegerField(default=0, editable=False)
+    started = models.DateTimeField(null=True, blank=True, editable=False)
+    finished = models.DateTimeField(null=True, blank=True, editable=False)
+    message = models.CharField(default="", max_length=254, blank=True, editable=False)
+
+    def __str__(self):
+        return f"{self.opcua_device} - {self.name}"
+
+
+class OPCUAVariableQuerySet(models.QuerySet):
+    def good(self):
+        return self.filter(quality=GOOD)
+
+    def uncertain(self):
+        return self.filter(quality=UNCERTAIN)
+
+    def bad(self):
+        return self.filter(quality=BAD)
+
+    def not_good(self):
+        return self.filter(quality__in=(UNCERTAIN, BAD))
+
+    def with_variable(self):
+        return self.select_related("opcua_variable__device")
+
+
 class OPCUAVariable(models.Model):
     opcua_variable = models.OneToOneField(
         Variable, null=True, blank=True, on_delete=models.CASCADE
@@ -66,12 +262,98 @@ class OPCUAVariable(models.Model):
     NamespaceIndex = models.PositiveSmallIntegerField(
         default=0, help_text='"ns" value used in asyncua library'
     )
+    namespace_uri = models.CharField(
+        max_length=254,
+        blank=True,
+        default="",
+        help_text="Namespace URI, when set the NamespaceIndex is looked up in "
+        "the NamespaceArray of the server at each connection",
+    )
+    browse_path = models.CharField(
+        max_length=1000,
+        blank=True,
+        default="",
+        help_text="Browse path from the root folder, like "
+        '"Objects/2:PLC1/DB10/Temperature", used instead of the Identifier. '
+        "Names without index are in the namespace of the NamespaceIndex",
+    )
     Identifier = models.PositiveSmallIntegerField(
         default=0, help_text='"i" value used in asyncua library'
     )
+    historized = models.BooleanField(
+        default=False,
+        help_text="The server keeps the history of the variable, trends are "
+        "answered with the HistoryReadProcessed aggregates of the server",
+    )
+    dataset_reader = models.ForeignKey(
+        OPCUADataSetReader,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        help_text="PubSub subscriber mode: DataSetReader receiving the variable",
+    )
+    dataset_field = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text="Position of the variable in the fields of the DataSet, "
+        "RawData DataSets need all their fields mapped",
+    )
+    bit = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text="Read a single bit of an integer value, 0 is the least "
+        "significant bit",
+    )
+    quality = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        db_index=True,
+        choices=QUALITY_CHOICES,
+        editable=False,
+        help_text="Quality of the last read, empty if never read",
+    )
+    status_code = models.PositiveBigIntegerField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="OPC-UA StatusCode of the last read",
+    )
+    status_time = models.DateTimeField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Time the StatusCode was first received",
+    )
+
+    objects = OPCUAVariableQuerySet.as_manager()
 
     protocol_id = PROTOCOL_ID
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["NamespaceIndex", "Identifier"], name="opcua_nodeid_idx"
+            ),
+            models.Index(fields=["namespace_uri"], name="opcua_namespace_uri_idx"),
+            # partial, so not created on MySQL whose keys are too short for
+            # the paths, pattern ops for the prefix search on PostgreSQL
+            models.Index(
+                fields=["browse_path"],
+                name="opcua_browse_path_idx",
+                condition=~models.Q(browse_path=""),
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
+    def status_name(self):
+        if self.status_code is None:
+            return None
+        try:
+            from asyncua.ua.status_codes import get_name_and_doc
+        except ImportError:
+            return f"{self.status_code:#010x}"
+        return get_name_and_doc(self.status_code)[0]
+
     def __str__(self):
         return self.id.__str__() + "-" + self.opcua_variable.name
 
@@ -94,6 +376,19 @@ class OPCUAMethodArgument(models.Model):
     )
 
 
+class OPCUAReadPlanUpdate(models.Model):
+    """
+    Variable changes queued by the signals for the read plan of the device worker
+    """
+
+    device = models.ForeignKey(Device, on_delete=models.CASCADE)
+    # no foreign key, deleted variables have to be removed from the plan too
+    variable_id = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.device} - {self.variable_id}"
+
+
 class ExtendedOPCUADevice(Device):
     class Meta:
         proxy = True
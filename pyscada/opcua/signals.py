@@ -5,35 +5,203 @@ from pyscada.models import Device, Variable
 from pyscada.opcua.models import (
     OPCUADevice,
     OPCUAVariable,
+    OPCUAMethodArgument,
+    OPCUARedundantServer,
+    OPCUADataSetReader,
+    OPCUAReadPlanUpdate,
     ExtendedOPCUAVariable,
     ExtendedOPCUADevice,
 )
 
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+
+import atexit
+import threading
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# seconds during which the changes are collected before the daq daemons are
+# notified, a bulk edit of many rows results in one notification per device
+COALESCE_WINDOW = 1.0
+# changed variables of a device above which its worker is restarted instead
+# of updating its read plan variable by variable
+PLAN_UPDATE_LIMIT = 1000
+
+_pending_devices = set()
+_pending_variables = {}
+_pending_lock = threading.Lock()
+_flush_timer = None
+
+
+def request_reinit(device_id, variable_ids=None):
+    """
+    queue a daq update for a device once the current transaction is committed
+
+    Without variable_ids the device worker is restarted, otherwise only the
+    read plan entries of these variables are updated by the running worker.
+    """
+    if device_id is None:
+        return
+    if variable_ids is not None:
+        variable_ids = set(variable_ids)
+    transaction.on_commit(lambda: _enqueue(device_id, variable_ids))
+
+
+def request_bulk_reinit(rows, restart=False):
+    """
+    queue the daq update of variables changed by a bulk UPDATE, which fires
+    no signal, from their (variable_id, device_id) rows
+
+    The devices are restarted with restart or if more than PLAN_UPDATE_LIMIT
+    of their variables changed.
+    """
+    devices = {}
+    for variable_id, device_id in rows:
+        devices.setdefault(device_id, set()).add(variable_id)
+    for device_id, variable_ids in devices.items():
+        if restart or len(variable_ids) > PLAN_UPDATE_LIMIT:
+            request_reinit(device_id)
+        else:
+            request_reinit(device_id, variable_ids)
+
+
+def _enqueue(device_id, variable_ids):
+    global _flush_timer
+    with _pending_lock:
+        if variable_ids is None:
+            _pending_devices.add(device_id)
+        else:
+            _pending_variables.setdefault(device_id, set()).update(variable_ids)
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(COALESCE_WINDOW, flush)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+
+
+def flush():
+    """
+    restart the workers of the changed devices and queue the variable updates
+    """
+    global _flush_timer
+    with _pending_lock:
+        if _flush_timer is not None:
+            if _flush_timer is not threading.current_thread():
+                _flush_timer.cancel()
+        _flush_timer = None
+        devices = set(_pending_devices)
+        variables = dict(_pending_variables)
+        _pending_devices.clear()
+        _pending_variables.clear()
+    if not len(devices) and not len(variables):
+        return
+
+    try:
+        for device in Device.objects.filter(pk__in=devices):
+            post_save.send_robust(sender=Device, instance=device)
+        OPCUAReadPlanUpdate.objects.bulk_create(
+            [
+                OPCUAReadPlanUpdate(device_id=device_id, variable_id=variable_id)
+                for device_id, variable_ids in variables.items()
+                if device_id not in devices
+                for variable_id in variable_ids
+            ]
+        )
+    except Exception as e:
+        logger.warning(f"OPC-UA daq reinit failed : {e}")
+    finally:
+        if threading.current_thread() is not threading.main_thread():
+            connection.close()
+
+
+# management commands exit before the timer expires
+atexit.register(flush)
+
+
+def _variable_device_id(variable_id):
+    return (
+        Variable.objects.filter(pk=variable_id)
+        .values_list("device_id", flat=True)
+        .first()
+    )
+
+
+@receiver(pre_save, sender=OPCUADevice)
+def _detect_runtime_changes(sender, instance, **kwargs):
+    """
+    flag a save that only changes fields applied by the running worker
+    """
+    instance._runtime_only = False
+    if instance.pk is None:
+        return
+    fields = [
+        f.attname
+        for f in OPCUADevice._meta.concrete_fields
+        if f.name not in OPCUADevice.runtime_fields
+    ]
+    previous = OPCUADevice.objects.filter(pk=instance.pk).values(*fields).first()
+    if previous is not None:
+        instance._runtime_only = all(
+            previous[name] == getattr(instance, name) for name in fields
+        )
+
+
+@receiver(pre_save, sender=ExtendedOPCUAVariable)
+def _detect_device_change(sender, instance, **kwargs):
+    """
+    remember the device of a variable before the save, a variable moved to
+    another device has to leave the read plan of the previous one
+    """
+    instance._previous_device_id = None
+    if instance.pk is not None:
+        instance._previous_device_id = _variable_device_id(instance.pk)
+
 
 @receiver(post_save, sender=OPCUADevice)
 @receiver(post_save, sender=OPCUAVariable)
+@receiver(post_save, sender=OPCUAMethodArgument)
+@receiver(post_save, sender=OPCUARedundantServer)
+@receiver(post_save, sender=OPCUADataSetReader)
 @receiver(post_save, sender=ExtendedOPCUAVariable)
 @receiver(post_save, sender=ExtendedOPCUADevice)
+@receiver(post_delete, sender=OPCUAVariable)
+@receiver(post_delete, sender=OPCUAMethodArgument)
+@receiver(post_delete, sender=OPCUARedundantServer)
+@receiver(post_delete, sender=OPCUADataSetReader)
 def _reinit_daq_daemons(sender, instance, **kwargs):
     """
     update the daq daemon configuration when changes be applied in the models
     """
     if type(instance) is OPCUADevice:
-        post_save.send_robust(sender=Device, instance=instance.opcua_device)
+        if not getattr(instance, "_runtime_only", False):
+            request_reinit(instance.opcua_device_id)
+    elif type(instance) in (OPCUARedundantServer, OPCUADataSetReader):
+        if instance.opcua_device_id is not None:
+            request_reinit(
+                OPCUADevice.objects.filter(pk=instance.opcua_device_id)
+                .values_list("opcua_device_id", flat=True)
+                .first()
+            )
     elif type(instance) is OPCUAVariable:
-        post_save.send_robust(sender=Variable, instance=instance.opcua_variable)
-    elif type(instance) is ExtendedOPCUAVariable:
-        post_save.send_robust(
-            sender=Variable, instance=Variable.objects.get(pk=instance.pk)
+        request_reinit(
+            _variable_device_id(instance.opcua_variable_id),
+            [instance.opcua_variable_id],
         )
-    elif type(instance) is ExtendedOPCUADevice:
-        post_save.send_robust(
-            sender=Device, instance=Device.objects.get(pk=instance.pk)
+    elif type(instance) is OPCUAMethodArgument:
+        variable_id = (
+            OPCUAVariable.objects.filter(pk=instance.opcua_method_id)
+            .values_list("opcua_variable_id", flat=True)
+            .first()
         )
+        if variable_id is not None:
+            request_reinit(_variable_device_id(variable_id), [variable_id])
+    elif type(instance) is ExtendedOPCUAVariable:
+        request_reinit(instance.device_id, [instance.pk])
+        previous = getattr(instance, "_previous_device_id", None)
+        if previous not in (None, instance.device_id):
+            request_reinit(previous, [instance.pk])
+    elif type(instance) is ExtendedOPCUADevice:
+        request_reinit(instance.pk)
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from .core.conversion import VALUE_CLASS_VARIANT_TYPE
+from .models import OPCUAMethodArgument, OPCUAVariable
+
+from collections import namedtuple
+from math import pi, sin
+from time import time
+import asyncio
+import random
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# namespace URI of the namespaces registered to reach the configured indexes
+NAMESPACE_URI = "urn:pyscada:opcua:simulation:%d"
+# string identifier of the folder holding the simulated nodes
+FOLDER_NAME = "PyScada"
+
+INTEGER_RANGES = {
+    "SByte": (-(2**7), 2**7 - 1),
+    "Byte": (0, 2**8 - 1),
+    "Int16": (-(2**15), 2**15 - 1),
+    "UInt16": (0, 2**16 - 1),
+    "Int32": (-(2**31), 2**31 - 1),
+    "UInt32": (0, 2**32 - 1),
+    "Int64": (-(2**63), 2**63 - 1),
+    "UInt64": (0, 2**64 - 1),
+}
+
+SimulatedVariable = namedtuple(
+    "SimulatedVariable",
+    ["variable_id", "name", "ns", "identifier", "variant", "method", "arguments"],
+)
+
+
+def variant_name(value_class):
+    """
+    VariantType name of a value class, unknown classes are simulated as Double
+    """
+    return VALUE_CLASS_VARIANT_TYPE.get(str(value_class).upper(), "Double")
+
+
+def argument_variant_name(argument, variable_variant):
+    """
+    VariantType name announced for a method argument, guessed from its value
+    when the DataType sent by the server is used
+    """
+    if argument[0] == 1:
+        return variable_variant
+    try:
+        int(argument[1])
+        return "Int32"
+    except ValueError:
+        pass
+    try:
+        float(argument[1])
+        return "Double"
+    except ValueError:
+        return "String"
+
+
+def device_variables(device):
+    """
+    SimulatedVariable of every active OPC-UA variable of a device, writeable
+    variables and variables with arguments are served as methods
+    """
+    arguments = {}
+    for arg in OPCUAMethodArgument.objects.filter(
+        opcua_method__opcua_variable__device=device
+    ).order_by("position"):
+        arguments.setdefault(arg.opcua_method_id, []).append((arg.data_type, arg.value))
+    result = []
+    for item in OPCUAVariable.objects.filter(
+        opcua_variable__device=device, opcua_variable__active=True
+    ).select_related("opcua_variable"):
+        variable = item.opcua_variable
+        args = arguments.get(item.pk, [])
+        result.append(
+            SimulatedVariable(
+                variable.pk,
+                variable.name,
+                item.NamespaceIndex,
+                item.Identifier,
+                variant_name(variable.value_class),
+                bool(variable.writeable or len(args)),
+                args,
+            )
+        )
+    return result
+
+
+class ValueGenerator:
+    """
+    Synthetic values of one variable: a sine with noise for floats, a random
+    walk for integers, toggling for booleans
+    """
+
+    def __init__(self, variant, rng):
+        self.variant = variant
+        self.rng = rng
+        self.period = rng.uniform(10, 600)
+        self.phase = rng.uniform(0, 2 * pi)
+        self.amplitude = rng.choice((1, 10, 100, 1000))
+        self.value = self.initial()
+
+    def initial(self):
+        if self.variant == "Boolean":
+            return False
+        if self.variant in INTEGER_RANGES:
+            low, high = INTEGER_RANGES[self.variant]
+            return max(low, min(high, 0))
+        return 0.0
+
+    def next(self, now):
+        if self.variant == "Boolean":
+            self.value = not self.value
+        elif self.variant in INTEGER_RANGES:
+            low, high = INTEGER_RANGES[self.variant]
+            step = self.rng.randint(-10, 10)
+            self.value = max(low, min(high, self.value + step))
+        else:
+            self.value = self.amplitude * sin(
+                2 * pi * now / self.period + self.phase
+            ) + self.rng.gauss(0, self.amplitude / 100)
+        return self.value
+
+
+class SimulatedServer:
+    """
+    asyncua Server exposing the configured nodes of a device with synthetic
+    values, change_rate is the share of the variables that gets a new value
+    every interval seconds
+    """
+
+    def __init__(self, url, variables, interval=1.0, change_rate=0.1, seed=None):
+        self.url = url
+        self.variables = variables
+        self.interval = interval
+        self.change_rate = max(0.0, min(1.0, change_rate))
+        self.rng = random.Random(seed)
+        self.server = None
+        self.nodes = {}
+        self.generators = {}
+        self.updates = 0
+
+    async def build(self):
+        from asyncua import Server, ua
+
+        server = Server()
+        await server.init()
+        server.set_endpoint(self.url)
+        server.set_server_name(f"PyScada simulation {self.url}")
+        namespaces = await server.get_namespace_array()
+        max_ns = max([v.ns for v in self.variables] + [1])
+        while len(namespaces) <= max_ns:
+            await server.register_namespace(NAMESPACE_URI % len(namespaces))
+            namespaces = await server.get_namespace_array()
+        folder = await server.nodes.objects.add_folder(
+            ua.NodeId(FOLDER_NAME, 1), ua.QualifiedName(FOLDER_NAME, 1)
+        )
+
+        for variable in self.variables:
+            nodeid = ua.NodeId(variable.identifier, variable.ns)
+            if nodeid in self.nodes or nodeid in server.iserver.aspace:
+                logger.warning(
+                    f"{variable.name} : node {nodeid.to_string()} "
+                    f"already exists, not simulated"
+                )
+                continue
+            generator = ValueGenerator(variable.variant, self.rng)
+            variant = getattr(ua.VariantType, variable.variant)
+            name = ua.QualifiedName(variable.name, variable.ns)
+            if variable.method:
+                method = await folder.add_method(
+                    nodeid, name, self._method(variable, generator, ua)
+                )
+                # the argument properties get string NodeIds, generated numeric
+                # ones could take the Identifier of a configured variable
+                for arguments, types in (
+                    (
+                        "InputArguments",
+                        [
+                            argument_variant_name(argument, variable.variant)
+                            for argument in variable.arguments
+                        ],
+                    ),
+                    ("OutputArguments", [variable.variant]),
+                ):
+                    if not len(types):
+                        continue
+                    await method.add_property(
+                        ua.NodeId(f"{variable.identifier}.{arguments}", variable.ns),
+                        ua.QualifiedName(arguments, 0),
+                        [
+                            ua.Argument(
+                                DataType=ua.NodeId(getattr(ua.VariantType, t).value)
+                            )
+                            for t in types
+                        ],
+                        varianttype=ua.VariantType.ExtensionObject,
+                        datatype=ua.ObjectIds.Argument,
+                    )
+            else:
+                node = await folder.add_variable(
+                    nodeid, name, generator.value, varianttype=variant
+                )
+                await node.set_writable()
+            # the value of a method is returned by the call, not written
+            self.nodes[nodeid] = None if variable.method else variant
+            self.generators[nodeid] = generator
+        self.server = server
+        return server
+
+    def _method(self, variable, generator, ua):
+        variant = getattr(ua.VariantType, variable.variant)
+        positions = [i for i, a in enumerate(variable.arguments) if a[0] == 1]
+
+        async def call(parent, *inputs):
+            # a value argument is a write, it becomes the current value
+            for position in positions:
+                if position < len(inputs):
+                    generator.value = inputs[position].Value
+            return [ua.Variant(generator.value, variant)]
+
+        return call
+
+    async def update(self):
+        """
+        give a new value to change_rate of the variables
+        """
+        from asyncua import ua
+
+        if not len(self.nodes):
+            return 0
+        count = int(round(len(self.nodes) * self.change_rate))
+        now = time()
+        for nodeid in self.rng.sample(list(self.nodes), count):
+            variant = self.nodes[nodeid]
+            value = self.generators[nodeid].next(now)
+            if variant is None:
+                continue
+            await self.server.write_attribute_value(
+                nodeid, ua.DataValue(ua.Variant(value, variant))
+            )
+        self.updates += count
+        return count
+
+    async def run(self, duration=None):
+        """
+        serve until cancelled or for duration seconds
+        """
+        if self.server is None:
+            await self.build()
+        async with self.server:
+            logger.info(f"Simulating {len(self.nodes)} nodes on {self.url}")
+            stop = None if duration is None else time() + duration
+            while stop is None or time() < stop:
+                started = time()
+                await self.update()
+                await asyncio.sleep(max(0.0, self.interval - (time() - started)))
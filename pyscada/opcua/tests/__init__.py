@@ -0,0 +1,5 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+# Unit tests of the Django-free protocol logic in pyscada.opcua.core, run
+# with "python -m unittest discover -s pyscada/opcua/tests -t ." or pytest.
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.opcua.core.capabilities import Capabilities, Tuner
+
+import unittest
+
+
+class CapabilitiesTest(unittest.TestCase):
+    def test_limit(self):
+        capabilities = Capabilities({"max_nodes_per_read": 50})
+        self.assertEqual(capabilities.limit("max_nodes_per_read", 100), 50)
+        self.assertEqual(capabilities.limit("max_nodes_per_read", 10), 10)
+        # 0 means no limit
+        self.assertEqual(capabilities.limit("max_nodes_per_write", 100), 100)
+
+    def test_min_interval(self):
+        capabilities = Capabilities({"min_supported_sample_rate": 250})
+        self.assertEqual(capabilities.min_interval, 0.25)
+        self.assertEqual(Capabilities().min_interval, 0.0)
+
+
+class TunerTest(unittest.TestCase):
+    def test_grows_on_fast_requests(self):
+        tuner = Tuner(100, 1000, step=10)
+        tuner.record(100, 0.01)
+        self.assertEqual(tuner.size, 110)
+
+    def test_partial_requests_do_not_grow(self):
+        tuner = Tuner(100, 1000, step=10)
+        tuner.record(40, 0.01)
+        self.assertEqual(tuner.size, 100)
+
+    def test_halves_on_failure(self):
+        tuner = Tuner(100, 1000)
+        self.assertEqual(tuner.record(100, 0.01, failed=True), 50)
+
+    def test_stays_within_bounds(self):
+        tuner = Tuner(100, 120, minimum=30, step=50)
+        tuner.record(100, 0.01)
+        self.assertEqual(tuner.size, 120)
+        for _ in range(5):
+            tuner.record(tuner.size, 0.01, failed=True)
+        self.assertEqual(tuner.size, 30)
+        tuner.set_limit(20)
+        self.assertEqual(tuner.limit, 30)
+        self.assertEqual(tuner.size, 30)
+
+    def test_round_trip_is_not_held_against_the_size(self):
+        # 0.8 s round trip, 1 ms per item
+        tuner = Tuner(100, 1000)
+        for _ in range(50):
+            tuner.record(tuner.size, 0.8 + tuner.size * 0.001)
+        self.assertGreater(tuner.size, 100)
+        self.assertAlmostEqual(tuner.baseline, 0.8, places=3)
+
+    def test_slow_items_shrink_the_size(self):
+        # 10 ms round trip, 10 ms per item, at most 50 items per 0.5 s
+        tuner = Tuner(100, 1000)
+        for _ in range(50):
+            tuner.record(tuner.size, 0.01 + tuner.size * 0.01)
+        self.assertLessEqual(tuner.size, 50)
+        self.assertAlmostEqual(tuner.baseline, 0.01, places=3)
+
+    def test_chunks(self):
+        tuner = Tuner(4)
+        self.assertEqual(
+            tuner.chunks(list(range(10))), [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]
+        )
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.opcua.core.capture import CaptureFile, condition_met
+
+import os
+import tempfile
+import unittest
+
+BAD_TIMEOUT = 0x800A0000
+
+
+class ConditionTest(unittest.TestCase):
+    def test_comparisons(self):
+        self.assertTrue(condition_met(">", 5, 4))
+        self.assertFalse(condition_met(">", 4, 4))
+        self.assertTrue(condition_met(">=", 4, 4))
+        self.assertTrue(condition_met("<", "3", 4))
+        self.assertTrue(condition_met("<=", 4, 4.0))
+        self.assertTrue(condition_met("==", True, 1))
+        self.assertTrue(condition_met("!=", 2, 1))
+
+    def test_edges(self):
+        self.assertTrue(condition_met("rising", 5, 4, previous=3))
+        self.assertFalse(condition_met("rising", 5, 4, previous=5))
+        self.assertFalse(condition_met("rising", 5, 4))
+        self.assertTrue(condition_met("falling", 3, 4, previous=4))
+        self.assertFalse(condition_met("falling", 3, 4, previous=2))
+
+    def test_invalid(self):
+        self.assertFalse(condition_met("~", 5, 4))
+        self.assertFalse(condition_met(">", None, 4))
+        self.assertFalse(condition_met(">", "on", 4))
+
+
+class CaptureFileTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.path = os.path.join(directory.name, "capture", "1.cap")
+
+    def test_append_and_open(self):
+        capture = CaptureFile.create(self.path, [10, 20], 3)
+        self.assertTrue(capture.append(0, 1.0, 1.5))
+        self.assertTrue(capture.append(0, 2.0, "x", BAD_TIMEOUT))
+        self.assertTrue(capture.append(1, 1.0, 7))
+        self.assertEqual(len(capture), 3)
+        capture.close()
+        self.assertTrue(capture.closed)
+
+        capture = CaptureFile.open(self.path)
+        self.addCleanup(capture.close)
+        self.assertEqual(capture.variable_ids, [10, 20])
+        self.assertEqual(capture.count(0), 2)
+        timestamps, values, status = capture.column(0)
+        self.assertEqual(list(timestamps), [1.0, 2.0])
+        self.assertEqual(values[0], 1.5)
+        # a value that is not a number is stored as NaN
+        self.assertNotEqual(values[1], values[1])
+        self.assertEqual(list(status), [0, BAD_TIMEOUT])
+        rows = list(capture.rows())
+        self.assertEqual(rows[-1], (20, 1.0, 7.0, 0))
+
+    def test_full(self):
+        capture = CaptureFile.create(self.path, [10], 2)
+        self.addCleanup(capture.close)
+        self.assertTrue(capture.append(0, 1.0, 1))
+        self.assertFalse(capture.full)
+        self.assertTrue(capture.append(0, 2.0, 2))
+        self.assertTrue(capture.full)
+        self.assertFalse(capture.append(0, 3.0, 3))
+        self.assertEqual(capture.count(0), 2)
+
+    def test_downsample(self):
+        capture = CaptureFile.create(self.path, [10], 10)
+        self.addCleanup(capture.close)
+        for timestamp, value, status in (
+            (0.0, 1.0, 0),
+            (0.5, 3.0, 0),
+            (0.7, 100.0, BAD_TIMEOUT),
+            (1.2, 5.0, 0),
+        ):
+            capture.append(0, timestamp, value, status)
+        self.assertEqual(capture.downsample(0, 1.0), [(0.0, 2.0), (1.0, 5.0)])
+        self.assertEqual(
+            capture.downsample(0, 1.0, lambda value: value * 10),
+            [(0.0, 20.0), (1.0, 50.0)],
+        )
+
+    def test_not_a_capture(self):
+        path = os.path.join(self.directory, "other.cap")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 64)
+        with self.assertRaises(ValueError):
+            CaptureFile.open(path)
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.opcua.core.columns import BAD_NO_COMMUNICATION
+from pyscada.opcua.core.health import BAD, GOOD, UNCERTAIN, HealthMap, quality
+from pyscada.opcua.core.plan import MethodCall, ReadPlan
+
+from types import SimpleNamespace
+import unittest
+
+BAD_TIMEOUT = 0x800A0000
+UNCERTAIN_INITIAL_VALUE = 0x40920000
+
+
+def make_plan(*variable_ids):
+    plan = ReadPlan()
+    for variable_id in variable_ids:
+        plan.add(SimpleNamespace(pk=variable_id), None)
+        plan.classify(variable_id)
+    return plan
+
+
+def make_columns(*status):
+    return SimpleNamespace(status=list(status))
+
+
+class QualityTest(unittest.TestCase):
+    def test_severity(self):
+        self.assertEqual(quality(0), GOOD)
+        self.assertEqual(quality(UNCERTAIN_INITIAL_VALUE), UNCERTAIN)
+        self.assertEqual(quality(BAD_TIMEOUT), BAD)
+        self.assertEqual(quality(0xC0000000), BAD)
+
+
+class HealthMapTest(unittest.TestCase):
+    def test_update_reports_changes_only(self):
+        health = HealthMap()
+        plan = make_plan(1, 2)
+        self.assertEqual(
+            health.update(plan, make_columns(0, BAD_TIMEOUT), 10.0),
+            [(1, 0), (2, BAD_TIMEOUT)],
+        )
+        self.assertEqual(health.update(plan, make_columns(0, BAD_TIMEOUT), 20.0), [])
+        self.assertEqual(health.update(plan, make_columns(0, 0), 30.0), [(2, 0)])
+        self.assertEqual(health.status(1), (0, 10.0))
+        self.assertEqual(health.status(2), (0, 30.0))
+        self.assertIsNone(health.status(3))
+
+    def test_removed_variables_are_forgotten(self):
+        health = HealthMap()
+        health.update(make_plan(1, 2, 3), make_columns(0, 0, 0), 10.0)
+        health.update(make_plan(1, 3), make_columns(0, 0), 20.0)
+        self.assertEqual(len(health), 2)
+        self.assertIsNone(health.status(2))
+
+    def test_write_only_methods_are_skipped(self):
+        health = HealthMap()
+        plan = make_plan(1)
+        plan.add(SimpleNamespace(pk=2), None)
+        plan.classify(2, MethodCall(None, None, None))
+        plan.add(SimpleNamespace(pk=3), None)
+        plan.classify(3, MethodCall(None, None, []))
+        changed = health.update(plan, make_columns(0, BAD_TIMEOUT, 0), 10.0)
+        self.assertEqual(changed, [(1, 0), (3, 0)])
+        self.assertIsNone(health.status(2))
+        self.assertEqual(health.bad(), {})
+        changed = health.disconnected(plan, 20.0)
+        self.assertEqual(
+            changed, [(1, BAD_NO_COMMUNICATION), (3, BAD_NO_COMMUNICATION)]
+        )
+        self.assertIsNone(health.status(2))
+
+    def test_select_and_summary(self):
+        health = HealthMap()
+        plan = make_plan(1, 2, 3)
+        health.update(plan, make_columns(0, UNCERTAIN_INITIAL_VALUE, BAD_TIMEOUT), 10.0)
+        self.assertEqual(health.bad(), {3: (BAD_TIMEOUT, 10.0)})
+        self.assertEqual(health.uncertain(), {2: (UNCERTAIN_INITIAL_VALUE, 10.0)})
+        self.assertEqual(health.summary(), {GOOD: 1, UNCERTAIN: 1, BAD: 1})
+
+    def test_set(self):
+        health = HealthMap()
+        self.assertTrue(health.set(1, BAD_TIMEOUT, 10.0))
+        self.assertFalse(health.set(1, BAD_TIMEOUT, 20.0))
+        self.assertEqual(health.status(1), (BAD_TIMEOUT, 10.0))
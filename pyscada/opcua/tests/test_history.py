@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.opcua.core import history
+from pyscada.opcua.core.history import (
+    BLOCK_BUCKETS,
+    AggregateCache,
+    block_starts,
+    bucket_range,
+    split_blocks,
+)
+
+from time import time
+from unittest import mock
+import unittest
+
+
+class BucketRangeTest(unittest.TestCase):
+    def test_smallest_interval_within_points(self):
+        self.assertEqual(bucket_range(0, 3600, 1000), (0, 3600, 5))
+        self.assertEqual(bucket_range(0, 3600, 60), (0, 3600, 60))
+
+    def test_aligned_to_the_interval(self):
+        self.assertEqual(bucket_range(7, 3593, 60), (0, 3600, 60))
+
+    def test_spans_beyond_the_largest_interval(self):
+        start, end, interval = bucket_range(0, 604800 * 50, 10)
+        self.assertEqual(interval % 604800, 0)
+        self.assertLessEqual((end - start) / interval, 10)
+
+    def test_empty_range(self):
+        start, end, interval = bucket_range(100, 100, 0)
+        self.assertEqual(interval, 1)
+        self.assertEqual((start, end), (100, 100))
+
+
+class BlockTest(unittest.TestCase):
+    def test_block_starts(self):
+        span = 10 * BLOCK_BUCKETS
+        self.assertEqual(block_starts(0, span, 10), [0])
+        self.assertEqual(block_starts(span - 10, span + 10, 10), [0, span])
+        self.assertEqual(block_starts(span, span, 10), [])
+
+    def test_split_blocks(self):
+        span = 10 * BLOCK_BUCKETS
+        values = [(0, 1.0), (span - 10, 2.0), (span, 3.0)]
+        self.assertEqual(
+            split_blocks(values, 10),
+            {0: [(0, 1.0), (span - 10, 2.0)], span: [(span, 3.0)]},
+        )
+
+
+class AggregateCacheTest(unittest.TestCase):
+    def test_closed_blocks_are_kept(self):
+        cache = AggregateCache()
+        key = (1, "average", 10, 0)
+        cache.put(key, [(0, 1.0)])
+        self.assertEqual(cache.get(key), [(0, 1.0)])
+        self.assertIsNone(cache.get((2, "average", 10, 0)))
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_growing_blocks_expire_after_an_interval(self):
+        cache = AggregateCache()
+        now = time()
+        span = 10 * BLOCK_BUCKETS
+        key = (1, "average", 10, now // span * span)
+        cache.put(key, [])
+        self.assertEqual(cache.get(key), [])
+        with mock.patch.object(history, "time", return_value=now + 11):
+            self.assertIsNone(cache.get(key))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_are_evicted(self):
+        cache = AggregateCache(max_size=2)
+        for variable_id in (1, 2):
+            cache.put((variable_id, "average", 10, 0), [])
+        cache.get((1, "average", 10, 0))
+        cache.put((3, "average", 10, 0), [])
+        self.assertIsNone(cache.get((2, "average", 10, 0)))
+        self.assertEqual(cache.get((1, "average", 10, 0)), [])
+        self.assertEqual(len(cache), 2)
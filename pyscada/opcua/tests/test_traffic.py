@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.opcua.core.traffic import TrafficRecorder, TrafficReplay, read_traffic
+
+import os
+import tempfile
+import unittest
+
+URL = "opc.tcp://plc:4840/"
+
+
+def exchange(service, key, response, url=URL, latency=0.1):
+    return {
+        "t": 0.0,
+        "url": url,
+        "service": service,
+        "key": key,
+        "latency": latency,
+        "response": response,
+        "error": None,
+        "code": None,
+    }
+
+
+class TrafficReplayTest(unittest.TestCase):
+    def setUp(self):
+        self.replay = TrafficReplay(
+            [
+                exchange("Read", b"a", b"1"),
+                exchange("Read", b"b", b"2"),
+                exchange("Read", b"a", b"3"),
+                exchange("Write", b"w", b"4"),
+            ]
+        )
+
+    def test_exact_matches_in_order(self):
+        self.assertEqual(self.replay.match(URL, "Read", b"a")["response"], b"1")
+        self.assertEqual(self.replay.match(URL, "Read", b"a")["response"], b"3")
+        self.assertEqual(self.replay.match(URL, "Read", b"b")["response"], b"2")
+        self.assertEqual(self.replay.matched, 3)
+
+    def test_other_body_gets_the_next_unused_response(self):
+        self.assertEqual(self.replay.match(URL, "Read", b"x")["response"], b"1")
+        self.assertEqual(self.replay.match(URL, "Read", b"a")["response"], b"3")
+        self.assertEqual(self.replay.match(URL, "Read", b"x")["response"], b"2")
+        self.assertEqual(self.replay.substituted, 2)
+
+    def test_last_match_is_repeated(self):
+        for _ in range(3):
+            self.replay.match(URL, "Read", b"x")
+        self.assertEqual(self.replay.match(URL, "Read", b"a")["response"], b"3")
+        self.assertEqual(self.replay.match(URL, "Read", b"x")["response"], b"3")
+        self.assertEqual(self.replay.repeated, 2)
+
+    def test_unknown_service(self):
+        self.assertIsNone(self.replay.match(URL, "Call", b"c"))
+        self.assertEqual(self.replay.missing, 1)
+
+    def test_other_url_replays_the_first_server(self):
+        self.assertEqual(self.replay.resolve_url("opc.tcp://other:4840/"), URL)
+        response = self.replay.match("opc.tcp://other:4840/", "Write", b"w")
+        self.assertEqual(response["response"], b"4")
+
+    def test_delay(self):
+        entry = exchange("Read", b"a", b"1", latency=0.2)
+        self.assertAlmostEqual(self.replay.delay(entry), 0.2)
+        self.assertEqual(TrafficReplay([], speed=0).delay(entry), 0.0)
+        self.assertAlmostEqual(TrafficReplay([], speed=2.0).delay(entry), 0.1)
+
+
+class TrafficFileTest(unittest.TestCase):
+    def test_record_and_read(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traffic", "1.jsonl.gz")
+            recorder = TrafficRecorder(path)
+            recorder.open()
+            recorder.record(URL, "Read", b"a", 0.0, 0.1, response=b"1")
+            recorder.record(URL, "Read", b"b", 0.0, 0.2, error="timeout")
+            recorder.close()
+            exchanges = read_traffic(path)
+        self.assertEqual(recorder.exchanges, 2)
+        self.assertEqual([e["key"] for e in exchanges], [b"a", b"b"])
+        self.assertEqual(exchanges[0]["response"], b"1")
+        self.assertIsNone(exchanges[1]["response"])
+        self.assertEqual(exchanges[1]["error"], "timeout")
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    path("json/opcua_history_data/", views.get_history_data),
+]
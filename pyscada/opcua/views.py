@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from pyscada.hmi.views import unauthenticated_redirect
+from pyscada.opcua.core.history import AGGREGATES, MAX_TREND_POINTS, TREND_POINTS
+from pyscada.opcua.history import read_trend
+
+from django.http import HttpResponse, HttpResponseBadRequest
+
+import json
+import time
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@unauthenticated_redirect
+def get_history_data(request):
+    """
+    server side aggregates of the historized OPC-UA variables, with the
+    parameters and the answer of json/cache_data/, plus the number of points
+    and the aggregate
+    """
+    try:
+        variable_ids = [int(i) for i in request.POST.getlist("variables[]")]
+        timestamp_from = float(request.POST.get("timestamp_from", 0)) / 1000.0
+        timestamp_to = float(request.POST.get("timestamp_to", 0)) / 1000.0
+        points = int(request.POST.get("points", TREND_POINTS))
+    except ValueError:
+        return HttpResponseBadRequest("invalid parameters")
+    points = max(1, min(points, MAX_TREND_POINTS))
+    aggregate = request.POST.get("aggregate", "average")
+    if aggregate not in AGGREGATES:
+        return HttpResponseBadRequest(f"unknown aggregate {aggregate}")
+    timestamp_to = min(timestamp_to or time.time(), time.time())
+    if timestamp_from == 0:
+        timestamp_from = timestamp_to - 60
+
+    interval, trends = read_trend(
+        variable_ids, timestamp_from, timestamp_to, points, aggregate
+    )
+    data = {
+        variable_id: [[timestamp * 1000, value] for timestamp, value in values]
+        for variable_id, values in trends.items()
+    }
+    data["interval"] = interval * 1000
+    data["server_time"] = time.time() * 1000
+    return HttpResponse(json.dumps(data), content_type="application/json")
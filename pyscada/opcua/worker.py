@@ -4,17 +4,366 @@
 from __future__ import unicode_literals
 
 from pyscada.utils.scheduler import SingleDeviceDAQProcessWorker
+from pyscada.utils.scheduler import SingleDeviceDAQProcess
+from pyscada.utils.scheduler import MultiDeviceDAQProcessWorker
+from pyscada.utils.scheduler import MultiDeviceDAQProcess
+from pyscada.models import BackgroundProcess, Device
 from pyscada.opcua import PROTOCOL_ID
+from pyscada.opcua.core.loop import EventLoopThread
+from pyscada.opcua.core.scheduler import CycleScheduler
+from pyscada.opcua.core.sharding import (
+    REBALANCE_THRESHOLD,
+    assign,
+    device_load,
+    imbalance,
+    members,
+    rebalance,
+)
 
-import logging
+from django.db.models import Count, Q
+
+from os import cpu_count, kill
+from time import time
+import errno
+import json
+import traceback
 
+import logging
 
 logger = logging.getLogger(__name__)
 
+# slice of the process loop, write tasks and signals are handled in every
+# slice, the reads on the ticks of the CycleScheduler
+BASE_LOOP_DT = 0.05
+
+
+class OPCUADeviceProcess(SingleDeviceDAQProcess):
+    """
+    Device process that starts every cycle at a wall-clock multiple of the
+    polling interval instead of sleeping the interval after each cycle.
+
+    The process loop runs every BASE_LOOP_DT seconds so that write tasks and
+    signals are not delayed by the polling interval, the device is read when
+    a tick is due.
+    """
+
+    overrun_policy = CycleScheduler.SKIP
+    max_catch_up = 3
+    # seconds between two jitter reports
+    statistics_interval = 600
+
+    def __init__(self, dt=5, **kwargs):
+        self.scheduler = None
+        super().__init__(dt=dt, **kwargs)
+        self.interval_set = self.dt_set
+        self._last_report = time()
+
+    def init_process(self):
+        self.dt_set = self.interval_set
+        self.scheduler = None
+        result = super().init_process()
+        if not result:
+            return result
+        # dt_query_data is the polling interval of the device, dt_set is
+        # capped to interval_set
+        self.scheduler = CycleScheduler(
+            self.dt_query_data, self.overrun_policy, self.max_catch_up
+        )
+        self.dt_set = min(self.dt_set, BASE_LOOP_DT)
+        return result
+
+    def loop(self):
+        if self.scheduler is None:
+            # the device could not be initialized
+            return super().loop()
+        tick = self.scheduler.wait_for_tick(BASE_LOOP_DT)
+        # the tick decides when to read, not the elapsed time since the last
+        # query which jitters around the interval, the write tasks are handled
+        # in every slice
+        self.last_query = 0 if tick is not None else time()
+        result = super().loop()
+        if tick is not None:
+            self.scheduler.cycle_done(tick)
+        if time() - self._last_report >= self.statistics_interval:
+            self.report_statistics()
+        return result
+
+    def report_statistics(self):
+        stats = self.scheduler.statistics()
+        logger.info(
+            f"{self.label} {stats['cycles']} cycles of {stats['interval']}s, "
+            f"lateness mean {stats['lateness_mean'] * 1000:.1f}ms "
+            f"std {stats['lateness_std'] * 1000:.1f}ms "
+            f"max {stats['lateness_max'] * 1000:.1f}ms, "
+            f"duration mean {stats['duration_mean'] * 1000:.1f}ms "
+            f"max {stats['duration_max'] * 1000:.1f}ms, "
+            f"{stats['overruns']} overruns, {stats['skipped']} ticks skipped"
+        )
+        self.scheduler.reset_statistics()
+        self._last_report = time()
+
 
 class Process(SingleDeviceDAQProcessWorker):
     device_filter = dict(opcuadevice__isnull=False, protocol_id=PROTOCOL_ID)
     bp_label = "pyscada.opcua-%s"
+    process_class = "pyscada.opcua.worker.OPCUADeviceProcess"
 
     def __init__(self, dt=5, **kwargs):
         super(SingleDeviceDAQProcessWorker, self).__init__(dt=dt, **kwargs)
+
+
+class OPCUAShardProcess(MultiDeviceDAQProcess):
+    """
+    Device process serving a share of the OPC-UA devices from one event loop.
+
+    Write and read tasks are handled by MultiDeviceDAQProcess, the cyclic
+    reads are timed per device and the reads that are due in the same loop
+    run concurrently.
+    """
+
+    def __init__(self, dt=5, **kwargs):
+        self.event_loop = None
+        self.next_read = {}
+        self.intervals = {}
+        super().__init__(dt=dt, **kwargs)
+
+    def init_process(self):
+        self.close_devices()
+        result = super().init_process()
+        if self.event_loop is None:
+            self.event_loop = EventLoopThread(f"pyscada.opcua-shard-{self.process_id}")
+        for device_id, device in self.devices.items():
+            handler = getattr(device, "_h", None)
+            if hasattr(handler, "use_event_loop"):
+                handler.use_event_loop(self.event_loop)
+            self.intervals[device_id] = max(device.device.polling_interval, 0.1)
+        self.next_read = {device_id: 0 for device_id in self.devices}
+        return result
+
+    def loop(self):
+        # the cyclic reads are done by read_due, MultiDeviceDAQProcess only
+        # reads the devices on a DeviceReadTask
+        self.last_query = time()
+        status, data = super().loop()
+        output = self.read_due()
+        if len(output):
+            data = output if data is None else data + output
+        return status, data
+
+    def read_due(self):
+        """
+        start the reads of all devices that are due, then collect them
+        """
+        now = time()
+        due = []
+        for device_id, device in self.devices.items():
+            if now < self.next_read.get(device_id, 0):
+                continue
+            handler = getattr(device, "_h", None)
+            # stretched to what the server keeps up with
+            interval = max(
+                self.intervals[device_id],
+                getattr(handler, "min_polling_interval", 0.0),
+            )
+            self.next_read[device_id] = (now // interval + 1) * interval
+            if not device.driver_ok or not device.driver_handler_ok:
+                continue
+            if hasattr(handler, "submit_read"):
+                try:
+                    handler.submit_read(device.variables)
+                except Exception:
+                    logger.error(
+                        f"Starting the read of device {device_id} failed",
+                        exc_info=True,
+                    )
+            due.append(device)
+        data = []
+        for device in due:
+            try:
+                output = device.request_data()
+            except Exception:
+                logger.error(f"Read of device {device.device} failed", exc_info=True)
+                continue
+            if isinstance(output, list) and len(output):
+                data.append(output)
+        return data
+
+    def close_devices(self):
+        for device in self.devices.values():
+            handler = getattr(device, "_h", None)
+            if hasattr(handler, "close"):
+                try:
+                    handler.close()
+                except Exception as e:
+                    logger.info(f"Closing {device.device} failed : {e}")
+
+    def cleanup(self):
+        self.close_devices()
+        if self.event_loop is not None:
+            self.event_loop.stop()
+        super().cleanup()
+
+
+class ShardedProcess(MultiDeviceDAQProcessWorker):
+    """
+    Spread the OPC-UA devices over a fixed number of OPCUAShardProcess by
+    their load (tags read per second).
+
+    Select it in parent_process_list, for example with the process class
+    "pyscada.opcua.worker.ShardedProcess" and the kwargs
+    '{"dt_set":30, "shards":8}'. With shards set to 0 one shard per CPU core
+    is started. Added or removed devices are placed on the least loaded
+    shards, all devices are redistributed when the most loaded shard gets
+    more than rebalance_threshold times the mean load.
+    """
+
+    device_filter = dict(opcuadevice__isnull=False, protocol_id=PROTOCOL_ID)
+    bp_label = "pyscada.opcua-shard-%s"
+    process_class = "pyscada.opcua.worker.OPCUAShardProcess"
+    shards = 0
+    rebalance_threshold = REBALANCE_THRESHOLD
+
+    def __init__(self, dt=5, **kwargs):
+        self.processes = []
+        self.assignment = {}
+        super(MultiDeviceDAQProcessWorker, self).__init__(dt=dt, **kwargs)
+
+    @property
+    def shard_count(self):
+        return self.shards if self.shards > 0 else cpu_count() or 1
+
+    def device_loads(self):
+        return {
+            item.pk: device_load(item.tags, item.polling_interval)
+            for item in Device.objects.filter(
+                active=True, **self.device_filter
+            ).annotate(tags=Count("variable", filter=Q(variable__active=True)))
+        }
+
+    def create_bp(self, key, device_ids):
+        bp = BackgroundProcess(
+            label=self.bp_label % key,
+            message="waiting..",
+            enabled=True,
+            parent_process_id=self.process_id,
+            process_class=self.process_class,
+            process_class_kwargs=json.dumps({"device_ids": device_ids}),
+        )
+        bp.save()
+        self.processes.append(
+            {"id": bp.id, "key": key, "device_ids": device_ids, "failed": 0}
+        )
+
+    def init_process(self):
+        self.processes = []
+        for process in BackgroundProcess.objects.filter(
+            parent_process__pk=self.process_id, done=False
+        ):
+            try:
+                kill(process.pid, 0)
+            except OSError as e:
+                if e.errno == errno.ESRCH:
+                    process.delete()
+                    continue
+            logger.debug(f"process {process.pk} is alive")
+            process.stop(cleanup=True)
+
+        # clean up
+        BackgroundProcess.objects.filter(parent_process__pk=self.process_id).delete()
+
+        loads = self.device_loads()
+        self.assignment = assign(loads, self.shard_count)
+        for key, device_ids in enumerate(members(self.assignment, self.shard_count)):
+            if len(device_ids):
+                self.create_bp(key, device_ids)
+        logger.info(
+            f"{len(loads)} OPC-UA devices on {self.shard_count} shards, "
+            f"imbalance {imbalance(self.assignment, loads, self.shard_count):.2f}"
+        )
+
+    def loop(self):
+        loads = self.device_loads()
+        if set(loads) != set(self.assignment):
+            self.apply_assignment(
+                rebalance(
+                    loads,
+                    self.assignment,
+                    self.shard_count,
+                    self.rebalance_threshold,
+                ),
+                loads,
+            )
+
+        # check if all processes are running
+        for process in self.processes:
+            try:
+                if BackgroundProcess.objects.filter(pk=process["id"]).count() != 1:
+                    # Process is dead, spawn new instance
+                    if process["failed"] < 3:
+                        bp = BackgroundProcess(
+                            label=self.bp_label % process["key"],
+                            message="waiting..",
+                            enabled=True,
+                            parent_process_id=self.process_id,
+                            process_class=self.process_class,
+                            process_class_kwargs=json.dumps(
+                                {"device_ids": process["device_ids"]}
+                            ),
+                        )
+                        bp.save()
+                        process["id"] = bp.id
+                    elif process["failed"] == 3:
+                        logger.error(
+                            f"process {self.bp_label % process['key']} failed 3 times"
+                        )
+                    else:
+                        logger.warning(
+                            f"process {self.bp_label % process['key']} "
+                            f"failed more than 3 times"
+                        )
+                    process["failed"] += 1
+            except:
+                logger.debug(
+                    f"{self.label}, unhandled exception\n{traceback.format_exc()}"
+                )
+
+        return 1, None
+
+    def apply_assignment(self, assignment, loads):
+        """
+        restart the shards whose devices changed
+        """
+        shards = members(assignment, self.shard_count)
+        for process in list(self.processes):
+            if process["device_ids"] == shards[process["key"]]:
+                continue
+            bp = BackgroundProcess.objects.filter(pk=process["id"]).first()
+            if bp is not None:
+                bp.stop(cleanup=True)
+            self.processes.remove(process)
+        running = set(process["key"] for process in self.processes)
+        for key, device_ids in enumerate(shards):
+            if key not in running and len(device_ids):
+                self.create_bp(key, device_ids)
+        self.assignment = assignment
+        logger.info(
+            f"OPC-UA devices rebalanced, "
+            f"imbalance {imbalance(assignment, loads, self.shard_count):.2f}"
+        )
+
+    def cleanup(self):
+        pass
+
+    def restart(self):
+        for process in list(self.processes):
+            try:
+                bp = BackgroundProcess.objects.get(pk=process["id"])
+                bp.stop(cleanup=True)
+            except BackgroundProcess.DoesNotExist:
+                pass
+            except:
+                logger.debug(
+                    f"{self.label}, unhandled exception\n{traceback.format_exc()}"
+                )
+        self.init_process()
+        return True